@@ -0,0 +1,208 @@
+"""
+Pool de transferência de anexos (download do Organizze -> upload para R2)
+
+Executa as transferências em threads enquanto o loop principal continua
+processando as transações. O total de bytes em trânsito é limitado por um
+orçamento compartilhado: cada transferência reserva `reserve_bytes` antes de
+baixar e ajusta a reserva para o que realmente ficou em memória assim que o
+conteúdo chega, de modo que o uso de memória fica limitado mesmo com vários
+workers.
+
+Os downloads são lidos em blocos (`read_limited`): anexos acima do limite são
+rejeitados pelo Content-Length ou assim que o stream passa do limite, e o
+corpo vai para um arquivo temporário quando excede `spool_threshold`. O
+SHA-256 do conteúdo é calculado durante o stream, para as chaves no R2.
+"""
+
+import hashlib
+import io
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from tempfile import SpooledTemporaryFile
+
+# Tamanho máximo aceito para um anexo (mesmo limite usado pelo app)
+MAX_ATTACHMENT_SIZE = 10 * 1024 * 1024
+
+DEFAULT_WORKERS = 4
+DEFAULT_MAX_INFLIGHT_BYTES = 64 * 1024 * 1024
+
+# Acima disso o corpo do anexo vai para disco em vez de ficar em memória
+DEFAULT_SPOOL_THRESHOLD = 2 * 1024 * 1024
+CHUNK_SIZE = 64 * 1024
+
+
+class AttachmentTooLarge(Exception):
+    """Anexo acima do limite de tamanho"""
+
+    def __init__(self, filename: str, size: int):
+        super().__init__(f"Anexo muito grande ({size / 1024 / 1024:.1f} MB): {filename}")
+        self.filename = filename
+        self.size = size
+
+
+class HashedSpool(SpooledTemporaryFile):
+    """SpooledTemporaryFile que carrega o SHA-256 (hex) do conteúdo"""
+
+    sha256 = None
+
+
+def read_limited(
+    response,
+    filename: str,
+    max_size: int | None = MAX_ATTACHMENT_SIZE,
+    spool_threshold: int = DEFAULT_SPOOL_THRESHOLD,
+):
+    """Lê o corpo de uma resposta em stream para um HashedSpool
+
+    Retorna o arquivo posicionado no início, com `sha256` preenchido. Levanta
+    AttachmentTooLarge antes de baixar (pelo Content-Length) ou assim que o
+    stream passa de `max_size`.
+    """
+    try:
+        length = response.headers.get("content-length", "")
+        if max_size is not None and length.isdigit() and int(length) > max_size:
+            raise AttachmentTooLarge(filename, int(length))
+
+        spool = HashedSpool(max_size=spool_threshold)
+        digest = hashlib.sha256()
+        size = 0
+        try:
+            for chunk in response.iter_content(chunk_size=CHUNK_SIZE):
+                size += len(chunk)
+                if max_size is not None and size > max_size:
+                    raise AttachmentTooLarge(filename, size)
+                digest.update(chunk)
+                spool.write(chunk)
+        except BaseException:
+            spool.close()
+            raise
+    finally:
+        response.close()
+
+    spool.sha256 = digest.hexdigest()
+    spool.seek(0)
+    return spool
+
+
+def body_sha256(body) -> str:
+    """SHA-256 de um corpo; usa o valor calculado no stream quando houver"""
+    if isinstance(body, (bytes, bytearray)):
+        return hashlib.sha256(body).hexdigest()
+    if getattr(body, "sha256", None):
+        return body.sha256
+    position = body.tell()
+    body.seek(0)
+    digest = hashlib.sha256()
+    for chunk in iter(lambda: body.read(CHUNK_SIZE), b""):
+        digest.update(chunk)
+    body.seek(position)
+    return digest.hexdigest()
+
+
+def body_size(body) -> int:
+    """Tamanho de um corpo em bytes ou em arquivo (sem alterar a posição)"""
+    if isinstance(body, (bytes, bytearray)):
+        return len(body)
+    position = body.tell()
+    size = body.seek(0, io.SEEK_END)
+    body.seek(position)
+    return size
+
+
+class ByteBudget:
+    """Semáforo de bytes: bloqueia enquanto o total reservado passar do limite"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.used = 0
+        self._cond = threading.Condition()
+
+    def acquire(self, n: int, block: bool = True):
+        with self._cond:
+            # Um item maior que o orçamento inteiro passa sozinho
+            while block and self.used > 0 and self.used + n > self.max_bytes:
+                self._cond.wait()
+            self.used += n
+
+    def release(self, n: int):
+        with self._cond:
+            self.used -= n
+            self._cond.notify_all()
+
+
+class AttachmentPool:
+    """Executa download + upload de anexos em paralelo com memória limitada
+
+    `download(url)` deve retornar `(body, content_type, filename)` ou None,
+    onde `body` são bytes ou um arquivo (ver `read_limited`);
+    `upload(body, content_type, filename, size)` retorna os metadados do
+    anexo (dict) ou None. `submit` devolve um Future com o resultado do upload;
+    `transfer` faz o mesmo de forma síncrona, na thread de quem chama (útil
+    quando o chamador já é um worker, como no pipeline da migração).
+    """
+
+    def __init__(
+        self,
+        download,
+        upload,
+        workers: int = DEFAULT_WORKERS,
+        max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+        max_size: int | None = MAX_ATTACHMENT_SIZE,
+        spool_threshold: int = DEFAULT_SPOOL_THRESHOLD,
+    ):
+        self.download = download
+        self.upload = upload
+        self.workers = max(1, workers)
+        self.max_size = max_size
+        self.spool_threshold = spool_threshold
+        # Com o corpo em stream, cada transferência ocupa no máximo o limiar
+        self.reserve_bytes = min(spool_threshold, max_inflight_bytes)
+        self.budget = ByteBudget(max_inflight_bytes)
+        self._executor = None
+
+    def submit(self, url: str):
+        if self._executor is None:
+            self._executor = ThreadPoolExecutor(
+                max_workers=self.workers, thread_name_prefix="attachment"
+            )
+        return self._executor.submit(self.transfer, url)
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.shutdown()
+
+    def transfer(self, url: str):
+        held = self.reserve_bytes
+        self.budget.acquire(held)
+        body = None
+        try:
+            downloaded = self.download(url)
+            if not downloaded:
+                return None
+            body, content_type, filename = downloaded
+            size = body_size(body)
+
+            # Ajustar a reserva ao que de fato ficou em memória
+            resident = size
+            if not isinstance(body, (bytes, bytearray)):
+                resident = min(size, self.spool_threshold)
+            if resident > held:
+                self.budget.acquire(resident - held, block=False)
+            else:
+                self.budget.release(held - resident)
+            held = resident
+
+            if self.max_size is not None and size > self.max_size:
+                raise AttachmentTooLarge(filename, size)
+
+            return self.upload(body, content_type, filename, size)
+        finally:
+            if body is not None and hasattr(body, "close"):
+                body.close()
+            self.budget.release(held)
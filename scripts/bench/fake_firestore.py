@@ -0,0 +1,347 @@
+"""
+Firestore falso em processo para os benchmarks
+
+Implementa o subconjunto da API do `google-cloud-firestore` usado pelos
+scripts: coleções e documentos aninhados, `WriteBatch`, `update` com campos
+pontilhados, e consultas com `where`/`select`/`order_by`/`limit`/
+`start_after`, e leituras em bloco com `get_all`. A latência de cada round trip (commit, página de consulta,
+update avulso) é configurável.
+
+Para medir contra o emulador oficial, use `--firestore emulator` no
+`run_bench.py` com `FIRESTORE_EMULATOR_HOST` definido.
+"""
+
+import bisect
+import operator
+import threading
+import time
+import uuid
+from datetime import datetime
+
+DOCUMENT_ID = "__name__"
+
+OPERATORS = {
+    "==": operator.eq,
+    "!=": operator.ne,
+    "<": operator.lt,
+    "<=": operator.le,
+    ">": operator.gt,
+    ">=": operator.ge,
+}
+
+
+def _is_sentinel(value, word: str) -> bool:
+    # SERVER_TIMESTAMP / DELETE_FIELD do google-cloud-firestore
+    return type(value).__name__ == "Sentinel" and word in str(
+        getattr(value, "description", "")
+    ).lower()
+
+
+def _resolve(value):
+    if _is_sentinel(value, "timestamp"):
+        return datetime.now()
+    if isinstance(value, dict):
+        return {k: _resolve(v) for k, v in value.items()}
+    if isinstance(value, list):
+        return [_resolve(v) for v in value]
+    return value
+
+
+_MISSING = object()
+
+
+def _get_field(data: dict, field: str):
+    value = data
+    for part in field.split("."):
+        if not isinstance(value, dict) or part not in value:
+            return _MISSING
+        value = value[part]
+    return value
+
+
+def _comparable(a, b) -> bool:
+    numbers = (int, float)
+    if isinstance(a, numbers) and isinstance(b, numbers):
+        return not isinstance(a, bool) and not isinstance(b, bool)
+    return type(a) is type(b)
+
+
+class FakeFirestore:
+    """Substituto de `firestore.client()`"""
+
+    def __init__(self, commit_latency_ms: float = 0.0, read_latency_ms: float = 0.0):
+        self.commit_latency = commit_latency_ms / 1000
+        self.read_latency = read_latency_ms / 1000
+        self.collections = {}  # caminho da coleção -> {id: dados}
+        self.commits = 0
+        self.writes = 0
+        self.reads = 0
+        self.version = 0  # muda a cada escrita (invalida o cache de consultas)
+        self.lock = threading.RLock()
+        self._query_cache = {}
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self, name)
+
+    def batch(self) -> "FakeWriteBatch":
+        return FakeWriteBatch(self)
+
+    def get_all(self, references: list, field_paths: list | None = None):
+        """Um round trip para vários documentos (inexistentes com `exists=False`)"""
+        self._wait(self.read_latency)
+        with self.lock:
+            found = [
+                self.collections.get(ref.parent.path, {}).get(ref.id) for ref in references
+            ]
+            self.reads += len(references)
+        projection = FakeQuery(None, fields=field_paths)
+        for ref, data in zip(references, found):
+            yield FakeSnapshot(ref, None if data is None else projection._project(data))
+
+    def count(self, collection_path: str) -> int:
+        with self.lock:
+            return len(self.collections.get(collection_path, {}))
+
+    def _apply(self, op: str, ref: "FakeDocument", data: dict | None, merge: bool = False):
+        with self.lock:
+            docs = self.collections.setdefault(ref.parent.path, {})
+            if op == "delete":
+                docs.pop(ref.id, None)
+            elif op == "set" and not merge:
+                docs[ref.id] = _resolve(data)
+            else:
+                if op == "update" and ref.id not in docs:
+                    raise KeyError(f"No document to update: {ref.path}")
+                current = docs.setdefault(ref.id, {})
+                for key, value in data.items():
+                    self._set_field(current, key, value, dotted=op == "update")
+            self.writes += 1
+            self.version += 1
+
+    @staticmethod
+    def _set_field(target: dict, key: str, value, dotted: bool):
+        parts = key.split(".") if dotted else [key]
+        for part in parts[:-1]:
+            target = target.setdefault(part, {})
+        if _is_sentinel(value, "delete"):
+            target.pop(parts[-1], None)
+        else:
+            target[parts[-1]] = _resolve(value)
+
+    def _wait(self, seconds: float):
+        if seconds:
+            time.sleep(seconds)
+
+
+class FakeDocument:
+    def __init__(self, db: FakeFirestore, parent: "FakeCollection", doc_id: str):
+        self._db = db
+        self.parent = parent
+        self.id = doc_id
+
+    @property
+    def path(self) -> str:
+        return f"{self.parent.path}/{self.id}"
+
+    def collection(self, name: str) -> "FakeCollection":
+        return FakeCollection(self._db, f"{self.path}/{name}")
+
+    def get(self) -> "FakeSnapshot":
+        self._db._wait(self._db.read_latency)
+        with self._db.lock:
+            data = self._db.collections.get(self.parent.path, {}).get(self.id)
+            self._db.reads += 1
+        return FakeSnapshot(self, None if data is None else dict(data))
+
+    def set(self, data: dict, merge: bool = False):
+        self._db._wait(self._db.commit_latency)
+        self._db._apply("set", self, data, merge)
+
+    def update(self, data: dict):
+        self._db._wait(self._db.commit_latency)
+        self._db._apply("update", self, data)
+
+    def delete(self):
+        self._db._wait(self._db.commit_latency)
+        self._db._apply("delete", self, None)
+
+
+class FakeSnapshot:
+    def __init__(self, reference: FakeDocument, data: dict | None):
+        self.reference = reference
+        self.id = reference.id
+        self.exists = data is not None
+        self._data = data
+
+    def to_dict(self) -> dict | None:
+        return None if self._data is None else dict(self._data)
+
+    def get(self, field: str):
+        value = _get_field(self._data or {}, field)
+        if value is _MISSING:
+            raise KeyError(field)
+        return value
+
+
+class FakeQuery:
+    def __init__(self, collection: "FakeCollection", filters=(), fields=None, orders=(), limit_count=None, cursor=None):
+        self._collection = collection
+        self._filters = tuple(filters)
+        self._fields = fields
+        self._orders = tuple(orders)
+        self._limit = limit_count
+        self._cursor = cursor
+
+    def _copy(self, **changes) -> "FakeQuery":
+        args = {
+            "filters": self._filters,
+            "fields": self._fields,
+            "orders": self._orders,
+            "limit_count": self._limit,
+            "cursor": self._cursor,
+        }
+        args.update(changes)
+        return FakeQuery(self._collection, **args)
+
+    def where(self, field: str, op: str, value) -> "FakeQuery":
+        return self._copy(filters=self._filters + ((field, op, value),))
+
+    def select(self, fields: list) -> "FakeQuery":
+        return self._copy(fields=list(fields))
+
+    def order_by(self, field) -> "FakeQuery":
+        return self._copy(orders=self._orders + (str(field),))
+
+    def limit(self, count: int) -> "FakeQuery":
+        return self._copy(limit_count=count)
+
+    def start_after(self, snapshot: FakeSnapshot) -> "FakeQuery":
+        return self._copy(cursor=snapshot)
+
+    def get(self) -> list:
+        return list(self.stream())
+
+    def stream(self):
+        db = self._collection._db
+        db._wait(db.read_latency)
+        orders = [f for f in self._orders if f != DOCUMENT_ID]
+        keys, matches = self._sorted_matches(db, orders)
+
+        start = 0
+        if self._cursor is not None:
+            # Como no cliente real, o cursor usa os dados do snapshot (já
+            # projetados): cada campo do order_by precisa estar no select
+            cursor_data = self._cursor._data or {}
+            for field in orders:
+                if _get_field(cursor_data, field) is _MISSING:
+                    raise ValueError(
+                        f"The 'order by' field path '{field}' is not present in the cursor data"
+                    )
+            cursor_key = self._sort_key(self._cursor.id, cursor_data, orders)
+            start = bisect.bisect_right(keys, cursor_key)
+        end = len(matches) if self._limit is None else start + self._limit
+        matches = matches[start:end]
+
+        with db.lock:
+            db.reads += len(matches)
+        for doc_id, data in matches:
+            ref = FakeDocument(db, self._collection, doc_id)
+            yield FakeSnapshot(ref, self._project(data))
+
+    def _sorted_matches(self, db: FakeFirestore, orders: list) -> tuple[list, list]:
+        """Resultado ordenado da consulta, reaproveitado entre as páginas"""
+        cache_key = (self._collection.path, repr(self._filters), tuple(orders))
+        with db.lock:
+            cached = db._query_cache.get(cache_key)
+            if cached and cached[0] == db.version:
+                return cached[1], cached[2]
+            items = list(db.collections.get(self._collection.path, {}).items())
+            version = db.version
+
+        # Como no Firestore, documentos sem o campo ordenado ficam de fora
+        matches = [
+            (doc_id, data)
+            for doc_id, data in items
+            if self._matches(data)
+            and all(_get_field(data, f) is not _MISSING for f in orders)
+        ]
+        matches.sort(key=lambda item: self._sort_key(item[0], item[1], orders))
+        keys = [self._sort_key(doc_id, data, orders) for doc_id, data in matches]
+        with db.lock:
+            db._query_cache[cache_key] = (version, keys, matches)
+        return keys, matches
+
+    def _matches(self, data: dict) -> bool:
+        for field, op, value in self._filters:
+            current = _get_field(data, field)
+            if current is _MISSING:
+                return False
+            if op == "in":
+                if current not in value:
+                    return False
+            elif op in ("==", "!="):
+                if not OPERATORS[op](current, value):
+                    return False
+            elif not _comparable(current, value) or not OPERATORS[op](current, value):
+                return False
+        return True
+
+    def _project(self, data: dict) -> dict:
+        if self._fields is None:
+            return dict(data)
+        projected = {}
+        for field in self._fields:
+            value = _get_field(data, field)
+            if value is _MISSING:
+                continue
+            target = projected
+            parts = field.split(".")
+            for part in parts[:-1]:
+                target = target.setdefault(part, {})
+            target[parts[-1]] = value
+        return projected
+
+    @staticmethod
+    def _sort_key(doc_id: str, data: dict, orders: list) -> tuple:
+        values = []
+        for field in orders:
+            value = _get_field(data, field)
+            values.append(value if not isinstance(value, list) else len(value))
+        return (*values, doc_id)
+
+
+class FakeCollection(FakeQuery):
+    def __init__(self, db: FakeFirestore, path: str):
+        self._db = db
+        self.path = path
+        self.id = path.rsplit("/", 1)[-1]
+        super().__init__(self)
+
+    def document(self, doc_id: str | None = None) -> FakeDocument:
+        return FakeDocument(self._db, self, doc_id or uuid.uuid4().hex[:20])
+
+
+class FakeWriteBatch:
+    def __init__(self, db: FakeFirestore):
+        self._db = db
+        self._ops = []
+
+    def set(self, ref: FakeDocument, data: dict, merge: bool = False):
+        self._ops.append(("set", ref, data, merge))
+
+    def update(self, ref: FakeDocument, data: dict):
+        self._ops.append(("update", ref, data, False))
+
+    def delete(self, ref: FakeDocument):
+        self._ops.append(("delete", ref, None, False))
+
+    def commit(self):
+        self._db._wait(self._db.commit_latency)
+        with self._db.lock:
+            # Atômico como no Firestore: um update sem documento derruba o lote
+            for op, ref, data, merge in self._ops:
+                if op == "update" and ref.id not in self._db.collections.get(ref.parent.path, {}):
+                    raise KeyError(f"No document to update: {ref.path}")
+            for op, ref, data, merge in self._ops:
+                self._db._apply(op, ref, data, merge)
+            self._db.commits += 1
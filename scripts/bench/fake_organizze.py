@@ -0,0 +1,275 @@
+"""
+Servidor HTTP local que imita a API do Organizze para os benchmarks
+
+Os dados são sintéticos e determinísticos: a transação `i` é sempre a mesma
+para a mesma semente, e as transações são distribuídas uniformemente entre
+`start_date` e `end_date`. Nada é mantido em memória além dos parâmetros, então
+1M de transações custa o mesmo que 1k para subir o servidor; cada janela de
+`/transactions` é gerada na hora.
+
+Latência (com jitter) e erros (503 com Retry-After, 429) podem ser injetados
+para medir o comportamento dos scripts sob um serviço lento ou instável.
+"""
+
+import json
+import random
+import threading
+import time
+from datetime import date, timedelta
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+DESCRIPTIONS = [
+    "Supermercado",
+    "Farmácia",
+    "Posto de gasolina",
+    "Restaurante",
+    "Aluguel",
+    "Conta de luz",
+    "Internet",
+    "Salário",
+    "Uber",
+    "Padaria",
+]
+CATEGORIES = ["Alimentação", "Saúde", "Transporte", "Moradia", "Lazer", "Salário", "Outros"]
+CARD_NETWORKS = ["visa", "mastercard", "elo", "amex"]
+
+
+class SyntheticData:
+    """Contas, cartões, transações e anexos gerados a partir do índice"""
+
+    def __init__(
+        self,
+        transactions: int = 1000,
+        start_date: str = "2024-01-01",
+        end_date: str = "2024-12-31",
+        attachment_ratio: float = 0.1,
+        attachment_kb: int = 200,
+        card_ratio: float = 0.3,
+        accounts: int = 3,
+        cards: int = 2,
+        seed: int = 42,
+    ):
+        self.count = transactions
+        self.start = date.fromisoformat(start_date)
+        self.end = date.fromisoformat(end_date)
+        self.days = (self.end - self.start).days + 1
+        self.attachment_ratio = attachment_ratio
+        self.attachment_size = attachment_kb * 1024
+        self.card_ratio = card_ratio
+        self.accounts_count = accounts
+        self.cards_count = cards
+        self.seed = seed
+        self.deleted = set()  # ids removidos (cenários de --sync)
+
+    def accounts(self) -> list:
+        return [
+            {"id": 100 + n, "name": f"Conta {n + 1}", "type": "checking", "archived": False}
+            for n in range(self.accounts_count)
+        ]
+
+    def credit_cards(self) -> list:
+        return [
+            {
+                "id": 200 + n,
+                "name": f"Cartão {n + 1}",
+                "card_network": CARD_NETWORKS[n % len(CARD_NETWORKS)],
+                "limit_cents": 500000,
+                "closing_day": 5,
+                "due_day": 15,
+                "archived": False,
+            }
+            for n in range(self.cards_count)
+        ]
+
+    def categories(self) -> list:
+        return [{"id": 300 + n, "name": name} for n, name in enumerate(CATEGORIES)]
+
+    def has_attachment(self, index: int) -> bool:
+        return self._rng(index).random() < self.attachment_ratio
+
+    def transaction_date(self, index: int) -> date:
+        return self.start + timedelta(days=index * self.days // self.count)
+
+    def transaction(self, index: int, base_url: str = "") -> dict:
+        rng = self._rng(index)
+        has_attachment = rng.random() < self.attachment_ratio
+        is_card = self.cards_count and rng.random() < self.card_ratio
+        amount = rng.randint(100, 500000)
+        description = DESCRIPTIONS[rng.randrange(len(DESCRIPTIONS))]
+        tx = {
+            "id": index + 1,
+            "description": f"{description} {index + 1}",
+            "date": self.transaction_date(index).isoformat(),
+            "paid": rng.random() < 0.9,
+            "amount_cents": amount if description == "Salário" else -amount,
+            "category_id": 300 + rng.randrange(len(CATEGORIES)),
+            "notes": "",
+            "tags": [{"name": "bench"}] if rng.random() < 0.2 else [],
+            "credit_card_id": 200 + rng.randrange(self.cards_count) if is_card else None,
+            "attachments": [],
+        }
+        if has_attachment:
+            tx["attachments"].append(
+                {
+                    "id": 900000 + index,
+                    "url": f"{base_url}/attachments/{index + 1}/comprovante-{index + 1}.jpg",
+                }
+            )
+        return tx
+
+    def index_range(self, start: date, end: date) -> range:
+        """Índices das transações com data entre `start` e `end` (inclusive)"""
+        first_day = max(0, (start - self.start).days)
+        last_day = min(self.days - 1, (end - self.start).days)
+        if last_day < first_day:
+            return range(0)
+        # transaction_date(i) = start + i * days // count; inverte a fórmula
+        first = -(-first_day * self.count // self.days)
+        last = -(-(last_day + 1) * self.count // self.days)
+        return range(first, min(last, self.count))
+
+    def transactions_between(self, start: str, end: str, base_url: str = "") -> list:
+        return [
+            self.transaction(index, base_url)
+            for index in self.index_range(date.fromisoformat(start), date.fromisoformat(end))
+            if index + 1 not in self.deleted
+        ]
+
+    def attachment_body(self, tx_id: int) -> bytes:
+        # Conteúdo único por transação (as chaves no R2 são pelo SHA-256)
+        header = f"bench-attachment-{tx_id}\n".encode()
+        filler = bytes(range(256)) * (self.attachment_size // 256 + 1)
+        return header + filler[: max(0, self.attachment_size - len(header))]
+
+    def _rng(self, index: int) -> random.Random:
+        return random.Random(self.seed * 1_000_003 + index)
+
+
+class FakeOrganizzeServer:
+    """API do Organizze em `http://127.0.0.1:<porta>` numa thread de fundo"""
+
+    def __init__(
+        self,
+        data: SyntheticData,
+        latency_ms: float = 0.0,
+        jitter_ms: float = 0.0,
+        error_rate: float = 0.0,
+        throttle_rate: float = 0.0,
+        port: int = 0,
+    ):
+        self.data = data
+        self.latency = latency_ms / 1000
+        self.jitter = jitter_ms / 1000
+        self.error_rate = error_rate
+        self.throttle_rate = throttle_rate
+        self.requests = 0
+        self.errors_injected = 0
+        self.bytes_sent = 0
+        self.attachment_bytes = 0
+        self._lock = threading.Lock()
+        self._random = random.Random(data.seed)
+        self._server = ThreadingHTTPServer(("127.0.0.1", port), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self):
+        self._thread = threading.Thread(
+            target=self._server.serve_forever, name="fake-organizze", daemon=True
+        )
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _inject(self) -> int | None:
+        """Sorteia uma falha para a requisição atual (status ou None)"""
+        with self._lock:
+            self.requests += 1
+            roll = self._random.random()
+            delay = self.latency + self._random.uniform(0, self.jitter)
+        if delay:
+            time.sleep(delay)
+        if roll < self.error_rate:
+            status = 503
+        elif roll < self.error_rate + self.throttle_rate:
+            status = 429
+        else:
+            return None
+        with self._lock:
+            self.errors_injected += 1
+        return status
+
+    def _route(self, path: str, query: dict):
+        """Retorna (status, content_type, corpo)"""
+        data = self.data
+        if path == "/accounts":
+            return 200, "application/json", data.accounts()
+        if path == "/credit_cards":
+            return 200, "application/json", data.credit_cards()
+        if path == "/categories":
+            return 200, "application/json", data.categories()
+        if path == "/transactions":
+            start = query.get("start_date", [data.start.isoformat()])[0]
+            end = query.get("end_date", [data.end.isoformat()])[0]
+            return 200, "application/json", data.transactions_between(start, end, self.url)
+
+        parts = path.strip("/").split("/")
+        if len(parts) == 2 and parts[0] == "transactions" and parts[1].isdigit():
+            tx_id = int(parts[1])
+            if not 1 <= tx_id <= data.count or tx_id in data.deleted:
+                return 404, "application/json", {"error": "not found"}
+            return 200, "application/json", data.transaction(tx_id - 1, self.url)
+        if len(parts) == 3 and parts[0] == "attachments" and parts[1].isdigit():
+            return 200, "image/jpeg", data.attachment_body(int(parts[1]))
+        return 404, "application/json", {"error": "not found"}
+
+    def _handler(self):
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True  # cabeçalho e corpo saem em writes separados
+
+            def do_GET(self):
+                status = server._inject()
+                if status is not None:
+                    self._send(status, "application/json", b"{}", {"Retry-After": "0"})
+                    return
+
+                parsed = urlparse(self.path)
+                status, content_type, body = server._route(parsed.path, parse_qs(parsed.query))
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                self._send(status, content_type, body)
+
+            def _send(self, status: int, content_type: str, body: bytes, headers: dict = None):
+                self.send_response(status)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(body)))
+                for name, value in (headers or {}).items():
+                    self.send_header(name, value)
+                self.end_headers()
+                self.wfile.write(body)
+                with server._lock:
+                    server.bytes_sent += len(body)
+                    if content_type != "application/json":
+                        server.attachment_bytes += len(body)
+
+            def log_message(self, format, *args):
+                pass
+
+        return Handler
@@ -0,0 +1,95 @@
+"""
+Stub em processo de um cliente S3/R2 (subconjunto do boto3 usado pelos scripts)
+
+Guarda apenas tamanho e tipo de cada objeto (o conteúdo é lido e descartado),
+então 1M de anexos cabem em memória. A latência por operação pode ser
+configurada para simular a distância até o R2.
+"""
+
+import bisect
+import threading
+import time
+
+
+class FakeClientError(Exception):
+    """Imita `botocore.exceptions.ClientError` (atributo `response`)"""
+
+    def __init__(self, code: str, status: int, operation: str):
+        super().__init__(f"An error occurred ({code}) when calling the {operation} operation")
+        self.response = {
+            "Error": {"Code": code},
+            "ResponseMetadata": {"HTTPStatusCode": status},
+        }
+
+
+class FakeS3Client:
+    """`upload_fileobj`, `put_object`, `head_object` e `list_objects_v2` sobre um dict"""
+
+    def __init__(self, latency_ms: float = 0.0):
+        self.latency = latency_ms / 1000
+        self.objects = {}  # (bucket, key) -> {"size", "content_type"}
+        self.puts = 0
+        self.heads = 0
+        self.lists = 0
+        self.bytes_received = 0
+        self._lock = threading.Lock()
+
+    def upload_fileobj(self, Fileobj, Bucket, Key, ExtraArgs=None, Config=None, Callback=None):
+        size = 0
+        for chunk in iter(lambda: Fileobj.read(1024 * 1024), b""):
+            size += len(chunk)
+        self._store(Bucket, Key, size, (ExtraArgs or {}).get("ContentType"))
+
+    def put_object(self, Bucket, Key, Body=b"", ContentType=None, **kwargs):
+        size = len(Body) if isinstance(Body, (bytes, bytearray)) else len(Body.read())
+        self._store(Bucket, Key, size, ContentType)
+        return {"ETag": '"fake"'}
+
+    def head_object(self, Bucket, Key):
+        self._wait()
+        with self._lock:
+            self.heads += 1
+            obj = self.objects.get((Bucket, Key))
+        if obj is None:
+            raise FakeClientError("404", 404, "HeadObject")
+        return {
+            "ContentLength": obj["size"],
+            "ContentType": obj["content_type"],
+            "ETag": obj["etag"],
+        }
+
+    def list_objects_v2(self, Bucket, Prefix="", MaxKeys=1000, ContinuationToken=None, **kwargs):
+        self._wait()
+        with self._lock:
+            self.lists += 1
+            keys = sorted(key for bucket, key in self.objects if bucket == Bucket)
+            start = bisect.bisect_right(keys, ContinuationToken) if ContinuationToken else 0
+            start = max(start, bisect.bisect_left(keys, Prefix))
+            page = []
+            for key in keys[start:]:
+                if not key.startswith(Prefix) or len(page) == MaxKeys:
+                    break
+                obj = self.objects[(Bucket, key)]
+                page.append({"Key": key, "Size": obj["size"], "ETag": obj["etag"]})
+        truncated = len(page) == MaxKeys and start + MaxKeys < len(keys) and keys[
+            start + MaxKeys
+        ].startswith(Prefix)
+        response = {"Contents": page, "KeyCount": len(page), "IsTruncated": truncated}
+        if truncated:
+            response["NextContinuationToken"] = page[-1]["Key"]
+        return response
+
+    def _store(self, bucket: str, key: str, size: int, content_type: str | None):
+        self._wait()
+        with self._lock:
+            self.puts += 1
+            self.bytes_received += size
+            self.objects[(bucket, key)] = {
+                "size": size,
+                "content_type": content_type,
+                "etag": f'"{self.puts:032x}"',
+            }
+
+    def _wait(self):
+        if self.latency:
+            time.sleep(self.latency)
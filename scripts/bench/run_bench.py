@@ -0,0 +1,411 @@
+#!/usr/bin/env python3
+"""
+Benchmark offline dos scripts de migração (migrate / resync)
+
+Sobe localmente um Organizze falso (HTTP), um stub do R2 e um Firestore em
+processo (ou o emulador oficial), executa `migrate()` ou `resync()` de ponta a
+ponta e reporta docs/s, anexos/s, MB/s, pico de RSS e latência p50/p95 de
+cada etapa externa (Organizze, download, upload no R2, escrita no Firestore).
+Nenhum serviço de produção é acessado.
+
+Requisitos: as mesmas dependências dos scripts (scripts/requirements.txt).
+Para usar o emulador: `firebase emulators:start --only firestore` e
+FIRESTORE_EMULATOR_HOST=localhost:8080.
+
+Uso:
+    python scripts/bench/run_bench.py smoke
+    python scripts/bench/run_bench.py realistic --json bench-realistic.json
+    python scripts/bench/run_bench.py all                  # cada cenário em um processo
+    python scripts/bench/run_bench.py custom --target resync --transactions 50000
+    python scripts/bench/run_bench.py large --organizze-rps 1000 --r2-rps 1000
+"""
+
+import argparse
+import importlib
+import json
+import os
+import resource
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from contextlib import redirect_stdout
+from datetime import datetime
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+sys.path.insert(0, str(BENCH_DIR.parent))
+
+from fake_firestore import FakeFirestore
+from fake_organizze import FakeOrganizzeServer, SyntheticData
+from fake_s3 import FakeS3Client
+from scenarios import SCENARIOS
+
+from rate_limiter import add_rate_limit_arguments
+
+BENCH_USER_ID = "bench-user"
+BENCH_BUCKET = "bench"
+BENCH_PUBLIC_URL = "https://bench.r2.dev"
+
+DEFAULTS = {
+    "target": "migrate",
+    "transactions": 1_000,
+    "start_date": "2024-01-01",
+    "end_date": "2024-12-31",
+    "attachment_ratio": 0.1,
+    "attachment_kb": 100,
+    "card_ratio": 0.3,
+    "organizze_latency_ms": 0.0,
+    "organizze_jitter_ms": 0.0,
+    "error_rate": 0.0,
+    "throttle_rate": 0.0,
+    "r2_latency_ms": 0.0,
+    "firestore_latency_ms": 0.0,
+}
+
+
+def percentile(values: list, fraction: float) -> float:
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, round(fraction * (len(ordered) - 1)))]
+
+
+def peak_rss_mb() -> float:
+    # ru_maxrss vem em KB no Linux e em bytes no macOS
+    rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return rss / 1024 / 1024 if sys.platform == "darwin" else rss / 1024
+
+
+class StageTimer:
+    """Latência de cada chamada, agrupada por etapa (thread-safe)"""
+
+    def __init__(self):
+        self.samples = {}
+        self._lock = threading.Lock()
+
+    def wrap(self, name: str, fn):
+        def timed(*args, **kwargs):
+            started = time.perf_counter()
+            try:
+                return fn(*args, **kwargs)
+            finally:
+                self.record(name, time.perf_counter() - started)
+
+        return timed
+
+    def record(self, name: str, seconds: float):
+        with self._lock:
+            self.samples.setdefault(name, []).append(seconds)
+
+    def count(self, name: str) -> int:
+        with self._lock:
+            return len(self.samples.get(name, ()))
+
+    def summary(self) -> dict:
+        with self._lock:
+            samples = {name: list(values) for name, values in self.samples.items()}
+        return {
+            name: {
+                "count": len(values),
+                "p50_ms": percentile(values, 0.50) * 1000,
+                "p95_ms": percentile(values, 0.95) * 1000,
+                "max_ms": max(values) * 1000,
+            }
+            for name, values in samples.items()
+        }
+
+
+def make_firestore(mode: str, latency_ms: float):
+    if mode == "fake":
+        return FakeFirestore(commit_latency_ms=latency_ms, read_latency_ms=latency_ms)
+
+    if not os.getenv("FIRESTORE_EMULATOR_HOST"):
+        print("❌ Defina FIRESTORE_EMULATOR_HOST para usar --firestore emulator")
+        sys.exit(1)
+    import requests
+    from google.cloud import firestore as gcloud_firestore
+
+    project = os.getenv("GCLOUD_PROJECT", "mypay-bench")
+    # Começa de um banco vazio
+    requests.delete(
+        f"http://{os.environ['FIRESTORE_EMULATOR_HOST']}/emulator/v1/projects/"
+        f"{project}/databases/(default)/documents",
+        timeout=30,
+    )
+    return gcloud_firestore.Client(project=project)
+
+
+def load_script(module_name: str):
+    """Importa o script com credenciais apontando para os serviços falsos"""
+    os.environ.update(
+        {
+            "VITE_ORGANIZZE_EMAIL": "bench@example.com",
+            "VITE_ORGANIZZE_API_KEY": "bench",
+            "FIREBASE_USER_ID": BENCH_USER_ID,
+            "VITE_S3_BUCKET_NAME": BENCH_BUCKET,
+            "VITE_S3_PUBLIC_URL": BENCH_PUBLIC_URL,
+            "VITE_S3_PATH_PREFIX": "",
+        }
+    )
+    return importlib.import_module(module_name)
+
+
+def seed_resync(db, data: SyntheticData):
+    """Transações já migradas, com comprovantes apontando para o MinIO antigo"""
+    transactions_ref = db.collection("users").document(BENCH_USER_ID).collection("transactions")
+    batch = db.batch()
+    pending = 0
+    for index in range(data.count):
+        tx = data.transaction(index)
+        doc = {
+            "description": tx["description"],
+            "amount": abs(tx["amount_cents"]) / 100,
+            "type": "income" if tx["amount_cents"] > 0 else "expense",
+            "date": datetime.strptime(tx["date"], "%Y-%m-%d").replace(hour=12),
+            "_organizzeId": tx["id"],
+        }
+        if tx["attachments"]:
+            doc["comprovante"] = {
+                "url": f"http://minio.local:9000/mypay/comprovantes/{tx['id']}.jpg",
+                "fileName": f"comprovante-{tx['id']}.jpg",
+            }
+        batch.set(transactions_ref.document(), doc)
+        pending += 1
+        if pending == 500:
+            batch.commit()
+            batch = db.batch()
+            pending = 0
+    if pending:
+        batch.commit()
+
+
+def instrument_firestore(db, timer: StageTimer):
+    """Mede cada commit de lote e conta os documentos gravados"""
+    original_batch = db.batch
+
+    def batch():
+        write_batch = original_batch()
+        for method in ("set", "update", "delete"):
+            original = getattr(write_batch, method)
+
+            def counted(*args, _original=original, **kwargs):
+                timer.record("firestore_doc", 0.0)
+                return _original(*args, **kwargs)
+
+            setattr(write_batch, method, counted)
+        write_batch.commit = timer.wrap("firestore_commit", write_batch.commit)
+        return write_batch
+
+    db.batch = batch
+
+
+def run_scenario(config: dict, args) -> dict:
+    data = SyntheticData(
+        transactions=config["transactions"],
+        start_date=config["start_date"],
+        end_date=config["end_date"],
+        attachment_ratio=config["attachment_ratio"],
+        attachment_kb=config["attachment_kb"],
+        card_ratio=config["card_ratio"],
+    )
+    db = make_firestore(args.firestore, config["firestore_latency_ms"])
+    target = config["target"]
+    module = load_script("migrate_organizze" if target == "migrate" else "resync_attachments")
+
+    import clients
+    from rate_limiter import configure_limiters
+
+    # Os scripts criam os clientes sob demanda: basta entregar os falsos
+    s3 = FakeS3Client(latency_ms=config["r2_latency_ms"])
+    clients.override(firestore=db, s3=s3)
+    configure_limiters(module.limiters, args)
+
+    if target == "resync":
+        print(f"🌱 Populando o Firestore com {data.count} transações...")
+        seed_resync(db, data)
+
+    timer = StageTimer()
+    instrument_firestore(db, timer)
+    module.organizze.get_json = timer.wrap("organizze", module.organizze.get_json)
+    module.download_attachment = timer.wrap("download", module.download_attachment)
+    upload_name = "upload_to_s3" if target == "migrate" else "upload_to_r2"
+    setattr(module, upload_name, timer.wrap("r2_upload", getattr(module, upload_name)))
+    if target == "resync":
+        limiter = module.limiters["firestore"]
+        limiter.call = timer.wrap("firestore_update", limiter.call)
+
+    server = FakeOrganizzeServer(
+        data,
+        latency_ms=config["organizze_latency_ms"],
+        jitter_ms=config["organizze_jitter_ms"],
+        error_rate=config["error_rate"],
+        throttle_rate=config["throttle_rate"],
+    )
+    log_path = Path(args.log or tempfile.mkstemp(prefix=f"bench-{target}-", suffix=".log")[1])
+    error = None
+    with tempfile.TemporaryDirectory() as workdir, server, open(log_path, "w") as log:
+        module.organizze.base_url = server.url
+        started = time.perf_counter()
+        try:
+            with redirect_stdout(log):
+                if target == "migrate":
+                    module.migrate(
+                        config["start_date"],
+                        config["end_date"],
+                        batch_size=args.batch_size,
+                        attachment_workers=args.attachment_workers,
+                        fetch_workers=args.fetch_workers,
+                        journal_path=Path(workdir) / "journal.sqlite",
+                    )
+                else:
+                    module.resync(
+                        attachment_workers=args.attachment_workers,
+                        fetch_workers=args.fetch_workers,
+                    )
+        except SystemExit as e:
+            error = f"SystemExit({e.code})"
+        except Exception as e:
+            error = repr(e)
+        elapsed = time.perf_counter() - started
+
+    docs = timer.count("firestore_doc") + timer.count("firestore_update")
+    attachments = timer.count("r2_upload")
+    stages = timer.summary()
+    stages.pop("firestore_doc", None)
+    return {
+        "scenario": config.get("name", "custom"),
+        "target": target,
+        "config": config,
+        "error": error,
+        "elapsed_s": elapsed,
+        "docs": docs,
+        "docs_per_s": docs / elapsed if elapsed else 0,
+        "attachments": attachments,
+        "attachments_per_s": attachments / elapsed if elapsed else 0,
+        "attachment_mb": server.attachment_bytes / 1024 / 1024,
+        "mb_per_s": server.attachment_bytes / 1024 / 1024 / elapsed if elapsed else 0,
+        "peak_rss_mb": peak_rss_mb(),
+        "organizze_requests": server.requests,
+        "errors_injected": server.errors_injected,
+        "r2_objects": len(s3.objects),
+        "stages": stages,
+        "script_metrics": module.metrics.report() if hasattr(module, "metrics") else None,
+        "log": str(log_path),
+    }
+
+
+def print_report(report: dict):
+    print(f"\n📊 {report['scenario']} ({report['target']}) em {report['elapsed_s']:.1f}s")
+    if report["error"]:
+        print(f"   ❌ Terminou com erro: {report['error']} (veja {report['log']})")
+    print(f"   Documentos:  {report['docs']:>9} ({report['docs_per_s']:.1f}/s)")
+    print(f"   Anexos:      {report['attachments']:>9} ({report['attachments_per_s']:.1f}/s)")
+    print(f"   Download:    {report['attachment_mb']:>9.1f} MB ({report['mb_per_s']:.2f} MB/s)")
+    print(f"   Pico de RSS: {report['peak_rss_mb']:>9.1f} MB")
+    print(
+        f"   Organizze:   {report['organizze_requests']:>9} requisições "
+        f"({report['errors_injected']} erros injetados)"
+    )
+    print("   Etapa              chamadas     p50 ms     p95 ms     máx ms")
+    for name, stats in sorted(report["stages"].items()):
+        print(
+            f"   {name:<18} {stats['count']:>8} {stats['p50_ms']:>10.1f} "
+            f"{stats['p95_ms']:>10.1f} {stats['max_ms']:>10.1f}"
+        )
+    print(f"   Log do script: {report['log']}")
+
+
+def run_all(args) -> list:
+    """Roda cada cenário em um processo separado (pico de RSS isolado)"""
+    reports = []
+    for name in SCENARIOS:
+        with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as output:
+            json_path = output.name
+        command = [sys.executable, __file__, name, "--json", json_path, "--quiet"]
+        command += ["--firestore", args.firestore]
+        command += ["--organizze-rps", str(args.organizze_rps), "--r2-rps", str(args.r2_rps)]
+        command += ["--firestore-rps", str(args.firestore_rps)]
+        command += ["--attachments-rps", str(args.attachments_rps)]
+        for service in ("organizze", "r2", "firestore"):
+            target = getattr(args, f"{service}_latency_target")
+            command += [f"--{service}-latency-target", str(target)]
+        print(f"▶️  {name}...")
+        subprocess.run(command, check=False)
+        try:
+            reports.append(json.loads(Path(json_path).read_text()))
+        except (OSError, json.JSONDecodeError):
+            print(f"   ❌ {name} não gerou relatório")
+        finally:
+            Path(json_path).unlink(missing_ok=True)
+
+    print("\n" + "=" * 78)
+    print(f"{'cenário':<14} {'docs/s':>9} {'anexos/s':>9} {'MB/s':>7} {'RSS MB':>8} {'tempo s':>9}  erro")
+    for report in reports:
+        print(
+            f"{report['scenario']:<14} {report['docs_per_s']:>9.1f} "
+            f"{report['attachments_per_s']:>9.1f} {report['mb_per_s']:>7.2f} "
+            f"{report['peak_rss_mb']:>8.1f} {report['elapsed_s']:>9.1f}  {report['error'] or ''}"
+        )
+    return reports
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark offline dos scripts de migração")
+    parser.add_argument(
+        "scenario",
+        choices=[*SCENARIOS, "custom", "all"],
+        help="Cenário pré-definido, 'custom' (só as opções abaixo) ou 'all'",
+    )
+    parser.add_argument("--target", choices=["migrate", "resync"])
+    parser.add_argument("--transactions", type=int, help="Transações sintéticas (1k a 1M)")
+    parser.add_argument("--start-date", help="Início do período sintético (YYYY-MM-DD)")
+    parser.add_argument("--end-date", help="Fim do período sintético (YYYY-MM-DD)")
+    parser.add_argument("--attachment-ratio", type=float, help="Fração de transações com anexo")
+    parser.add_argument("--attachment-kb", type=int, help="Tamanho de cada anexo em KB")
+    parser.add_argument("--card-ratio", type=float, help="Fração de transações de cartão")
+    parser.add_argument("--organizze-latency-ms", type=float)
+    parser.add_argument("--organizze-jitter-ms", type=float)
+    parser.add_argument("--error-rate", type=float, help="Fração de respostas 503 do Organizze")
+    parser.add_argument("--throttle-rate", type=float, help="Fração de respostas 429 do Organizze")
+    parser.add_argument("--r2-latency-ms", type=float)
+    parser.add_argument("--firestore-latency-ms", type=float)
+    parser.add_argument(
+        "--firestore",
+        choices=["fake", "emulator"],
+        default="fake",
+        help="Firestore em processo ou o emulador (FIRESTORE_EMULATOR_HOST)",
+    )
+    parser.add_argument("--batch-size", type=int, default=500)
+    parser.add_argument("--attachment-workers", type=int, default=4)
+    parser.add_argument("--fetch-workers", type=int, default=4)
+    parser.add_argument("--json", help="Grava o relatório em JSON neste arquivo")
+    parser.add_argument("--log", help="Arquivo para a saída do script (padrão: temporário)")
+    parser.add_argument("--quiet", action="store_true", help="Não imprime o relatório")
+    add_rate_limit_arguments(parser)
+    args = parser.parse_args()
+
+    if args.scenario == "all":
+        run_all(args)
+        return
+
+    config = dict(DEFAULTS)
+    config.update(SCENARIOS.get(args.scenario, {}))
+    for key in DEFAULTS:
+        value = getattr(args, key)
+        if value is not None:
+            config[key] = value
+    config["name"] = args.scenario
+
+    report = run_scenario(config, args)
+    if args.json:
+        Path(args.json).write_text(json.dumps(report, indent=2, default=str))
+    if not args.quiet:
+        print_report(report)
+    if report["error"]:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
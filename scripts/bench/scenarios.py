@@ -0,0 +1,75 @@
+"""
+Cenários de benchmark pré-definidos
+
+Cada cenário define o volume de dados sintéticos, a latência/erros injetados
+em cada serviço falso e qual função dos scripts é executada (`migrate` ou
+`resync`). Valores omitidos usam os padrões de `run_bench.py`.
+"""
+
+SCENARIOS = {
+    # Sanidade: roda em segundos, sem latência
+    "smoke": {
+        "target": "migrate",
+        "transactions": 1_000,
+        "attachment_ratio": 0.1,
+        "attachment_kb": 50,
+    },
+    # Próximo de produção: latências de rede e 1% de 503 no Organizze
+    "realistic": {
+        "target": "migrate",
+        "transactions": 10_000,
+        "attachment_ratio": 0.1,
+        "attachment_kb": 300,
+        "organizze_latency_ms": 80,
+        "organizze_jitter_ms": 40,
+        "error_rate": 0.01,
+        "r2_latency_ms": 30,
+        "firestore_latency_ms": 40,
+    },
+    # Organizze instável: 503 e 429 frequentes (retry + limitador adaptativo)
+    "flaky": {
+        "target": "migrate",
+        "transactions": 5_000,
+        "attachment_ratio": 0.05,
+        "attachment_kb": 100,
+        "organizze_latency_ms": 50,
+        "error_rate": 0.05,
+        "throttle_rate": 0.02,
+    },
+    # Histórico grande com poucos anexos
+    "large": {
+        "target": "migrate",
+        "transactions": 100_000,
+        "attachment_ratio": 0.02,
+        "attachment_kb": 50,
+        "organizze_latency_ms": 20,
+        "firestore_latency_ms": 20,
+    },
+    # Limite superior: 1M de transações (memória e throughput de escrita)
+    "huge": {
+        "target": "migrate",
+        "transactions": 1_000_000,
+        "attachment_ratio": 0.001,
+        "attachment_kb": 20,
+        "start_date": "2015-01-01",
+        "end_date": "2024-12-31",
+    },
+    # Re-sincronização de comprovantes do MinIO antigo
+    "resync": {
+        "target": "resync",
+        "transactions": 10_000,
+        "attachment_ratio": 0.2,
+        "attachment_kb": 200,
+        "organizze_latency_ms": 50,
+        "r2_latency_ms": 30,
+        "firestore_latency_ms": 30,
+    },
+    "resync-large": {
+        "target": "resync",
+        "transactions": 100_000,
+        "attachment_ratio": 0.05,
+        "attachment_kb": 50,
+        "organizze_latency_ms": 20,
+        "firestore_latency_ms": 10,
+    },
+}
@@ -0,0 +1,124 @@
+#!/usr/bin/env python3
+"""
+Tempo de inicialização dos scripts de migração
+
+Mede, em processos novos, quanto custa `--help` e um `--dry-run` curto contra
+o Organizze falso (sem Firestore nem R2 de verdade), e quais módulos pesados
+(firebase_admin, google.cloud.firestore, boto3) chegaram a ser importados.
+
+Uso:
+    python scripts/bench/startup.py
+    python scripts/bench/startup.py --runs 10
+"""
+
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+BENCH_DIR = Path(__file__).resolve().parent
+SCRIPTS_DIR = BENCH_DIR.parent
+sys.path.insert(0, str(BENCH_DIR))
+
+from fake_organizze import FakeOrganizzeServer, SyntheticData
+
+HEAVY_MODULES = ("firebase_admin", "google.cloud.firestore_v1", "boto3")
+
+# Roda o script no processo filho e informa os módulos pesados carregados
+PROBE = """
+import atexit, json, runpy, sys
+sys.argv = {argv!r}
+sys.path.insert(0, {scripts!r})
+import organizze_client
+organizze_client.ORGANIZZE_BASE_URL = {base_url!r}
+atexit.register(lambda: print("@@modules " + json.dumps(
+    [m for m in {heavy!r} if m in sys.modules]), file=sys.stderr))
+runpy.run_path({script!r}, run_name="__main__")
+"""
+
+
+def measure(script: str, argv: list, env: dict, base_url: str, runs: int) -> dict:
+    path = SCRIPTS_DIR / script
+    code = PROBE.format(
+        argv=[str(path), *argv],
+        scripts=str(SCRIPTS_DIR),
+        base_url=base_url,
+        heavy=HEAVY_MODULES,
+        script=str(path),
+    )
+    timings = []
+    modules = []
+    returncode = 0
+    for _ in range(runs):
+        started = time.perf_counter()
+        result = subprocess.run(
+            [sys.executable, "-c", code], env=env, capture_output=True, text=True
+        )
+        timings.append(time.perf_counter() - started)
+        returncode = result.returncode
+        for line in result.stderr.splitlines():
+            if line.startswith("@@modules "):
+                modules = json.loads(line.split(" ", 1)[1])
+    return {
+        "script": script,
+        "args": " ".join(argv),
+        "median_s": statistics.median(timings),
+        "min_s": min(timings),
+        "returncode": returncode,
+        "heavy_modules": modules,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Tempo de inicialização dos scripts")
+    parser.add_argument("--runs", type=int, default=5, help="Execuções por comando")
+    parser.add_argument("--json", help="Grava os resultados neste arquivo")
+    args = parser.parse_args()
+
+    data = SyntheticData(transactions=200, start_date="2024-01-01", end_date="2024-01-31")
+    with FakeOrganizzeServer(data) as server, tempfile.TemporaryDirectory() as workdir:
+        env = dict(os.environ)
+        env.update(
+            {
+                "VITE_ORGANIZZE_EMAIL": "bench@example.com",
+                "VITE_ORGANIZZE_API_KEY": "bench",
+                "FIREBASE_USER_ID": "bench-user",
+                # Credencial inválida: nada deve tentar usá-la num dry-run
+                "FIREBASE_CREDENTIALS": env.get("FIREBASE_CREDENTIALS", '{"type": "x"}'),
+                "VITE_S3_ENDPOINT_URL": "http://127.0.0.1:9",
+                "VITE_S3_ACCESS_KEY_ID": "bench",
+                "VITE_S3_SECRET_ACCESS_KEY": "bench",
+            }
+        )
+        dry_run = [
+            "--start-date", "2024-01-01", "--end-date", "2024-01-31", "--dry-run",
+            "--no-cache", "--report", str(Path(workdir) / "report.json"),
+        ]
+        results = [
+            measure("migrate_organizze.py", ["--help"], env, server.url, args.runs),
+            measure("migrate_organizze.py", dry_run, env, server.url, args.runs),
+            measure("resync_attachments.py", ["--help"], env, server.url, args.runs),
+        ]
+
+    print(f"{'comando':<52} {'mediana':>8} {'mínimo':>8}  módulos pesados")
+    for r in results:
+        command = f"{r['script']} {r['args']}"
+        if len(command) > 50:
+            command = command[:47] + "..."
+        status = "" if r["returncode"] == 0 else f"  (saída {r['returncode']})"
+        print(
+            f"{command:<52} {r['median_s']:>7.2f}s {r['min_s']:>7.2f}s  "
+            f"{', '.join(r['heavy_modules']) or '-'}{status}"
+        )
+
+    if args.json:
+        Path(args.json).write_text(json.dumps(results, indent=2))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,138 @@
+"""
+Clientes do Firestore e do R2, criados sob demanda
+
+Os scripts não inicializam mais o firebase-admin nem o boto3 ao serem
+importados: `firestore_client()` e `s3_client()` fazem o import e leem as
+credenciais do ambiente só na primeira chamada, e reaproveitam o cliente nas
+seguintes. Assim `--help` e `--dry-run` (que não grava nada) não pagam o custo
+desses imports e não dependem do Firestore/R2 estarem configurados.
+
+`override()` troca os clientes por outros já prontos (benchmarks, emulador).
+"""
+
+import json
+import os
+import sys
+import threading
+from pathlib import Path
+
+_lock = threading.Lock()
+_firestore = None
+_s3 = None
+_s3_ready = False
+_transfer_config = None
+
+# Partes de um upload multipart enviadas ao mesmo tempo (cada uma, uma conexão)
+DEFAULT_MULTIPART_CONCURRENCY = 4
+_multipart_concurrency = DEFAULT_MULTIPART_CONCURRENCY
+
+
+def _firebase_credentials():
+    """Certificado da service account (caminho do arquivo ou JSON no .env)"""
+    from firebase_admin import credentials
+
+    firebase_creds = os.getenv("FIREBASE_CREDENTIALS")
+    if not firebase_creds:
+        print("❌ FIREBASE_CREDENTIALS não configurado no .env")
+        print("   Use o caminho do arquivo JSON ou o conteúdo JSON direto")
+        sys.exit(1)
+
+    # Verificar se é um caminho de arquivo ou JSON direto
+    if firebase_creds.startswith("/") or firebase_creds.startswith("."):
+        cred_path = Path(firebase_creds)
+        if not cred_path.exists():
+            print(f"❌ Arquivo de credenciais não encontrado: {cred_path}")
+            sys.exit(1)
+        return credentials.Certificate(str(cred_path))
+
+    try:
+        return credentials.Certificate(json.loads(firebase_creds))
+    except json.JSONDecodeError as e:
+        print(f"❌ Erro ao parsear FIREBASE_CREDENTIALS: {e}")
+        sys.exit(1)
+
+
+def firestore_client():
+    """Cliente do Firestore (inicializa o Firebase na primeira chamada)"""
+    global _firestore
+    if _firestore is None:
+        with _lock:
+            if _firestore is None:
+                import firebase_admin
+                from firebase_admin import firestore
+
+                try:
+                    firebase_admin.get_app()
+                except ValueError:
+                    firebase_admin.initialize_app(_firebase_credentials())
+                _firestore = firestore.client()
+    return _firestore
+
+
+def s3_client():
+    """Cliente do R2, ou None se as credenciais não estiverem no .env"""
+    global _s3, _s3_ready
+    if not _s3_ready:
+        with _lock:
+            if not _s3_ready:
+                endpoint_url = os.getenv("VITE_S3_ENDPOINT_URL")
+                access_key_id = os.getenv("VITE_S3_ACCESS_KEY_ID")
+                secret_access_key = os.getenv("VITE_S3_SECRET_ACCESS_KEY")
+                if endpoint_url and access_key_id and secret_access_key:
+                    import boto3
+
+                    _s3 = boto3.client(
+                        "s3",
+                        endpoint_url=endpoint_url,
+                        aws_access_key_id=access_key_id,
+                        aws_secret_access_key=secret_access_key,
+                        region_name=os.getenv("VITE_S3_REGION", "auto"),
+                    )
+                _s3_ready = True
+    return _s3
+
+
+def s3_transfer_config():
+    """Uploads acima de 8 MB usam multipart gerenciado pelo boto3"""
+    global _transfer_config
+    if _transfer_config is None:
+        from boto3.s3.transfer import TransferConfig
+
+        _transfer_config = TransferConfig(
+            multipart_threshold=8 * 1024 * 1024,
+            multipart_chunksize=8 * 1024 * 1024,
+            max_concurrency=_multipart_concurrency,
+        )
+    return _transfer_config
+
+
+def set_multipart_concurrency(max_concurrency: int):
+    """Conexões por upload multipart (o migrate_users divide o teto do R2)"""
+    global _multipart_concurrency, _transfer_config
+    _multipart_concurrency = max(1, max_concurrency)
+    _transfer_config = None
+
+
+def server_timestamp():
+    """Sentinela do Firestore para o horário do servidor"""
+    from google.cloud.firestore_v1.transforms import SERVER_TIMESTAMP
+
+    return SERVER_TIMESTAMP
+
+
+def delete_field():
+    """Sentinela do Firestore que remove um campo no update"""
+    from google.cloud.firestore_v1.transforms import DELETE_FIELD
+
+    return DELETE_FIELD
+
+
+def override(firestore=None, s3=None):
+    """Usa clientes já criados no lugar dos de produção"""
+    global _firestore, _s3, _s3_ready
+    with _lock:
+        if firestore is not None:
+            _firestore = firestore
+        if s3 is not None:
+            _s3 = s3
+            _s3_ready = True
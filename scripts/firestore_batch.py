@@ -0,0 +1,211 @@
+"""
+Escrita em lote no Firestore para os scripts de migração
+
+Agrupa as escritas em WriteBatch de até 500 operações (limite do Firestore),
+fazendo um único round trip por lote em vez de um por documento. Lotes que
+falham são re-tentados isoladamente; se continuarem falhando, os documentos
+do lote ficam registrados em `failed` sem interromper o restante da execução.
+
+Com `split_failed`, um lote que esgota as tentativas é gravado de novo
+documento a documento: só os que falham de fato (ex.: apagados no meio do
+caminho, num update) vão para `failed`, como no BulkWriter do Firestore.
+
+`upsert(ref, data, keep)` grava com merge num id determinístico sem
+sobrescrever o que o app mantém: no commit, um único `get_all` por lote
+descobre quais documentos já existem, e nesses `createdAt` e os campos de
+`keep` ficam de fora da escrita.
+
+`on_commit(ops)` é chamado após cada lote gravado com a lista de
+`(operação, ref, dados)`, permitindo registrar checkpoints em bloco. Com um
+`limiter`, cada commit passa pelo limitador adaptativo do Firestore; com
+`metrics`, a latência de cada commit e os documentos gravados são registrados.
+"""
+
+import time
+
+from metrics import timed
+from rate_limiter import is_throttle_error
+
+# Limite de operações por WriteBatch imposto pelo Firestore
+MAX_BATCH_SIZE = 500
+
+
+class BatchWriter:
+    """Acumula escritas e faz commit em lotes de `batch_size` documentos"""
+
+    def __init__(
+        self,
+        db,
+        batch_size: int = MAX_BATCH_SIZE,
+        max_retries: int = 3,
+        on_commit=None,
+        limiter=None,
+        metrics=None,
+        split_failed: bool = False,
+    ):
+        self.db = db
+        self.on_commit = on_commit
+        self.limiter = limiter
+        self.metrics = metrics
+        self.batch_size = max(1, min(batch_size, MAX_BATCH_SIZE))
+        self.max_retries = max(1, max_retries)
+        self.split_failed = split_failed
+        self.committed = 0
+        self.batches = 0
+        self.failed = []  # [{"path", "organizzeId", "error", "batch"}]
+        self._batch_count = 0
+        self._pending = []  # [(operação, ref, dados)]
+
+    def add(self, collection_ref, data: dict):
+        """Equivalente a `collection_ref.add(data)`, mas dentro do lote atual"""
+        ref = collection_ref.document()
+        self.set(ref, data)
+        return ref
+
+    def set(self, ref, data: dict, merge: bool = False):
+        self._enqueue(("set_merge" if merge else "set", ref, data))
+
+    def update(self, ref, data: dict):
+        self._enqueue(("update", ref, data))
+
+    def upsert(self, ref, data: dict, keep: tuple = ()):
+        """`set(merge=True)` que preserva `createdAt` e `keep` se `ref` já existe"""
+        self._enqueue(("upsert", ref, data, keep))
+
+    def delete(self, ref, organizze_id=None):
+        """Remove `ref`; o id do Organizze só serve para relatórios/journal"""
+        self._enqueue(("delete", ref, {"_organizzeId": organizze_id}))
+
+    def flush(self) -> bool:
+        """Faz commit do que estiver pendente. Retorna False se o lote falhou"""
+        if not self._pending:
+            return True
+        ops, self._pending = self._pending, []
+        return self._commit(ops)
+
+    def close(self) -> dict:
+        self.flush()
+        return {
+            "committed": self.committed,
+            "batches": self.batches,
+            "failed": len(self.failed),
+        }
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _enqueue(self, op: tuple):
+        self._pending.append(op)
+        if len(self._pending) >= self.batch_size:
+            self.flush()
+
+    def _commit(self, ops: list, max_retries: int | None = None) -> bool:
+        self._batch_count += 1
+        batch_number = self._batch_count
+        max_retries = max_retries or self.max_retries
+        last_error = None
+
+        for attempt in range(1, max_retries + 1):
+            try:
+                ops = self._resolve_upserts(ops)
+            except Exception as e:
+                last_error = e
+                print(
+                    f"      ⚠️  Lote {batch_number}: leitura dos existentes falhou "
+                    f"(tentativa {attempt}/{max_retries}): {e}"
+                )
+                if attempt < max_retries:
+                    time.sleep(0.5 * 2**attempt)
+                continue
+            batch = self.db.batch()
+            for op, ref, data in ops:
+                if op == "set":
+                    batch.set(ref, data)
+                elif op == "set_merge":
+                    batch.set(ref, data, merge=True)
+                elif op == "delete":
+                    batch.delete(ref)
+                else:
+                    batch.update(ref, data)
+            if self.limiter:
+                self.limiter.acquire()
+            started = time.monotonic()
+            try:
+                with timed(
+                    self.metrics,
+                    "firestore_commit",
+                    documents=len(ops),
+                    first_document=ops[0][1].path,
+                ):
+                    batch.commit()
+                if self.metrics:
+                    self.metrics.incr("firestore_documents", len(ops))
+                if self.limiter:
+                    self.limiter.on_success(time.monotonic() - started)
+                self.committed += len(ops)
+                self.batches += 1
+                if self.on_commit:
+                    self.on_commit(ops)
+                return True
+            except Exception as e:
+                last_error = e
+                if self.limiter and is_throttle_error(e):
+                    self.limiter.on_throttle()
+                print(
+                    f"      ⚠️  Lote {batch_number} falhou "
+                    f"(tentativa {attempt}/{max_retries}): {e}"
+                )
+                if attempt < max_retries:
+                    time.sleep(0.5 * 2**attempt)
+
+        # Limite de taxa é transitório: gravar um a um só pioraria
+        if self.split_failed and len(ops) > 1 and not is_throttle_error(last_error):
+            print(f"      🔎 Lote {batch_number}: gravando os {len(ops)} documentos um a um")
+            results = [self._commit([op], max_retries=1) for op in ops]
+            return all(results)
+
+        print(f"      ❌ Lote {batch_number} descartado ({len(ops)} documentos)")
+        if self.metrics:
+            self.metrics.incr("firestore_failed_documents", len(ops))
+        for _, ref, data, *_ in ops:
+            self.failed.append(
+                {
+                    "path": ref.path,
+                    "organizzeId": data.get("_organizzeId"),
+                    "error": str(last_error),
+                    "batch": batch_number,
+                }
+            )
+        return False
+
+    def _resolve_upserts(self, ops: list) -> list:
+        """Troca os upserts por `set_merge`, sem os campos preservados dos existentes"""
+        refs = [op[1] for op in ops if op[0] == "upsert"]
+        if not refs:
+            return ops
+        with timed(self.metrics, "firestore_exists", documents=len(refs)):
+            if self.limiter:
+                snapshots = self.limiter.call(
+                    lambda: list(self.db.get_all(refs, field_paths=["_organizzeId"]))
+                )
+            else:
+                snapshots = list(self.db.get_all(refs, field_paths=["_organizzeId"]))
+        existing = {snapshot.reference.path for snapshot in snapshots if snapshot.exists}
+
+        resolved = []
+        for op in ops:
+            if op[0] != "upsert":
+                resolved.append(op)
+                continue
+            _, ref, data, keep = op
+            if ref.path in existing:
+                data = {
+                    key: value
+                    for key, value in data.items()
+                    if key != "createdAt" and key not in keep
+                }
+            resolved.append(("set_merge", ref, data))
+        return resolved
@@ -0,0 +1,40 @@
+"""
+Leitura paginada do Firestore para os scripts de migração
+
+Em vez de `list(collection.stream())`, as consultas são lidas em páginas de
+`page_size` documentos com cursor (`start_after`), usando projeção (`select`)
+para trazer só os campos necessários. A memória e a latência passam a
+depender do conjunto filtrado, não da coleção inteira.
+"""
+
+DEFAULT_PAGE_SIZE = 500
+
+
+def stream_paged(query, page_size: int = DEFAULT_PAGE_SIZE, order_by: tuple = ()):
+    """Gera os documentos de `query` página por página
+
+    `order_by` deve listar os campos com filtro de desigualdade (o Firestore
+    exige que venham primeiro na ordenação); o id do documento fecha a
+    ordenação para o cursor ser estável. Com projeção (`select`), os campos
+    de `order_by` também precisam estar nela: o cursor é montado a partir
+    do último documento da página.
+    """
+    # Import tardio: só quem lê do Firestore paga pelo google-cloud-firestore
+    from google.cloud.firestore_v1.field_path import FieldPath
+
+    for field in order_by:
+        query = query.order_by(field)
+    query = query.order_by(FieldPath.document_id())
+
+    cursor = None
+    while True:
+        page_query = query.limit(page_size)
+        if cursor is not None:
+            page_query = page_query.start_after(cursor)
+
+        page = list(page_query.stream())
+        yield from page
+
+        if len(page) < page_size:
+            return
+        cursor = page[-1]
@@ -0,0 +1,230 @@
+"""
+Otimização dos comprovantes em imagem antes do upload para o R2
+
+Fotos de recibo tiradas no celular chegam com vários MB e o app baixa a
+imagem inteira só para mostrar a prévia. Com `--optimize-images`, anexos
+JPEG/PNG são recodificados em WebP (qualidade configurável), sem EXIF (a
+orientação é aplicada antes de descartá-lo), e ganham uma miniatura WebP
+gravada ao lado do original (`<chave>.thumb.webp`). A URL da miniatura e o
+tamanho original vão para os metadados do anexo.
+
+A decodificação e a recodificação usam CPU: rodam num pool de processos
+(`spawn`, seguro com as threads de transferência), enquanto as threads de
+anexos continuam baixando e enviando. O anexo e os resultados trafegam como
+arquivos temporários, não como bytes: a thread de transferência não passa a
+segurar a imagem inteira em memória além do que o orçamento do
+AttachmentPool já reservou. Imagens que o Pillow não consegue abrir (ou
+grandes demais, `DecompressionBombError`) e as que ficariam maiores em WebP
+seguem sem alteração.
+
+Requer `Pillow` (só importado nos processos do pool).
+"""
+
+import os
+import shutil
+import sys
+import threading
+from tempfile import NamedTemporaryFile
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import get_context
+from pathlib import PurePosixPath
+
+from metrics import timed
+
+DEFAULT_QUALITY = 80
+DEFAULT_THUMBNAIL_SIZE = 320  # pixels no maior lado
+THUMBNAIL_QUALITY = 60
+OPTIMIZED_TYPES = ("image/jpeg", "image/png")
+
+
+def _encode(
+    source: str, optimized: str, thumbnail: str, quality: int, thumbnail_size: int
+) -> bool:
+    """Executado no pool: grava o WebP e a miniatura; False se não for imagem"""
+    from PIL import Image, ImageOps, UnidentifiedImageError
+
+    try:
+        with Image.open(source) as image:
+            # Fotos de celular guardam a rotação no EXIF, que será descartado
+            image = ImageOps.exif_transpose(image)
+            has_alpha = image.mode in ("RGBA", "LA") or "transparency" in image.info
+            image = image.convert("RGBA" if has_alpha else "RGB")
+            image.save(optimized, "WEBP", quality=quality, method=4)
+
+            image.thumbnail((thumbnail_size, thumbnail_size))
+            image.save(thumbnail, "WEBP", quality=THUMBNAIL_QUALITY, method=4)
+    except (UnidentifiedImageError, Image.DecompressionBombError, OSError, ValueError):
+        return False
+    return True
+
+
+def _temp_path(suffix: str) -> str:
+    with NamedTemporaryFile(suffix=suffix, delete=False) as f:
+        return f.name
+
+
+def _remove(*paths: str):
+    for path in paths:
+        try:
+            os.unlink(path)
+        except FileNotFoundError:
+            pass
+
+
+def webp_filename(filename: str) -> str:
+    return str(PurePosixPath(filename).with_suffix(".webp"))
+
+
+def thumbnail_key(key: str) -> str:
+    """Chave da miniatura, ao lado do objeto principal"""
+    return f"{PurePosixPath(key).with_suffix('')}.thumb.webp"
+
+
+class OptimizedImage:
+    """Resultado da otimização de um anexo
+
+    `body` e `thumbnail` são arquivos temporários abertos: chame `close()`
+    depois do upload para removê-los.
+    """
+
+    def __init__(self, body_path: str, filename: str, thumbnail_path: str, original_size: int):
+        self.body = open(body_path, "rb")
+        self.content_type = "image/webp"
+        self.filename = filename
+        self.size = os.path.getsize(body_path)
+        self.thumbnail = open(thumbnail_path, "rb")
+        self.original_size = original_size
+        self._paths = (body_path, thumbnail_path)
+
+    def close(self):
+        self.body.close()
+        self.thumbnail.close()
+        _remove(*self._paths)
+
+
+class ImageOptimizer:
+    """Recodifica comprovantes em WebP e gera miniaturas num pool de processos"""
+
+    def __init__(
+        self,
+        quality: int = DEFAULT_QUALITY,
+        thumbnail_size: int = DEFAULT_THUMBNAIL_SIZE,
+        workers: int | None = None,
+    ):
+        self.quality = quality
+        self.thumbnail_size = thumbnail_size
+        self.workers = max(1, workers or os.cpu_count() or 1)
+        self.metrics = None  # Metrics opcional (tempo e bytes economizados)
+        self.optimized = 0
+        self.saved_bytes = 0
+        self._executor = None
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def check():
+        """Encerra com uma mensagem clara se o Pillow não estiver instalado"""
+        try:
+            import PIL  # noqa: F401
+        except ImportError:
+            print("❌ --optimize-images precisa do Pillow: pip install Pillow")
+            sys.exit(1)
+
+    def optimize(self, body, content_type: str, filename: str) -> OptimizedImage | None:
+        """Versão WebP + miniatura de um anexo, ou None se não se aplicar
+
+        `body` são bytes ou um arquivo (copiado em blocos para um arquivo
+        temporário e devolvido ao início). None também quando o WebP não
+        ficaria menor que o original.
+        """
+        if content_type.split(";")[0].strip().lower() not in OPTIMIZED_TYPES:
+            return None
+
+        source = _temp_path(PurePosixPath(filename).suffix)
+        optimized = _temp_path(".webp")
+        thumbnail = _temp_path(".thumb.webp")
+        try:
+            with open(source, "wb") as f:
+                if isinstance(body, (bytes, bytearray)):
+                    f.write(body)
+                else:
+                    body.seek(0)
+                    shutil.copyfileobj(body, f)
+                    body.seek(0)
+            original_size = os.path.getsize(source)
+
+            with timed(self.metrics, "image_optimize", filename=filename, bytes=original_size):
+                encoded = self._pool().submit(
+                    _encode, source, optimized, thumbnail, self.quality, self.thumbnail_size
+                ).result()
+            if not encoded or os.path.getsize(optimized) >= original_size:
+                _remove(optimized, thumbnail)
+                return None
+            result = OptimizedImage(optimized, webp_filename(filename), thumbnail, original_size)
+        except BaseException:
+            _remove(optimized, thumbnail)
+            raise
+        finally:
+            _remove(source)
+
+        saved = original_size - result.size
+        with self._lock:
+            self.optimized += 1
+            self.saved_bytes += saved
+        if self.metrics:
+            self.metrics.incr("images_optimized")
+            self.metrics.incr("image_bytes_saved", saved)
+        return result
+
+    def shutdown(self):
+        if self._executor is not None:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    def _pool(self) -> ProcessPoolExecutor:
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.workers, mp_context=get_context("spawn")
+                )
+            return self._executor
+
+
+def add_image_arguments(parser):
+    """Opções de linha de comando da otimização de imagens"""
+    parser.add_argument(
+        "--optimize-images",
+        action="store_true",
+        help="Converter comprovantes JPEG/PNG para WebP (sem EXIF) e gerar miniaturas",
+    )
+    parser.add_argument(
+        "--image-quality",
+        type=int,
+        default=DEFAULT_QUALITY,
+        help="Qualidade WebP (1-100) dos comprovantes otimizados",
+    )
+    parser.add_argument(
+        "--thumbnail-size",
+        type=int,
+        default=DEFAULT_THUMBNAIL_SIZE,
+        help="Maior lado, em pixels, das miniaturas",
+    )
+    parser.add_argument(
+        "--image-workers",
+        type=int,
+        default=0,
+        help="Processos recodificando imagens (0 = um por CPU)",
+    )
+
+
+def make_image_optimizer(args, metrics=None) -> ImageOptimizer | None:
+    """ImageOptimizer configurado pela linha de comando (None sem --optimize-images)"""
+    if not args.optimize_images:
+        return None
+    ImageOptimizer.check()
+    optimizer = ImageOptimizer(
+        quality=min(100, max(1, args.image_quality)),
+        thumbnail_size=max(16, args.thumbnail_size),
+        workers=args.image_workers or None,
+    )
+    optimizer.metrics = metrics
+    return optimizer
@@ -0,0 +1,275 @@
+"""
+Métricas estruturadas dos scripts de migração
+
+`Metrics` acumula contadores e histogramas de latência (buckets fixos, como
+no Prometheus) de cada chamada externa: busca no Organizze, download de
+anexo, PUT/HEAD no R2 e escrita no Firestore. Ao final, o relatório vai para
+um JSON (`write_json`) e, opcionalmente, para um textfile do node_exporter
+(`write_prometheus`). A memória é constante: só os buckets são guardados, e
+p50/p95 são estimados por interpolação dentro do bucket.
+
+Com um `tracer` (ver `tracing.py`), cada medição também vira um span, com os
+atributos passados a `time()`/`observe()` (endpoint, URL, chave, documento).
+
+`Progress` mostra throughput e ETA ao vivo no console.
+"""
+
+import json
+import os
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+from datetime import datetime
+from pathlib import Path
+
+DEFAULT_REPORT_DIR = Path(__file__).parent / ".run_reports"
+DEFAULT_PROGRESS_INTERVAL = 10.0
+
+# Limites superiores dos buckets, em segundos
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0,
+)
+
+
+class Histogram:
+    """Histograma de latência com buckets cumulativos"""
+
+    def __init__(self, buckets: tuple = LATENCY_BUCKETS):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # último: +Inf
+        self.count = 0
+        self.sum = 0.0
+        self.max = 0.0
+
+    def observe(self, value: float):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                break
+        else:
+            index = len(self.buckets)
+        self.counts[index] += 1
+        self.count += 1
+        self.sum += value
+        self.max = max(self.max, value)
+
+    def quantile(self, q: float) -> float:
+        """Estimativa do quantil `q` (0..1), como o histogram_quantile"""
+        if not self.count:
+            return 0.0
+        rank = q * self.count
+        seen = 0
+        lower = 0.0
+        for index, count in enumerate(self.counts):
+            upper = min(self.buckets[index], self.max) if index < len(self.buckets) else self.max
+            if count and seen + count >= rank:
+                return lower + (upper - lower) * (rank - seen) / count
+            seen += count
+            lower = upper
+        return self.max
+
+
+class Metrics:
+    """Contadores e histogramas por nome (thread-safe)"""
+
+    def __init__(self, run: str):
+        self.run = run
+        self.started_at = datetime.now()
+        self.counters = {}
+        self.histograms = {}
+        self.info = {}  # parâmetros da execução, vão junto no relatório
+        self.tracer = None  # Tracer opcional: um span por medição
+        self.profiler = None  # Profiler opcional (--profile)
+        self._started = time.monotonic()
+        self._lock = threading.Lock()
+
+    @property
+    def elapsed(self) -> float:
+        return time.monotonic() - self._started
+
+    def incr(self, name: str, n: float = 1):
+        with self._lock:
+            self.counters[name] = self.counters.get(name, 0) + n
+
+    def count(self, name: str) -> float:
+        with self._lock:
+            return self.counters.get(name, 0)
+
+    def observe(self, name: str, seconds: float, error: bool = False, **attrs):
+        """Registra no histograma `name`; `attrs` só vão para o span do tracer"""
+        with self._lock:
+            histogram = self.histograms.get(name)
+            if histogram is None:
+                histogram = self.histograms[name] = Histogram()
+            histogram.observe(seconds)
+        if self.tracer:
+            self.tracer.add(name, seconds, attrs, error)
+
+    @contextmanager
+    def time(self, name: str, **attrs):
+        """Mede o bloco e registra no histograma `name` (também em caso de erro)"""
+        started = time.monotonic()
+        error = False
+        try:
+            yield
+        except Exception:
+            error = True
+            self.incr(f"{name}_errors")
+            raise
+        finally:
+            self.observe(name, time.monotonic() - started, error, **attrs)
+
+    def report(self) -> dict:
+        elapsed = self.elapsed
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        return {
+            "run": self.run,
+            "started_at": self.started_at.isoformat(timespec="seconds"),
+            "elapsed_s": round(elapsed, 3),
+            "info": self.info,
+            "counters": counters,
+            "timers": {
+                name: {
+                    "count": h.count,
+                    "total_s": round(h.sum, 3),
+                    # Somado entre threads: pode passar de 100% com paralelismo
+                    "wall_share": round(h.sum / elapsed, 3) if elapsed else 0,
+                    "p50_ms": round(h.quantile(0.50) * 1000, 1),
+                    "p95_ms": round(h.quantile(0.95) * 1000, 1),
+                    "max_ms": round(h.max * 1000, 1),
+                }
+                for name, h in sorted(histograms.items())
+            },
+        }
+
+    def print_summary(self):
+        report = self.report()
+        if not report["timers"]:
+            return
+        print(f"\n⏱️  Chamadas externas ({report['elapsed_s']:.1f}s de execução):")
+        print("      etapa                  chamadas   tempo    % do total   p50 ms   p95 ms")
+        for name, t in report["timers"].items():
+            print(
+                f"      {name:<22} {t['count']:>8} {t['total_s']:>7.1f}s "
+                f"{t['wall_share']:>10.0%} {t['p50_ms']:>8.1f} {t['p95_ms']:>8.1f}"
+            )
+
+    def write_json(self, path: str | Path) -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, json.dumps(self.report(), indent=2, default=str))
+        return path
+
+    def write_prometheus(self, path: str | Path) -> Path:
+        """Formato textfile do node_exporter (escrita atômica)"""
+        prefix = f"mypay_{self.run}"
+        lines = [
+            f"# TYPE {prefix}_elapsed_seconds gauge",
+            f"{prefix}_elapsed_seconds {self.elapsed:.3f}",
+        ]
+        with self._lock:
+            counters = dict(self.counters)
+            histograms = dict(self.histograms)
+        for name, value in sorted(counters.items()):
+            lines.append(f"# TYPE {prefix}_{name}_total counter")
+            lines.append(f"{prefix}_{name}_total {value}")
+        for name, h in sorted(histograms.items()):
+            metric = f"{prefix}_{name}_seconds"
+            lines.append(f"# TYPE {metric} histogram")
+            cumulative = 0
+            for bound, count in zip((*h.buckets, "+Inf"), h.counts):
+                cumulative += count
+                lines.append(f'{metric}_bucket{{le="{bound}"}} {cumulative}')
+            lines.append(f"{metric}_sum {h.sum:.6f}")
+            lines.append(f"{metric}_count {h.count}")
+
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        _write_atomic(path, "\n".join(lines) + "\n")
+        return path
+
+
+def timed(metrics: Metrics | None, name: str, **attrs):
+    """`metrics.time(name)` quando há métricas configuradas; senão, nada"""
+    return metrics.time(name, **attrs) if metrics else nullcontext()
+
+
+def _write_atomic(path: Path, content: str):
+    tmp_path = path.with_suffix(path.suffix + ".tmp")
+    tmp_path.write_text(content)
+    os.replace(tmp_path, path)
+
+
+class Progress:
+    """Throughput e ETA ao vivo
+
+    `done()` e `total()` são chamados a cada relatório; `total()` pode
+    devolver None enquanto o total ainda não é conhecido (sem ETA).
+    """
+
+    def __init__(self, label: str, done, total=None, interval: float = DEFAULT_PROGRESS_INTERVAL):
+        self.label = label
+        self.done = done
+        self.total = total or (lambda: None)
+        self.interval = interval
+        self._started = time.monotonic()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def line(self) -> str:
+        done = self.done()
+        total = self.total()
+        elapsed = time.monotonic() - self._started
+        rate = done / elapsed if elapsed else 0
+        text = f"📈 {self.label}: {done}" + (f"/{total}" if total is not None else "")
+        text += f" ({rate:.1f}/s"
+        if total is not None and rate > 0:
+            remaining = max(0, total - done) / rate
+            text += f", ETA {int(remaining // 60)}m{int(remaining % 60):02d}s"
+        return text + ")"
+
+    def start(self):
+        """Imprime em uma thread própria (para loops fora do pipeline)"""
+        if self.interval > 0:
+            self._thread = threading.Thread(target=self._run, name="progress", daemon=True)
+            self._thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, exc_type, exc, tb):
+        self.stop()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            print(f"      {self.line()}")
+
+
+def add_metrics_arguments(parser):
+    """Opções de linha de comando do relatório de métricas"""
+    parser.add_argument(
+        "--report",
+        help=f"Arquivo JSON do relatório de métricas (padrão: {DEFAULT_REPORT_DIR.name}/)",
+    )
+    parser.add_argument(
+        "--prometheus",
+        help="Também grava as métricas neste textfile do Prometheus (node_exporter)",
+    )
+
+
+def write_reports(metrics: Metrics, args):
+    """Grava o JSON (sempre) e o textfile do Prometheus (se pedido)"""
+    metrics.print_summary()
+    report_path = args.report or (
+        DEFAULT_REPORT_DIR / f"{metrics.run}-{metrics.started_at:%Y%m%d-%H%M%S}.json"
+    )
+    print(f"\n🧾 Relatório de métricas: {metrics.write_json(report_path)}")
+    if args.prometheus:
+        print(f"   Prometheus: {metrics.write_prometheus(args.prometheus)}")
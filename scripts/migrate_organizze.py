@@ -4,6 +4,8 @@ Script de migração do Organizze para o myPay
 
 Requisitos:
     pip install firebase-admin requests boto3 python-dotenv
+    pip install Pillow  # opcional, para --optimize-images
+    pip install pyarrow  # opcional, para --snapshot/--from-snapshot
 
 Configuração:
     1. Baixe o arquivo de service account do Firebase:
@@ -21,15 +23,28 @@ Uso:
     python migrate_organizze.py --start-date 2026-01-01 --end-date 2026-01-30
     python migrate_organizze.py --start-date
       --dry-run
+    python migrate_organizze.py --start-date 2022-01-01 --end-date 2026-01-30 --batch-size 250
+    python migrate_organizze.py --start-date 2022-01-01 --end-date 2026-01-30 --resume
+    python migrate_organizze.py --start-date 2026-01-01 --end-date 2026-01-30 --refresh
+    python migrate_organizze.py --sync --start-date 2026-01-01   # primeira sincronização
+    python migrate_organizze.py --sync                           # execução diária
+    python migrate_organizze.py --start-date 2022-01-01 --end-date 2026-01-30 --plan plano.jsonl
+    python migrate_organizze.py --apply plano.jsonl --write-workers 8
+    python migrate_organizze.py --start-date 2022-01-01 --end-date 2026-01-30 --snapshot snap/
+    python migrate_organizze.py --from-snapshot snap/ --dry-run
+    python migrate_organizze.py --start-date 2022-01-01 --end-date 2026-01-30 --shard 1/4
+    python migrate_organizze.py --start-date 2026-01-01 --end-date 2026-01-30 --profile --trace run.json
 """
 
 import argparse
-import json
+import io
 import os
 import sys
-from base64 import b64encode
-from datetime import datetime
+import threading
+import zlib
+from datetime import datetime, timedelta
 from pathlib import Path
+from tempfile import SpooledTemporaryFile
 
 import requests
 
@@ -39,75 +54,109 @@ from dotenv import load_dotenv
 project_root = Path(__file__).parent.parent
 load_dotenv(project_root / ".env")
 
-import boto3
-import firebase_admin
-from firebase_admin import credentials, firestore
+from attachment_pool import (
+    DEFAULT_MAX_INFLIGHT_BYTES,
+    DEFAULT_SPOOL_THRESHOLD,
+    DEFAULT_WORKERS,
+    MAX_ATTACHMENT_SIZE,
+    AttachmentPool,
+    AttachmentTooLarge,
+    body_sha256,
+    body_size,
+    read_limited,
+)
+import clients
+from image_optimizer import add_image_arguments, make_image_optimizer, thumbnail_key
+from firestore_batch import MAX_BATCH_SIZE, BatchWriter
+from firestore_reads import DEFAULT_PAGE_SIZE, stream_paged
+from metrics import Metrics, Progress, add_metrics_arguments, write_reports
+from migration_journal import DEFAULT_JOURNAL_PATH, MigrationJournal
+from migration_plan import PlanWriter, read_plan
+from organizze_snapshot import OrganizzeSnapshot, write_snapshot
+from object_store import ObjectIndex, attachments_prefix, content_key
+from rate_limiter import add_rate_limit_arguments, configure_limiters, make_limiters
+from pipeline import DEFAULT_QUEUE_SIZE, DEFAULT_REPORT_INTERVAL, Counters, Pipeline, Stage
+from tracing import add_tracing_arguments, finish_tracing, span_url, start_tracing
+from organizze_client import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_FETCH_WORKERS,
+    DEFAULT_TIMEOUT,
+    DEFAULT_WINDOW,
+    ORGANIZZE_BASE_URL,
+    WINDOWS,
+    OrganizzeClient,
+    ResponseCache,
+    TransactionDeduplicator,
+    date_windows,
+    is_s3_url,
+    transaction_endpoints,
+    window_endpoint,
+)
 
 # Configurações (usa as variáveis VITE_* do .env existente)
-ORGANIZZE_BASE_URL = "https://api.organizze.com.br/rest/v2"
 ORGANIZZE_EMAIL = os.getenv("VITE_ORGANIZZE_EMAIL")
 ORGANIZZE_API_KEY = os.getenv("VITE_ORGANIZZE_API_KEY")
 FIREBASE_USER_ID = os.getenv("FIREBASE_USER_ID")
-S3_ENDPOINT_URL = os.getenv("VITE_S3_ENDPOINT_URL")
-S3_ACCESS_KEY_ID = os.getenv("VITE_S3_ACCESS_KEY_ID")
-S3_SECRET_ACCESS_KEY = os.getenv("VITE_S3_SECRET_ACCESS_KEY")
 S3_BUCKET_NAME = os.getenv("VITE_S3_BUCKET_NAME")
-S3_REGION = os.getenv("VITE_S3_REGION", "auto")
 S3_PUBLIC_URL = os.getenv("VITE_S3_PUBLIC_URL")
 S3_PATH_PREFIX = os.getenv("VITE_S3_PATH_PREFIX", "")
 
-# Inicializar Firebase
-firebase_creds = os.getenv("FIREBASE_CREDENTIALS")
-
-if firebase_creds:
-    # Verificar se é um caminho de arquivo ou JSON direto
-    if firebase_creds.startswith("/") or firebase_creds.startswith("."):
-        # É um caminho de arquivo
-        cred_path = Path(firebase_creds)
-        if not cred_path.exists():
-            print(f"❌ Arquivo de credenciais não encontrado: {cred_path}")
-            sys.exit(1)
-        cred = credentials.Certificate(str(cred_path))
-    else:
-        # É JSON direto
-        try:
-            cred_dict = json.loads(firebase_creds)
-            cred = credentials.Certificate(cred_dict)
-        except json.JSONDecodeError as e:
-            print(f"❌ Erro ao parsear FIREBASE_CREDENTIALS: {e}")
-            sys.exit(1)
-else:
-    print("❌ FIREBASE_CREDENTIALS não configurado no .env")
-    print("   Use o caminho do arquivo JSON ou o conteúdo JSON direto")
-    sys.exit(1)
-
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-# Inicializar S3/R2
-s3_client = None
-if S3_ENDPOINT_URL and S3_ACCESS_KEY_ID and S3_SECRET_ACCESS_KEY:
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=S3_ENDPOINT_URL,
-        aws_access_key_id=S3_ACCESS_KEY_ID,
-        aws_secret_access_key=S3_SECRET_ACCESS_KEY,
-        region_name=S3_REGION,
-    )
+# Limitadores adaptativos por serviço (tetos ajustáveis pela linha de comando)
+limiters = make_limiters()
+
+# Contadores e latências das chamadas externas (relatório ao final)
+metrics = Metrics("migrate")
+
+# Chaves já existentes no bucket (evita re-upload do mesmo conteúdo)
+# (com o inventário do prefixo do usuário: um LIST no lugar de um HEAD por anexo)
+object_index = ObjectIndex(
+    clients.s3_client,
+    S3_BUCKET_NAME,
+    limiter=limiters["r2"],
+    metrics=metrics,
+    inventory_prefix=attachments_prefix(S3_PATH_PREFIX, FIREBASE_USER_ID)
+    if FIREBASE_USER_ID
+    else None,
+)
+
+
+# Recodificação dos comprovantes em WebP (configurada com --optimize-images)
+image_optimizer = None
+
+# No --sync, a janela volta esses dias antes do último ponto sincronizado
+# para pegar edições recentes (a API não filtra por data de alteração)
+DEFAULT_SYNC_LOOKBACK_DAYS = 30
+
+# Campos mantidos pelo app: re-execuções, shards e o --sync não os sobrescrevem
+# em documentos que já existem (nem o createdAt)
+APP_MANAGED_FIELDS = {
+    "accounts": ("balance", "isActive"),
+    "cards": ("color", "isActive"),
+}
+
+# No --apply, gravações no Firestore em paralelo (cada uma com seus lotes)
+DEFAULT_WRITE_WORKERS = 4
+
+# No --shard, como as transações são repartidas entre os processos
+SHARD_MODES = ("window", "id")
+
+# Sessão HTTP compartilhada (keep-alive + retry) para API e anexos
+organizze = OrganizzeClient(
+    ORGANIZZE_EMAIL,
+    ORGANIZZE_API_KEY,
+    user_agent=f"myPay Migration ({ORGANIZZE_EMAIL})",
+    base_url=ORGANIZZE_BASE_URL,
+)
+organizze.limiter = limiters["organizze"]
+organizze.download_limiter = limiters["attachments"]
+organizze.metrics = metrics
 
 
 def organizze_request(endpoint: str) -> dict:
     """Faz requisição à API do Organizze"""
-    auth_string = b64encode(f"{ORGANIZZE_EMAIL}:{ORGANIZZE_API_KEY}".encode()).decode()
-    headers = {
-        "Authorization": f"Basic {auth_string}",
-        "Content-Type": "application/json",
-        "User-Agent": f"myPay Migration ({ORGANIZZE_EMAIL})",
-    }
-
-    response = requests.get(f"{ORGANIZZE_BASE_URL}{endpoint}", headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return organizze.get_json(endpoint)
 
 
 def get_content_type_from_filename(filename: str) -> str:
@@ -129,8 +178,21 @@ def get_content_type_from_filename(filename: str) -> str:
     return mime_types.get(ext, "application/octet-stream")
 
 
-def download_attachment(url: str, email: str, api_key: str) -> tuple[bytes, str, str]:
-    """Baixa um attachment do Organizze"""
+def download_attachment(
+    url: str,
+    max_size: int | None = MAX_ATTACHMENT_SIZE,
+    spool_threshold: int = DEFAULT_SPOOL_THRESHOLD,
+) -> tuple[SpooledTemporaryFile, str, str]:
+    """Baixa um attachment do Organizze em stream (arquivo temporário)"""
+    with metrics.time("attachment_download", url=span_url(url)):
+        body, content_type, filename = _download_attachment(url, max_size, spool_threshold)
+    metrics.incr("attachment_download_bytes", body_size(body))
+    return body, content_type, filename
+
+
+def _download_attachment(
+    url: str, max_size: int | None, spool_threshold: int
+) -> tuple[SpooledTemporaryFile, str, str]:
     import re
     from urllib.parse import unquote, urlparse
 
@@ -140,29 +202,16 @@ def download_attachment(url: str, email: str, api_key: str) -> tuple[bytes, str,
         unquote(parsed_url.path.split("/")[-1]) if parsed_url.path else "attachment"
     )
 
-    # Se for URL do S3 (amazonaws.com), tentar sem autenticação primeiro
-    is_s3_url = "s3.amazonaws.com" in url or "amazonaws.com" in url
-
-    if is_s3_url:
-        # S3 URLs não aceitam Basic Auth - tentar sem auth
-        try:
-            response = requests.get(url, timeout=30)
-            response.raise_for_status()
-        except requests.exceptions.HTTPError:
+    # URLs do S3 vão sem Basic Auth; as da API do Organizze, autenticadas
+    try:
+        response = organizze.download(url, stream=True)
+    except requests.exceptions.HTTPError:
+        if is_s3_url(url):
             # Se falhar, pode ser URL que precisa de redirect ou está expirada
             print(
                 f"      ⚠️  URL do S3 não acessível (pode estar expirada): {url_filename}"
             )
-            raise
-    else:
-        # URLs da API do Organizze usam Basic Auth
-        auth_string = b64encode(f"{email}:{api_key}".encode()).decode()
-        headers = {
-            "Authorization": f"Basic {auth_string}",
-            "User-Agent": f"myPay Migration ({email})",
-        }
-        response = requests.get(url, headers=headers, timeout=30)
-        response.raise_for_status()
+        raise
 
     content_type = response.headers.get("content-type", "")
 
@@ -180,22 +229,43 @@ def download_attachment(url: str, email: str, api_key: str) -> tuple[bytes, str,
     if not content_type or content_type in ("application/octet-stream", "binary/octet-stream"):
         content_type = get_content_type_from_filename(filename)
 
-    return response.content, content_type, filename
+    body = read_limited(response, filename, max_size, spool_threshold)
+    return body, content_type, filename
 
 
-def upload_to_s3(data: bytes, content_type: str, filename: str, user_id: str) -> str:
+def upload_to_s3(
+    body,
+    content_type: str,
+    filename: str,
+    user_id: str,
+    size: int | None = None,
+    key: str | None = None,
+) -> str:
     """Faz upload para Cloudflare R2"""
+    s3_client = clients.s3_client()
     if not s3_client or not S3_PUBLIC_URL:
         return None
 
-    timestamp = int(datetime.now().timestamp() * 1000)
-    safe_filename = "".join(c if c.isalnum() or c in ".-" else "_" for c in filename)
-    base_path = f"{S3_PATH_PREFIX}/comprovantes" if S3_PATH_PREFIX else "comprovantes"
-    key = f"{base_path}/{user_id}/{timestamp}_{safe_filename}"
+    # Chave derivada do conteúdo: o mesmo arquivo nunca é enviado duas vezes
+    key = key or content_key(S3_PATH_PREFIX, user_id, body_sha256(body), filename)
 
-    s3_client.put_object(
-        Bucket=S3_BUCKET_NAME, Key=key, Body=data, ContentType=content_type
-    )
+    size = size if size is not None else body_size(body)
+    if object_index.exists(key, size):
+        object_index.mark_skipped()
+    else:
+        if isinstance(body, (bytes, bytearray)):
+            body = io.BytesIO(body)
+        with metrics.time("r2_put", key=key, bytes=size):
+            limiters["r2"].call(
+                s3_client.upload_fileobj,
+                body,
+                S3_BUCKET_NAME,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=clients.s3_transfer_config(),
+            )
+        metrics.incr("r2_put_bytes", size)
+        object_index.add(key, size)
 
     return f"{S3_PUBLIC_URL}/{key}"
 
@@ -245,304 +315,1344 @@ def get_card_color(network: str) -> str:
     return colors.get(network.lower() if network else "", "slate")
 
 
-def migrate(start_date: str, end_date: str, dry_run: bool = False):
-    """Executa a migração"""
-    if not ORGANIZZE_EMAIL or not ORGANIZZE_API_KEY:
-        print("❌ Configure ORGANIZZE_EMAIL e ORGANIZZE_API_KEY no arquivo .env")
-        sys.exit(1)
+def account_doc(acc: dict) -> dict:
+    """Converte uma conta do Organizze no documento do myPay"""
+    return {
+        "name": acc["name"],
+        "type": map_account_type(acc.get("type", "checking")),
+        "balance": 0,
+        "isActive": True,
+        "createdAt": clients.server_timestamp(),
+        "_organizzeId": acc["id"],
+    }
 
-    if not FIREBASE_USER_ID:
-        print("❌ Configure FIREBASE_USER_ID no arquivo .env")
-        sys.exit(1)
 
-    user_ref = db.collection("users").document(FIREBASE_USER_ID)
+def card_doc(card: dict) -> dict:
+    """Converte um cartão do Organizze no documento do myPay"""
+    return {
+        "name": card["name"],
+        "brand": map_card_brand(card.get("card_network")),
+        "limit": (card.get("limit_cents", 0) or 0) / 100,
+        "closingDay": card.get("closing_day", 1),
+        "dueDay": card.get("due_day", 10),
+        "color": get_card_color(card.get("card_network")),
+        "isActive": True,
+        "createdAt": clients.server_timestamp(),
+        "_organizzeId": card["id"],
+    }
 
-    print("🔄 Buscando dados do Organizze...")
 
-    # 1. Buscar contas
-    print("   📁 Buscando contas...")
-    accounts = organizze_request("/accounts")
-    print(f"      Encontradas: {len(accounts)}")
+def transaction_doc(t: dict, category_map: dict, card_map: dict) -> dict:
+    """Converte uma transação do Organizze no documento do myPay"""
+    category = category_map.get(t.get("category_id"), {})
+    category_name = category.get("name", "outros")
+    category_id = category_name.lower().replace(" ", "_")
+
+    # Processar tags
+    tags = []
+    if t.get("tags"):
+        for tag in t["tags"]:
+            if isinstance(tag, dict):
+                tags.append(tag.get("name", ""))
+            else:
+                tags.append(str(tag))
+        tags = [tag for tag in tags if tag]
+
+    if t.get("credit_card_id"):
+        # Transações de cartão entram como despesas com nota indicando o cartão
+        card_name = card_map.get(t.get("credit_card_id"), "Cartão")
+        return {
+            "description": t.get("description", "Sem descrição"),
+            "amount": abs(t.get("amount_cents", 0) or 0) / 100,
+            "type": "expense",
+            "category": category_id,
+            "date": parse_date(t.get("date")),
+            "isPending": False,
+            "notes": f"Cartão: {card_name}",
+            "tags": tags,
+            "createdAt": clients.server_timestamp(),
+            "_organizzeId": t["id"],
+        }
 
-    # 2. Buscar categorias
-    print("   📁 Buscando categorias...")
-    categories = organizze_request("/categories")
-    category_map = {cat["id"]: cat for cat in categories}
-    print(f"      Encontradas: {len(categories)}")
-
-    # 3. Buscar cartões
-    print("   📁 Buscando cartões...")
-    credit_cards = organizze_request("/credit_cards")
-    print(f"      Encontrados: {len(credit_cards)}")
-
-    # 4. Buscar transações
-    print(f"   📁 Buscando transações ({start_date} a {end_date})...")
-    transactions = organizze_request(
-        f"/transactions?start_date={start_date}&end_date={end_date}"
-    )
-    print(f"      Encontradas: {len(transactions)}")
-
-    # Mostrar datas das transações retornadas
-    if transactions:
-        dates = sorted(set(t.get("date", "sem data") for t in transactions))
-        print("      Datas retornadas pelo Organizze:")
-        for d in dates[:10]:
-            print(f"         {d}")
-        if len(dates) > 10:
-            print(f"         ... e mais {len(dates) - 10} datas")
+    is_income = (t.get("amount_cents", 0) or 0) > 0
+    return {
+        "description": t.get("description", "Sem descrição"),
+        "amount": abs(t.get("amount_cents", 0) or 0) / 100,
+        "type": "income" if is_income else "expense",
+        "category": category_id,
+        "date": parse_date(t.get("date")),
+        "isPending": not t.get("paid", True),
+        "notes": t.get("notes", ""),
+        "tags": tags,
+        "createdAt": clients.server_timestamp(),
+        "_organizzeId": t["id"],
+    }
 
-    # Estatísticas
-    normal_transactions = [t for t in transactions if not t.get("credit_card_id")]
-    card_transactions = [t for t in transactions if t.get("credit_card_id")]
-    attachments_count = sum(len(t.get("attachments", [])) for t in transactions)
 
-    print("\n📊 Resumo:")
-    print(f"   Contas: {len([a for a in accounts if not a.get('archived')])}")
-    print(f"   Cartões: {len([c for c in credit_cards if not c.get('archived')])}")
-    print(f"   Transações normais: {len(normal_transactions)}")
-    print(f"   Transações de cartão: {len(card_transactions)}")
-    print(f"   Anexos: {attachments_count}")
+def organizze_ref(collection_ref, organizze_id):
+    """Documento com id determinístico (`org_<id>`) para um item do Organizze
 
-    if dry_run:
-        print("\n⚠️  Modo dry-run: nenhum dado foi importado")
-        return
+    Re-execuções, retries e shards paralelos gravam sempre no mesmo documento
+    (com `BatchWriter.upsert`), em vez de criar duplicatas com ids aleatórios.
+    """
+    return collection_ref.document(f"org_{organizze_id}")
 
-    print("\n🚀 Iniciando importação...")
 
-    # Importar contas
-    print("   💰 Importando contas...")
-    imported_accounts = 0
-    for acc in accounts:
-        if acc.get("archived"):
-            continue
-
-        doc_data = {
-            "name": acc["name"],
-            "type": map_account_type(acc.get("type", "checking")),
-            "balance": 0,
-            "isActive": True,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "_organizzeId": acc["id"],
+def parse_shard(value: str) -> tuple[int, int]:
+    """Converte "i/N" (1 <= i <= N) em `(índice a partir de 0, N)`"""
+    try:
+        number, count = (int(part) for part in value.split("/"))
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"use o formato i/N (ex.: 1/4), não {value!r}")
+    if not 1 <= number <= count:
+        raise argparse.ArgumentTypeError(f"o shard deve estar entre 1/{count} e {count}/{count}")
+    return number - 1, count
+
+
+def shard_of(organizze_id, count: int) -> int:
+    """Shard de uma transação pelo hash do id (estável entre processos)"""
+    return zlib.crc32(str(organizze_id).encode()) % count
+
+
+def attachment_sources(t: dict) -> list[tuple[str, str]]:
+    """Lista `(origem, url)` dos anexos de uma transação do Organizze"""
+    sources = []
+    for att in t.get("attachments", []):
+        att_url = att.get("url") or att.get("file_url") or att.get("document_url")
+        if att_url:
+            # URLs do S3 expiram; o id do anexo identifica melhor a origem
+            sources.append((str(att.get("id") or att_url), att_url))
+    return sources
+
+
+def upload_attachment(body, content_type: str, filename: str, size: int) -> dict:
+    """Envia um anexo para o R2 (em WebP e com miniatura, com --optimize-images)"""
+    optimized = image_optimizer.optimize(body, content_type, filename) if image_optimizer else None
+    if optimized is None:
+        return {
+            "url": upload_to_s3(body, content_type, filename, FIREBASE_USER_ID, size),
+            "fileName": filename,
+            "size": size,
+            "type": content_type,
+            "sha256": body_sha256(body),
         }
-        user_ref.collection("accounts").add(doc_data)
-        imported_accounts += 1
-    print(f"      Importadas: {imported_accounts}")
 
-    # Importar cartões
-    print("   💳 Importando cartões...")
-    imported_cards = 0
-    for card in credit_cards:
-        if card.get("archived"):
-            continue
-
-        doc_data = {
-            "name": card["name"],
-            "brand": map_card_brand(card.get("card_network")),
-            "limit": (card.get("limit_cents", 0) or 0) / 100,
-            "closingDay": card.get("closing_day", 1),
-            "dueDay": card.get("due_day", 10),
-            "color": get_card_color(card.get("card_network")),
-            "isActive": True,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "_organizzeId": card["id"],
-        }
-        user_ref.collection("cards").add(doc_data)
-        imported_cards += 1
-    print(f"      Importados: {imported_cards}")
-
-    # Importar transações normais
-    print("   📝 Importando transações...")
-    imported_transactions = 0
-    imported_attachments = 0
-
-    for t in normal_transactions:
-        category = category_map.get(t.get("category_id"), {})
-        category_name = category.get("name", "outros")
-        category_id = category_name.lower().replace(" ", "_")
-
-        # Processar tags
-        tags = []
-        if t.get("tags"):
-            for tag in t["tags"]:
-                if isinstance(tag, dict):
-                    tags.append(tag.get("name", ""))
-                else:
-                    tags.append(str(tag))
-            tags = [tag for tag in tags if tag]
-
-        # Processar attachments
-        attachments = []
-        for att in t.get("attachments", []):
-            att_url = att.get("url") or att.get("file_url") or att.get("document_url")
-            if not att_url:
-                continue
+    try:
+        sha256 = body_sha256(optimized.body)
+        key = content_key(S3_PATH_PREFIX, FIREBASE_USER_ID, sha256, optimized.filename)
+        url = upload_to_s3(
+            optimized.body,
+            optimized.content_type,
+            optimized.filename,
+            FIREBASE_USER_ID,
+            optimized.size,
+            key=key,
+        )
+        thumbnail_url = None
+        if url:
+            thumbnail_url = upload_to_s3(
+                optimized.thumbnail,
+                optimized.content_type,
+                optimized.filename,
+                FIREBASE_USER_ID,
+                key=thumbnail_key(key),
+            )
+    finally:
+        optimized.close()
+    return {
+        "url": url,
+        "fileName": optimized.filename,
+        "size": optimized.size,
+        "type": optimized.content_type,
+        "sha256": sha256,
+        "originalSize": optimized.original_size,
+        "thumbnailUrl": thumbnail_url,
+    }
 
-            try:
-                data, content_type, filename = download_attachment(
-                    att_url, ORGANIZZE_EMAIL, ORGANIZZE_API_KEY
-                )
 
-                # Limite de 10MB
-                if len(data) > 10 * 1024 * 1024:
-                    print(f"      ⚠️  Anexo muito grande, pulando: {filename}")
-                    continue
+def make_attachment_pool(
+    workers: int, max_inflight_bytes: int, max_attachment_size: int
+) -> AttachmentPool:
+    """Pool de anexos: download do Organizze -> upload para o R2"""
+    return AttachmentPool(
+        download=lambda url: download_attachment(url, max_attachment_size),
+        upload=upload_attachment,
+        workers=workers,
+        max_inflight_bytes=max_inflight_bytes,
+        max_size=max_attachment_size,
+    )
+
 
-                s3_url = upload_to_s3(data, content_type, filename, FIREBASE_USER_ID)
-                if s3_url:
-                    attachments.append(
-                        {
-                            "url": s3_url,
-                            "fileName": filename,
-                            "size": len(data),
-                            "type": content_type,
-                        }
-                    )
-                    imported_attachments += 1
+def transfer_attachments(
+    pool: AttachmentPool,
+    sources: list,
+    uploaded_attachments: dict,
+    journal: MigrationJournal,
+) -> list[dict]:
+    """Transfere os anexos de uma transação, reaproveitando os já enviados"""
+    attachments = []
+    for source, att_url in sources:
+        result = uploaded_attachments.get(source)
+        if result is None:
+            try:
+                result = pool.transfer(att_url)
+            except AttachmentTooLarge as e:
+                print(f"      ⚠️  {e}, pulando")
+                continue
             except Exception as e:
                 print(f"      ⚠️  Erro ao processar anexo: {e}")
+                continue
+            if not result or not result["url"]:
+                continue
+            uploaded_attachments[source] = result
+            journal.add_attachment(source, result)
+        attachments.append(result)
+    return attachments
+
+
+def migrate(
+    start_date: str,
+    end_date: str,
+    dry_run: bool = False,
+    batch_size: int = MAX_BATCH_SIZE,
+    attachment_workers: int = DEFAULT_WORKERS,
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    max_attachment_size: int = MAX_ATTACHMENT_SIZE,
+    window: str = DEFAULT_WINDOW,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    resume: bool = False,
+    journal_path: str | Path = DEFAULT_JOURNAL_PATH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    progress_interval: float = DEFAULT_REPORT_INTERVAL,
+    plan_path: str | Path | None = None,
+    snapshot: OrganizzeSnapshot | None = None,
+    shard: tuple[int, int] | None = None,
+    shard_by: str = "window",
+):
+    """Executa a migração
+
+    As transações passam por um pipeline de estágios ligados por filas
+    limitadas: busca no Organizze (por janela) -> transformação -> anexos
+    (download + upload) -> gravação no Firestore.
+
+    Com `plan_path`, nada é gravado: os documentos já convertidos e os anexos
+    a transferir vão para o plano, executado depois por `apply_plan`.
+
+    Com `snapshot`, os dados vêm do snapshot em Parquet em vez da API (os
+    anexos continuam vindo do Organizze); no dry-run, o resumo é calculado
+    direto nas colunas, sem percorrer as transações.
+
+    Com `shard=(i, N)`, só a parte i das transações é migrada: as janelas
+    i, i+N, i+2N... (`shard_by="window"`, sem buscas repetidas no Organizze)
+    ou as transações cujo hash do id cai no shard i (`shard_by="id"`). Os ids
+    determinísticos tornam seguro rodar os N shards em paralelo e repetir
+    qualquer um deles. Contas e cartões são gravados por todos (idempotente).
+    """
+    if not ORGANIZZE_EMAIL or not ORGANIZZE_API_KEY:
+        print("❌ Configure ORGANIZZE_EMAIL e ORGANIZZE_API_KEY no arquivo .env")
+        sys.exit(1)
 
-        is_income = (t.get("amount_cents", 0) or 0) > 0
-
-        doc_data = {
-            "description": t.get("description", "Sem descrição"),
-            "amount": abs(t.get("amount_cents", 0) or 0) / 100,
-            "type": "income" if is_income else "expense",
-            "category": category_id,
-            "date": parse_date(t.get("date")),
-            "isPending": not t.get("paid", True),
-            "notes": t.get("notes", ""),
-            "tags": tags,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "_organizzeId": t["id"],
-        }
+    if not FIREBASE_USER_ID:
+        print("❌ Configure FIREBASE_USER_ID no arquivo .env")
+        sys.exit(1)
 
-        if attachments:
-            doc_data["attachments"] = attachments
+    if snapshot and dry_run and not shard:
+        print_snapshot_summary(snapshot.summary(start_date, end_date))
+        print("\n⚠️  Modo dry-run: nenhum dado foi importado")
+        return
 
-        user_ref.collection("transactions").add(doc_data)
-        imported_transactions += 1
+    source = snapshot or organizze
+    if snapshot:
+        print(f"🔄 Lendo dados do snapshot {snapshot.directory}...")
+    else:
+        print("🔄 Buscando dados do Organizze...")
 
-        if imported_transactions % 50 == 0:
+    # Contas, categorias e cartões são pequenos e necessários antes das
+    # transações; são buscados juntos antes de o pipeline começar
+    print("   📁 Buscando contas, categorias e cartões...")
+    accounts, categories, credit_cards = source.fetch_parallel(
+        ["/accounts", "/categories", "/credit_cards"], workers=fetch_workers
+    )
+    category_map = {cat["id"]: cat for cat in categories}
+    card_map = {c["id"]: c["name"] for c in credit_cards}
+    print(f"      Contas: {len(accounts)}")
+    print(f"      Categorias: {len(categories)}")
+    print(f"      Cartões: {len(credit_cards)}")
+
+    plan = None
+    if plan_path:
+        plan = PlanWriter(
+            plan_path, FIREBASE_USER_ID, start_date=start_date, end_date=end_date
+        )
+    writes = not dry_run and plan is None
+
+    # Journal de checkpoint: com --resume, pula o que já foi gravado
+    # (consultado documento a documento, sem carregar tudo em memória)
+    journal = None
+    uploaded_attachments = {}
+    if writes:
+        journal = MigrationJournal(journal_path, FIREBASE_USER_ID)
+        if resume:
+            uploaded_attachments = journal.attachments()
             print(
-                f"      Progresso: {imported_transactions}/{len(normal_transactions)}"
+                f"\n⏩ Retomando: {journal.completed_count()} documentos "
+                f"e {len(uploaded_attachments)} anexos já migrados ({journal.path.name})"
             )
+        else:
+            journal.reset()
 
-    print(f"      Importadas: {imported_transactions}")
-    print(f"      Anexos: {imported_attachments}")
+    counters = Counters()
 
-    # Importar transações de cartão (como transações normais com nota indicando o cartão)
-    print("   💳 Importando transações de cartão...")
-    imported_card_transactions = 0
+    def already_done(collection: str, organizze_id) -> bool:
+        if resume and journal and journal.is_done(collection, organizze_id):
+            counters.incr("resumed")
+            return True
+        return False
 
-    card_map = {c["id"]: c["name"] for c in credit_cards}
+    writer = None
+    imported_accounts = 0
+    imported_cards = 0
+    if plan:
+        print(f"\n📝 Gravando o plano em {plan.path}...")
+        for acc in accounts:
+            if not acc.get("archived"):
+                plan.add("accounts", account_doc(acc))
+        for card in credit_cards:
+            if not card.get("archived"):
+                plan.add("cards", card_doc(card))
+    elif not dry_run:
+        print("\n🚀 Iniciando importação...")
+        db = clients.firestore_client()
+        user_ref = db.collection("users").document(FIREBASE_USER_ID)
+        writer = BatchWriter(
+            db,
+            batch_size=batch_size,
+            on_commit=journal.record_batch,
+            limiter=limiters["firestore"],
+            metrics=metrics,
+        )
 
-    for t in card_transactions:
-        category = category_map.get(t.get("category_id"), {})
-        category_name = category.get("name", "outros")
-        category_id = category_name.lower().replace(" ", "_")
+        # Importar contas
+        print("   💰 Importando contas...")
+        for acc in accounts:
+            if acc.get("archived") or already_done("accounts", acc["id"]):
+                continue
 
-        card_name = card_map.get(t.get("credit_card_id"), "Cartão")
+            writer.upsert(
+                organizze_ref(user_ref.collection("accounts"), acc["id"]),
+                account_doc(acc),
+                keep=APP_MANAGED_FIELDS["accounts"],
+            )
+            imported_accounts += 1
+        print(f"      Importadas: {imported_accounts}")
 
-        # Processar tags
-        tags = []
-        if t.get("tags"):
-            for tag in t["tags"]:
-                if isinstance(tag, dict):
-                    tags.append(tag.get("name", ""))
-                else:
-                    tags.append(str(tag))
-            tags = [tag for tag in tags if tag]
-
-        # Processar attachments
-        attachments = []
-        for att in t.get("attachments", []):
-            att_url = att.get("url") or att.get("file_url") or att.get("document_url")
-            if not att_url:
+        # Importar cartões
+        print("   💳 Importando cartões...")
+        for card in credit_cards:
+            if card.get("archived") or already_done("cards", card["id"]):
                 continue
 
-            try:
-                data, content_type, filename = download_attachment(
-                    att_url, ORGANIZZE_EMAIL, ORGANIZZE_API_KEY
-                )
+            writer.upsert(
+                organizze_ref(user_ref.collection("cards"), card["id"]),
+                card_doc(card),
+                keep=APP_MANAGED_FIELDS["cards"],
+            )
+            imported_cards += 1
+        print(f"      Importados: {imported_cards}")
 
-                if len(data) > 10 * 1024 * 1024:
-                    continue
+    pool = make_attachment_pool(attachment_workers, max_inflight_bytes, max_attachment_size)
 
-                s3_url = upload_to_s3(data, content_type, filename, FIREBASE_USER_ID)
-                if s3_url:
-                    attachments.append(
-                        {
-                            "url": s3_url,
-                            "fileName": filename,
-                            "size": len(data),
-                            "type": content_type,
-                        }
-                    )
-                    imported_attachments += 1
-            except Exception as e:
-                print(f"      ⚠️  Erro ao processar anexo: {e}")
+    # Cada janela é processada e descartada: a memória não cresce com o
+    # período. Só contadores e as datas extremas são acumulados.
+    dedup = TransactionDeduplicator(start_date, end_date)
+    date_range = {}
+    failed_windows = []
 
-        doc_data = {
-            "description": t.get("description", "Sem descrição"),
-            "amount": abs(t.get("amount_cents", 0) or 0) / 100,
-            "type": "expense",
-            "category": category_id,
-            "date": parse_date(t.get("date")),
-            "isPending": False,
-            "notes": f"Cartão: {card_name}",
-            "tags": tags,
-            "createdAt": firestore.SERVER_TIMESTAMP,
-            "_organizzeId": t["id"],
-        }
+    def fetch_window(window_dates: tuple):
+        """Estágio 1: busca uma janela de /transactions"""
+        try:
+            transactions = source.get_json(window_endpoint(*window_dates))
+        except Exception:
+            failed_windows.append(window_dates)
+            raise
+        return dedup.filter(transactions, *window_dates)
+
+    def transform(t: dict):
+        """Estágio 2: converte a transação do Organizze no documento do myPay"""
+        if shard and shard_by == "id" and shard_of(t["id"], shard[1]) != shard[0]:
+            return ()
+        day = t.get("date")
+        if day:
+            date_range["first"] = min(day, date_range.get("first", day))
+            date_range["last"] = max(day, date_range.get("last", day))
+
+        is_card = bool(t.get("credit_card_id"))
+        counters.incr("card_transactions" if is_card else "transactions")
+        counters.incr("attachments", len(t.get("attachments", [])))
+
+        if dry_run or already_done("transactions", t["id"]):
+            return ()
+        if plan:
+            plan.add(
+                "transactions",
+                transaction_doc(t, category_map, card_map),
+                attachment_sources(t),
+            )
+            return ()
+
+        counters.incr("to_write")
+        return [(is_card, transaction_doc(t, category_map, card_map), attachment_sources(t))]
 
+    def transfer(item: tuple):
+        """Estágio 3: baixa os anexos e envia para o R2"""
+        is_card, doc_data, sources = item
+        attachments = transfer_attachments(pool, sources, uploaded_attachments, journal)
         if attachments:
             doc_data["attachments"] = attachments
-
-        user_ref.collection("transactions").add(doc_data)
-        imported_card_transactions += 1
-
-        if imported_card_transactions % 50 == 0:
+            counters.incr("imported_attachments", len(attachments))
+        return [(is_card, doc_data)]
+
+    def write(item: tuple):
+        """Estágio 4: grava no Firestore (em lotes)"""
+        is_card, doc_data = item
+        ref = organizze_ref(user_ref.collection("transactions"), doc_data["_organizzeId"])
+        writer.upsert(ref, doc_data)
+        counters.incr("imported_card_transactions" if is_card else "imported_transactions")
+
+    windows = date_windows(start_date, end_date, window)
+    if shard:
+        index, count = shard
+        if shard_by == "window":
             print(
-                f"      Progresso: {imported_card_transactions}/{len(card_transactions)}"
+                f"   🧩 Shard {index + 1}/{count}: {len(windows[index::count])} "
+                f"de {len(windows)} janelas"
             )
+            windows = windows[index::count]
+        else:
+            print(f"   🧩 Shard {index + 1}/{count}: transações pelo hash do id")
+    print(
+        f"   📝 {'Importando' if writes else 'Lendo'} transações "
+        f"({start_date} a {end_date}, {len(windows)} janelas)..."
+    )
+    stages = [
+        Stage("organizze", fetch_window, workers=fetch_workers, queue_size=queue_size),
+        Stage("transformação", transform, workers=1, queue_size=queue_size),
+    ]
+    if writes:
+        stages += [
+            Stage("anexos", transfer, workers=attachment_workers, queue_size=queue_size),
+            Stage("firestore", write, workers=1, queue_size=queue_size),
+        ]
+    progress = None
+    if writes:
+        # O total só é conhecido depois que todas as janelas foram buscadas
+        progress = Progress(
+            "transações gravadas",
+            done=lambda: counters["imported_transactions"]
+            + counters["imported_card_transactions"],
+            total=lambda: counters["to_write"] if pipeline.stages[0].finished else None,
+        )
+    pipeline = Pipeline(stages, report_interval=progress_interval, progress=progress)
+    pipeline.run(windows)
+    pipeline.print_stats()
+
+    if source.cache:
+        print(
+            f"      Cache: {organizze.cache.hits} respostas reaproveitadas, "
+            f"{organizze.cache.revalidated} revalidadas (304)"
+        )
+
+    if date_range:
+        print(
+            f"      Datas retornadas pelo Organizze: "
+            f"{date_range['first']} a {date_range['last']}"
+        )
+
+    print("\n📊 Resumo:")
+    print(f"   Contas: {sum(1 for a in accounts if not a.get('archived'))}")
+    print(f"   Cartões: {sum(1 for c in credit_cards if not c.get('archived'))}")
+    print(f"   Transações normais: {counters['transactions']}")
+    print(f"   Transações de cartão: {counters['card_transactions']}")
+    print(f"   Anexos: {counters['attachments']}")
+
+    # Uma janela que falhou mesmo após as novas tentativas deixa transações
+    # de fora: a execução não pode terminar como concluída
+    errors = sum(stage.errors for stage in pipeline.stages)
+
+    def print_errors():
+        print(f"\n❌ {errors} erros no pipeline")
+        for window_start, window_end in sorted(failed_windows):
+            print(f"   Janela não buscada: {window_start} a {window_end}")
+
+    if dry_run:
+        print("\n⚠️  Modo dry-run: nenhum dado foi importado")
+        if errors:
+            print_errors()
+            sys.exit(1)
+        return
 
-    print(f"      Importadas: {imported_card_transactions}")
+    if plan:
+        plan.close()
+        if errors:
+            print_errors()
+            print("   O plano está incompleto: gere-o novamente antes de aplicar")
+            sys.exit(1)
+        planned = ", ".join(f"{count} {name}" for name, count in plan.counts.items())
+        print(f"\n📝 Plano gravado em {plan.path}")
+        print(f"   Escritas: {planned or 'nenhuma'}")
+        print(f"   Anexos a transferir: {plan.attachments}")
+        print(f"   Revise e aplique com: python migrate_organizze.py --apply {plan.path}")
+        return
+
+    writer.close()
+    journal.close()
+    print(
+        f"   🗂️  Lotes gravados: {writer.batches} "
+        f"({writer.committed} documentos, até {writer.batch_size} por lote)"
+    )
 
     # Resumo final
+    imported_transactions = counters["imported_transactions"]
+    imported_card_transactions = counters["imported_card_transactions"]
+    imported_attachments = counters["imported_attachments"]
+    resumed = counters["resumed"]
+    metrics.incr("accounts_imported", imported_accounts)
+    metrics.incr("cards_imported", imported_cards)
+    metrics.incr("transactions_imported", imported_transactions + imported_card_transactions)
+    metrics.incr("attachments_imported", imported_attachments)
+    metrics.incr("resumed", resumed)
     total = (
         imported_accounts
         + imported_cards
         + imported_transactions
         + imported_card_transactions
     )
-    print("\n✅ Migração concluída!")
+    if errors or writer.failed:
+        print("\n⚠️  Migração incompleta!")
+    else:
+        print("\n✅ Migração concluída!")
     print(f"   Total importado: {total} itens")
     print(f"   - Contas: {imported_accounts}")
     print(f"   - Cartões: {imported_cards}")
     print(f"   - Transações: {imported_transactions}")
     print(f"   - Transações de cartão: {imported_card_transactions}")
     print(f"   - Anexos: {imported_attachments}")
+    if object_index.skipped_uploads:
+        print(f"   - Anexos já existentes no R2 (upload pulado): {object_index.skipped_uploads}")
+    if image_optimizer and image_optimizer.optimized:
+        print(
+            f"   - Imagens convertidas para WebP: {image_optimizer.optimized} "
+            f"({image_optimizer.saved_bytes / 1024 / 1024:.1f} MB a menos)"
+        )
+    if resumed:
+        print(f"   - Já migrados anteriormente (pulados): {resumed}")
+    if organizze.retries:
+        print(f"   - Requisições re-tentadas no Organizze: {organizze.retries}")
+    for limiter in limiters.values():
+        if limiter.throttled:
+            print(
+                f"   - {limiter.name}: {limiter.throttled} sinais de limite, "
+                f"taxa final {limiter.rate:.1f}/s"
+            )
+
+    if errors:
+        print_errors()
+    if writer.failed:
+        print(f"\n❌ {len(writer.failed)} documentos não foram gravados:")
+        for f in writer.failed:
+            print(f"   Lote {f['batch']} | {f['path']} | Organizze {f['organizzeId']}")
+    if errors or writer.failed:
+        print("   Rode novamente com --resume para tentar apenas o que faltou")
+        sys.exit(1)
+
+
+def print_snapshot_summary(summary: dict):
+    """Resumo de um snapshot (datas, contagens por mês e totais)"""
+    if summary["first_date"]:
+        print(f"   Datas: {summary['first_date']} a {summary['last_date']}")
+    per_date = summary["per_date"]
+    if per_date:
+        dates = list(per_date.items())
+        print("   Datas no snapshot:")
+        for day, count in dates[:10]:
+            print(f"      {day}: {count} transações")
+        if len(dates) > 10:
+            print(f"      ... e mais {len(dates) - 10} datas")
+    per_month = summary["per_month"]
+    if per_month:
+        print("   Transações por mês:")
+        for month, count in per_month.items():
+            print(f"      {month}: {count}")
+
+    print("\n📊 Resumo:")
+    print(f"   Contas: {summary['accounts']}")
+    print(f"   Cartões: {summary['cards']}")
+    print(f"   Transações normais: {summary['transactions']}")
+    print(f"   Transações de cartão: {summary['card_transactions']}")
+    print(f"   Anexos: {summary['attachments']}")
+    print(f"   Receitas: R$ {summary['income_cents'] / 100:,.2f}")
+    print(f"   Despesas: R$ {summary['expense_cents'] / 100:,.2f}")
+
+
+def take_snapshot(
+    directory: str | Path,
+    start_date: str,
+    end_date: str,
+    window: str = DEFAULT_WINDOW,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+):
+    """Grava os dados do período em Parquet para migrações e análises offline"""
+    if not ORGANIZZE_EMAIL or not ORGANIZZE_API_KEY:
+        print("❌ Configure ORGANIZZE_EMAIL e ORGANIZZE_API_KEY no arquivo .env")
+        sys.exit(1)
+
+    print(f"📸 Gravando snapshot do Organizze ({start_date} a {end_date}) em {directory}...")
+    snapshot = write_snapshot(
+        organizze, directory, start_date, end_date, window=window, workers=fetch_workers
+    )
+    metrics.info["snapshot_counts"] = snapshot.manifest["counts"]
+    print_snapshot_summary(snapshot.summary())
+    print(f"\n✅ Snapshot gravado em {snapshot.directory}")
+    print(f"   Use com: python migrate_organizze.py --from-snapshot {snapshot.directory}")
+
+
+def apply_plan(
+    plan_path: str | Path,
+    batch_size: int = MAX_BATCH_SIZE,
+    attachment_workers: int = DEFAULT_WORKERS,
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    max_attachment_size: int = MAX_ATTACHMENT_SIZE,
+    write_workers: int = DEFAULT_WRITE_WORKERS,
+    resume: bool = False,
+    journal_path: str | Path = DEFAULT_JOURNAL_PATH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    progress_interval: float = DEFAULT_REPORT_INTERVAL,
+):
+    """Executa um plano gravado com --plan, sem consultar a API do Organizze
+
+    Pipeline de dois estágios: anexos (download + upload) -> Firestore, este
+    com `write_workers` threads, cada uma com seu próprio BatchWriter.
+    """
+    if not FIREBASE_USER_ID:
+        print("❌ Configure FIREBASE_USER_ID no arquivo .env")
+        sys.exit(1)
+
+    try:
+        header, records = read_plan(plan_path)
+    except (OSError, ValueError) as e:
+        print(f"❌ Plano inválido: {e}")
+        sys.exit(1)
+    if header is None:
+        print(f"📄 {plan_path}: parte de um plano (sem cabeçalho)")
+    elif header.get("user") != FIREBASE_USER_ID:
+        print(
+            f"❌ O plano é do usuário {header.get('user')}, "
+            f"mas FIREBASE_USER_ID é {FIREBASE_USER_ID}"
+        )
+        sys.exit(1)
+    else:
+        print(
+            f"📄 Plano de {header.get('createdAt')} "
+            f"({header.get('start_date')} a {header.get('end_date')})"
+        )
+
+    # Sem reset: as partes de um plano dividido são aplicadas uma depois da
+    # outra com o mesmo journal, e cada apply só acrescenta os seus checkpoints
+    journal = MigrationJournal(journal_path, FIREBASE_USER_ID)
+    uploaded_attachments = {}
+    if resume:
+        uploaded_attachments = journal.attachments()
+        print(
+            f"⏩ Retomando: {journal.completed_count()} documentos "
+            f"e {len(uploaded_attachments)} anexos já migrados ({journal.path.name})"
+        )
+
+    db = clients.firestore_client()
+    user_ref = db.collection("users").document(FIREBASE_USER_ID)
+    pool = make_attachment_pool(attachment_workers, max_inflight_bytes, max_attachment_size)
+    counters = Counters()
+    writers = []
+    writers_lock = threading.Lock()
+    local = threading.local()
+
+    def thread_writer() -> BatchWriter:
+        if not hasattr(local, "writer"):
+            local.writer = BatchWriter(
+                db,
+                batch_size=batch_size,
+                on_commit=journal.record_batch,
+                limiter=limiters["firestore"],
+                metrics=metrics,
+            )
+            with writers_lock:
+                writers.append(local.writer)
+        return local.writer
+
+    def plan_records():
+        # Uma linha corrompida interrompe a leitura e faz o apply falhar
+        try:
+            yield from records
+        except (ValueError, KeyError) as e:
+            print(f"      ❌ Plano inválido: {e}")
+            counters.incr("invalid")
+
+    def transfer(record: dict):
+        """Estágio 1: baixa os anexos e envia para o R2"""
+        collection, doc_data = record["collection"], record["data"]
+        if resume and journal.is_done(collection, doc_data.get("_organizzeId")):
+            counters.incr("resumed")
+            return ()
+        attachments = transfer_attachments(
+            pool, record["attachments"], uploaded_attachments, journal
+        )
+        if attachments:
+            doc_data["attachments"] = attachments
+            counters.incr("attachments", len(attachments))
+        doc_data["createdAt"] = clients.server_timestamp()
+        return [(collection, doc_data)]
+
+    def write(item: tuple):
+        """Estágio 2: grava no Firestore (em lotes, por thread)"""
+        collection, doc_data = item
+        ref = organizze_ref(user_ref.collection(collection), doc_data["_organizzeId"])
+        thread_writer().upsert(ref, doc_data, keep=APP_MANAGED_FIELDS.get(collection, ()))
+        counters.incr(collection)
+
+    print(
+        f"\n🚀 Aplicando o plano ({attachment_workers} transferências, "
+        f"{write_workers} gravações em paralelo)..."
+    )
+    pipeline = Pipeline(
+        [
+            Stage("anexos", transfer, workers=attachment_workers, queue_size=queue_size),
+            Stage("firestore", write, workers=write_workers, queue_size=queue_size),
+        ],
+        report_interval=progress_interval,
+        progress=Progress(
+            "documentos gravados",
+            done=lambda: sum(writer.committed for writer in list(writers)),
+        ),
+    )
+    pipeline.run(plan_records())
+    pipeline.print_stats()
+    pool.shutdown()
+
+    failed = []
+    for writer in writers:
+        writer.close()
+        failed += writer.failed
+    journal.close()
+
+    committed = sum(writer.committed for writer in writers)
+    metrics.incr("accounts_imported", counters["accounts"])
+    metrics.incr("cards_imported", counters["cards"])
+    metrics.incr("transactions_imported", counters["transactions"])
+    metrics.incr("attachments_imported", counters["attachments"])
+    metrics.incr("resumed", counters["resumed"])
+    print("\n✅ Plano aplicado!")
+    print(f"   Documentos gravados: {committed}")
+    print(f"   - Contas: {counters['accounts']}")
+    print(f"   - Cartões: {counters['cards']}")
+    print(f"   - Transações: {counters['transactions']}")
+    print(f"   - Anexos: {counters['attachments']}")
+    if object_index.skipped_uploads:
+        print(f"   - Anexos já existentes no R2 (upload pulado): {object_index.skipped_uploads}")
+    if counters["resumed"]:
+        print(f"   - Já migrados anteriormente (pulados): {counters['resumed']}")
+
+    errors = sum(stage.errors for stage in pipeline.stages) + counters["invalid"]
+    if failed or errors:
+        print(f"\n❌ {len(failed)} documentos não foram gravados, {errors} erros no pipeline")
+        for f in failed:
+            print(f"   Lote {f['batch']} | {f['path']} | Organizze {f['organizzeId']}")
+        print("   Rode novamente com --apply ... --resume para tentar apenas esses documentos")
+        sys.exit(1)
+
+
+def sync_update(doc_data: dict, exclude: tuple = ()) -> dict:
+    """Campos de um upsert: preserva createdAt e o que o app mantém sozinho"""
+    data = {
+        key: value
+        for key, value in doc_data.items()
+        if key != "createdAt" and key not in exclude
+    }
+    data["updatedAt"] = clients.server_timestamp()
+    return data
+
+
+def index_by_organizze_id(query, page_size: int = DEFAULT_PAGE_SIZE, order_by: tuple = ()) -> dict:
+    """Mapeia `_organizzeId` -> referência dos documentos de `query`
+
+    Os campos de `order_by` entram na projeção: o cursor da próxima página
+    (`start_after`) é montado a partir deles.
+    """
+    index = {}
+    query = query.select(["_organizzeId", *order_by])
+    for doc in stream_paged(query, page_size, order_by):
+        organizze_id = (doc.to_dict() or {}).get("_organizzeId")
+        if organizze_id is not None:
+            index[organizze_id] = doc.reference
+    return index
+
+
+def sync(
+    end_date: str,
+    start_date: str | None = None,
+    lookback_days: int = DEFAULT_SYNC_LOOKBACK_DAYS,
+    dry_run: bool = False,
+    batch_size: int = MAX_BATCH_SIZE,
+    attachment_workers: int = DEFAULT_WORKERS,
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    max_attachment_size: int = MAX_ATTACHMENT_SIZE,
+    window: str = DEFAULT_WINDOW,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    journal_path: str | Path = DEFAULT_JOURNAL_PATH,
+    queue_size: int = DEFAULT_QUEUE_SIZE,
+    progress_interval: float = DEFAULT_REPORT_INTERVAL,
+):
+    """Sincronização incremental a partir do último ponto concluído
+
+    A API do Organizze não filtra por data de alteração, então a janela
+    sincronizada vai de `lookback_days` antes do último ponto (watermark)
+    até `end_date`: cobre transações novas e as editadas recentemente. Os
+    documentos são atualizados pelo `_organizzeId` (sem duplicar) e os que
+    sumiram da janela no Organizze são apagados no myPay, depois de confirmar
+    a exclusão individualmente (uma transação pode só ter mudado de data).
+    """
+    if not ORGANIZZE_EMAIL or not ORGANIZZE_API_KEY:
+        print("❌ Configure ORGANIZZE_EMAIL e ORGANIZZE_API_KEY no arquivo .env")
+        sys.exit(1)
+
+    if not FIREBASE_USER_ID:
+        print("❌ Configure FIREBASE_USER_ID no arquivo .env")
+        sys.exit(1)
+
+    journal = MigrationJournal(journal_path, FIREBASE_USER_ID)
+    watermark = journal.watermark()
+    if start_date is None:
+        if watermark is None:
+            print("❌ Nenhuma sincronização anterior: informe --start-date na primeira")
+            sys.exit(1)
+        start_date = (
+            datetime.strptime(watermark, "%Y-%m-%d") - timedelta(days=lookback_days)
+        ).strftime("%Y-%m-%d")
+
+    print(
+        f"🔄 Sincronizando {start_date} a {end_date} "
+        f"(última sincronização até: {watermark or 'nunca'})"
+    )
+
+    db = clients.firestore_client()
+    user_ref = db.collection("users").document(FIREBASE_USER_ID)
+    tx_ref = user_ref.collection("transactions")
+
+    accounts, categories, credit_cards = organizze.fetch_parallel(
+        ["/accounts", "/categories", "/credit_cards"], workers=fetch_workers
+    )
+    category_map = {cat["id"]: cat for cat in categories}
+    card_map = {c["id"]: c["name"] for c in credit_cards}
+
+    counters = Counters()
+    writer = BatchWriter(
+        db,
+        batch_size=batch_size,
+        on_commit=journal.record_batch,
+        limiter=limiters["firestore"],
+        metrics=metrics,
+    )
+
+    # Contas e cartões são poucos: sempre sincronizados por completo.
+    # Os campos mantidos pelo app (saldo, cor, ativo) não são sobrescritos.
+    for collection, items, to_doc in (
+        ("accounts", accounts, account_doc),
+        ("cards", credit_cards, card_doc),
+    ):
+        keep = APP_MANAGED_FIELDS[collection]
+        existing = index_by_organizze_id(user_ref.collection(collection))
+        for item in items:
+            ref = existing.get(item["id"])
+            if ref is not None:
+                data = sync_update(to_doc(item), exclude=keep)
+                if item.get("archived"):
+                    data["isActive"] = False
+                if not dry_run:
+                    writer.set(ref, data, merge=True)
+                counters.incr(f"{collection}_updated")
+            elif not item.get("archived"):
+                if not dry_run:
+                    ref = organizze_ref(user_ref.collection(collection), item["id"])
+                    writer.set(ref, to_doc(item), merge=True)
+                counters.incr(f"{collection}_created")
+
+    # Transações já importadas na janela: base para upsert e exclusões
+    window_query = tx_ref.where("date", ">=", parse_date(start_date).replace(hour=0)).where(
+        "date", "<=", parse_date(end_date).replace(hour=23, minute=59, second=59)
+    )
+    existing = index_by_organizze_id(window_query, order_by=("date",))
+    print(f"   📚 {len(existing)} transações do Organizze já no myPay nessa janela")
+
+    uploaded_attachments = journal.attachments()
+    pool = make_attachment_pool(attachment_workers, max_inflight_bytes, max_attachment_size)
+    seen_ids = set()
+
+    def find_existing(organizze_id):
+        """Transação fora da janela (ex.: mudou de data): busca pelo id"""
+        query = tx_ref.where("_organizzeId", "==", organizze_id).limit(1)
+        with metrics.time("firestore_lookup", organizze_id=organizze_id):
+            docs = limiters["firestore"].call(query.get)
+        return docs[0].reference if docs else None
+
+    def fetch_window(endpoint: str):
+        return organizze.get_json(endpoint)
+
+    def transform(t: dict):
+        if t.get("id") in seen_ids:
+            return ()
+        seen_ids.add(t.get("id"))
+        ref = existing.get(t["id"])
+        counters.incr("seen" if ref is not None else "new")
+        if dry_run:
+            return ()
+        return [(transaction_doc(t, category_map, card_map), attachment_sources(t), ref)]
+
+    def transfer(item: tuple):
+        doc_data, sources, ref = item
+        attachments = transfer_attachments(pool, sources, uploaded_attachments, journal)
+        if attachments:
+            doc_data["attachments"] = attachments
+            counters.incr("attachments", len(attachments))
+        return [(doc_data, ref)]
+
+    def write(item: tuple):
+        doc_data, ref = item
+        if ref is None:
+            ref = find_existing(doc_data["_organizzeId"])
+        if ref is None:
+            writer.set(organizze_ref(tx_ref, doc_data["_organizzeId"]), doc_data, merge=True)
+            counters.incr("created")
+        else:
+            writer.set(ref, sync_update(doc_data), merge=True)
+            counters.incr("updated")
+
+    stages = [
+        Stage("organizze", fetch_window, workers=fetch_workers, queue_size=queue_size),
+        Stage("transformação", transform, workers=1, queue_size=queue_size),
+    ]
+    if not dry_run:
+        stages += [
+            Stage("anexos", transfer, workers=attachment_workers, queue_size=queue_size),
+            Stage("firestore", write, workers=1, queue_size=queue_size),
+        ]
+    progress = None
+    if not dry_run:
+        progress = Progress(
+            "transações sincronizadas",
+            done=lambda: counters["created"] + counters["updated"],
+            total=lambda: counters["seen"] + counters["new"]
+            if pipeline.stages[0].finished
+            else None,
+        )
+    pipeline = Pipeline(stages, report_interval=progress_interval, progress=progress)
+    pipeline.run(transaction_endpoints(start_date, end_date, window))
+    pipeline.print_stats()
+
+    failures = sum(stage.errors for stage in pipeline.stages)
+
+    # Exclusões: só com a janela inteira lida, senão uma busca que falhou
+    # pareceria uma exclusão em massa
+    missing = {oid: ref for oid, ref in existing.items() if oid not in seen_ids}
+    if missing and pipeline.stages[0].errors:
+        print(f"\n⚠️  Busca incompleta: {len(missing)} possíveis exclusões ignoradas")
+    elif missing:
+        print(f"\n🔎 Conferindo {len(missing)} transações que sumiram da janela...")
+        for organizze_id, ref in missing.items():
+            try:
+                t = organizze.get_json(f"/transactions/{organizze_id}")
+            except requests.exceptions.HTTPError as e:
+                if e.response is None or e.response.status_code != 404:
+                    print(f"      ⚠️  Erro ao conferir {organizze_id}: {e}")
+                    failures += 1
+                    continue
+                t = None
+            except Exception as e:
+                print(f"      ⚠️  Erro ao conferir {organizze_id}: {e}")
+                failures += 1
+                continue
+
+            if t is None:
+                counters.incr("deleted")
+                if not dry_run:
+                    writer.delete(ref, organizze_id)
+            elif not dry_run:
+                # Mudou de data para fora da janela: atualiza no lugar
+                for item in transform(t):
+                    for ready in transfer(item):
+                        write(ready)
+
+    print("\n📊 Resumo da sincronização:")
+    print(
+        f"   Contas: {counters['accounts_created']} novas, "
+        f"{counters['accounts_updated']} atualizadas"
+    )
+    print(
+        f"   Cartões: {counters['cards_created']} novos, "
+        f"{counters['cards_updated']} atualizados"
+    )
+    if dry_run:
+        print(f"   Transações já no myPay (seriam atualizadas): {counters['seen']}")
+        print(f"   Transações novas ou fora da janela: {counters['new']}")
+        print(f"   Transações excluídas no Organizze: {counters['deleted']}")
+        print("\n⚠️  Modo dry-run: nada foi gravado e o ponto de sincronização não mudou")
+        journal.close()
+        return
+
+    writer.close()
+    metrics.incr("transactions_created", counters["created"])
+    metrics.incr("transactions_updated", counters["updated"])
+    metrics.incr("transactions_deleted", counters["deleted"])
+    metrics.incr("attachments_imported", counters["attachments"])
+    print(f"   Transações criadas: {counters['created']}")
+    print(f"   Transações atualizadas: {counters['updated']}")
+    print(f"   Transações excluídas: {counters['deleted']}")
+    print(f"   Anexos: {counters['attachments']}")
+    if object_index.skipped_uploads:
+        print(f"   Anexos já existentes no R2 (upload pulado): {object_index.skipped_uploads}")
+
+    if writer.failed or failures:
+        journal.close()
+        print(
+            f"\n❌ Sincronização incompleta ({len(writer.failed)} documentos não "
+            f"gravados, {failures} erros): o ponto de sincronização não foi avançado"
+        )
+        for f in writer.failed:
+            print(f"   Lote {f['batch']} | {f['path']} | Organizze {f['organizzeId']}")
+        sys.exit(1)
+
+    journal.set_watermark(end_date)
+    journal.close()
+    print(f"\n✅ Sincronização concluída até {end_date}")
 
 
 def main():
     parser = argparse.ArgumentParser(description="Migrar dados do Organizze para myPay")
-    parser.add_argument("--start-date", required=True, help="Data inicial (YYYY-MM-DD)")
-    parser.add_argument("--end-date", required=True, help="Data final (YYYY-MM-DD)")
+    parser.add_argument("--start-date", help="Data inicial (YYYY-MM-DD)")
+    parser.add_argument(
+        "--end-date", help="Data final (YYYY-MM-DD); no --sync, o padrão é hoje"
+    )
+    parser.add_argument(
+        "--sync",
+        action="store_true",
+        help="Sincronização incremental a partir do último ponto salvo no journal",
+    )
+    parser.add_argument(
+        "--lookback-days",
+        type=int,
+        default=DEFAULT_SYNC_LOOKBACK_DAYS,
+        help="No --sync, dias antes do último ponto a reler (edições recentes)",
+    )
     parser.add_argument(
         "--dry-run", action="store_true", help="Apenas mostrar o que seria importado"
     )
+    parser.add_argument(
+        "--plan",
+        metavar="ARQUIVO",
+        help="Gravar em JSONL as escritas e anexos da migração, sem gravar no Firestore",
+    )
+    parser.add_argument(
+        "--apply",
+        metavar="ARQUIVO",
+        help="Executar um plano gerado com --plan (não consulta a API do Organizze)",
+    )
+    parser.add_argument(
+        "--snapshot",
+        metavar="DIRETÓRIO",
+        help="Gravar os dados do período em Parquet, sem gravar no Firestore",
+    )
+    parser.add_argument(
+        "--from-snapshot",
+        metavar="DIRETÓRIO",
+        help="Ler contas, cartões e transações de um snapshot em vez da API",
+    )
+    parser.add_argument(
+        "--shard",
+        type=parse_shard,
+        metavar="i/N",
+        help="Migrar só a parte i de N (processos/máquinas em paralelo, cada um com seu journal)",
+    )
+    parser.add_argument(
+        "--shard-by",
+        choices=SHARD_MODES,
+        default="window",
+        help="No --shard, repartir por janela de datas ou pelo hash do id da transação",
+    )
+    parser.add_argument(
+        "--write-workers",
+        type=int,
+        default=DEFAULT_WRITE_WORKERS,
+        help="No --apply, threads gravando lotes no Firestore em paralelo",
+    )
+    parser.add_argument(
+        "--resume",
+        action="store_true",
+        help="Retomar a migração anterior, pulando o que já está no journal",
+    )
+    parser.add_argument(
+        "--journal",
+        default=str(DEFAULT_JOURNAL_PATH),
+        help="Arquivo SQLite do journal de checkpoint",
+    )
+    parser.add_argument(
+        "--refresh",
+        action="store_true",
+        help="Ignorar o TTL do cache e revalidar as respostas do Organizze",
+    )
+    parser.add_argument(
+        "--no-cache",
+        action="store_true",
+        help="Não usar o cache em disco das respostas do Organizze",
+    )
+    parser.add_argument(
+        "--cache-ttl",
+        type=float,
+        default=DEFAULT_CACHE_TTL,
+        help="Segundos em que uma resposta em cache é usada sem revalidar",
+    )
+    parser.add_argument(
+        "--cache-dir",
+        default=str(DEFAULT_CACHE_DIR),
+        help="Diretório do cache de respostas do Organizze",
+    )
+    parser.add_argument(
+        "--http-timeout",
+        type=float,
+        default=DEFAULT_TIMEOUT,
+        help="Timeout em segundos das requisições ao Organizze",
+    )
+    parser.add_argument(
+        "--http-retries",
+        type=int,
+        default=DEFAULT_MAX_RETRIES,
+        help="Novas tentativas em respostas 429/5xx ou falhas de conexão",
+    )
+    parser.add_argument(
+        "--max-attachment-mb",
+        type=float,
+        default=MAX_ATTACHMENT_SIZE / 1024 / 1024,
+        help="Tamanho máximo de um anexo; maiores são ignorados",
+    )
+    parser.add_argument(
+        "--window",
+        choices=WINDOWS,
+        default=DEFAULT_WINDOW,
+        help="Tamanho das janelas de busca de transações",
+    )
+    parser.add_argument(
+        "--fetch-workers",
+        type=int,
+        default=DEFAULT_FETCH_WORKERS,
+        help="Requisições simultâneas ao Organizze na busca inicial",
+    )
+    parser.add_argument(
+        "--queue-size",
+        type=int,
+        default=DEFAULT_QUEUE_SIZE,
+        help="Itens por fila entre os estágios do pipeline (backpressure)",
+    )
+    parser.add_argument(
+        "--progress-interval",
+        type=float,
+        default=DEFAULT_REPORT_INTERVAL,
+        help="Segundos entre os relatórios de progresso (ETA e filas)",
+    )
+    parser.add_argument(
+        "--batch-size",
+        type=int,
+        default=MAX_BATCH_SIZE,
+        help=f"Documentos por lote de escrita no Firestore (máx. {MAX_BATCH_SIZE})",
+    )
+    parser.add_argument(
+        "--attachment-workers",
+        type=int,
+        default=DEFAULT_WORKERS,
+        help="Transferências de anexos simultâneas (download + upload)",
+    )
+    parser.add_argument(
+        "--no-r2-inventory",
+        action="store_true",
+        help="Checar cada anexo com HEAD em vez de listar os comprovantes do usuário no R2",
+    )
+    parser.add_argument(
+        "--max-inflight-mb",
+        type=int,
+        default=DEFAULT_MAX_INFLIGHT_BYTES // (1024 * 1024),
+        help="Limite de MB de anexos em memória ao mesmo tempo",
+    )
+    parser.add_argument(
+        "--multipart-concurrency",
+        type=int,
+        default=clients.DEFAULT_MULTIPART_CONCURRENCY,
+        help="Conexões ao R2 por upload multipart (anexos acima de 8 MB)",
+    )
+
+    add_rate_limit_arguments(parser)
+    add_image_arguments(parser)
+    add_metrics_arguments(parser)
+    add_tracing_arguments(parser)
 
     args = parser.parse_args()
 
+    if args.apply and (args.plan or args.sync or args.dry_run):
+        parser.error("--apply não combina com --plan, --sync ou --dry-run")
+    if args.plan and (args.sync or args.dry_run):
+        parser.error("--plan não combina com --sync ou --dry-run")
+    if args.snapshot and (args.apply or args.plan or args.sync or args.dry_run):
+        parser.error("--snapshot não combina com --apply, --plan, --sync ou --dry-run")
+    if args.from_snapshot and (args.snapshot or args.apply or args.sync):
+        parser.error("--from-snapshot não combina com --snapshot, --apply ou --sync")
+
+    if args.shard and (args.sync or args.apply or args.snapshot):
+        parser.error("--shard não combina com --sync, --apply ou --snapshot")
+    if args.shard and args.journal == str(DEFAULT_JOURNAL_PATH):
+        # Cada shard tem o próprio checkpoint (o reset de um não apaga o outro)
+        index, count = args.shard
+        args.journal = str(
+            DEFAULT_JOURNAL_PATH.with_name(
+                f"{DEFAULT_JOURNAL_PATH.stem}.shard-{index + 1}-of-{count}.sqlite"
+            )
+        )
+
+    snapshot = None
+    if args.from_snapshot:
+        try:
+            snapshot = OrganizzeSnapshot(args.from_snapshot)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+        # Sem datas, usa o período inteiro do snapshot
+        args.start_date = args.start_date or snapshot.start_date
+        args.end_date = args.end_date or snapshot.end_date
+        if not snapshot.covers(args.start_date, args.end_date):
+            print(
+                f"❌ O snapshot cobre {snapshot.start_date} a {snapshot.end_date}; "
+                f"período pedido: {args.start_date} a {args.end_date}"
+            )
+            sys.exit(1)
+    if args.sync and not args.end_date:
+        args.end_date = datetime.now().strftime("%Y-%m-%d")
+    if not (args.sync or args.apply) and not (args.start_date and args.end_date):
+        parser.error("--start-date e --end-date são obrigatórios (exceto com --sync ou --apply)")
+
     # Validar datas
     try:
-        datetime.strptime(args.start_date, "%Y-%m-%d")
-        datetime.strptime(args.end_date, "%Y-%m-%d")
+        for value in (args.start_date, args.end_date):
+            if value:
+                datetime.strptime(value, "%Y-%m-%d")
     except ValueError:
         print("❌ Formato de data inválido. Use YYYY-MM-DD")
         sys.exit(1)
 
-    migrate(args.start_date, args.end_date, args.dry_run)
+    if not 1 <= args.batch_size <= MAX_BATCH_SIZE:
+        print(f"❌ --batch-size deve estar entre 1 e {MAX_BATCH_SIZE}")
+        sys.exit(1)
+
+    configure_limiters(limiters, args)
+    clients.set_multipart_concurrency(args.multipart_concurrency)
+    organizze.timeout = args.http_timeout
+    organizze.max_retries = max(0, args.http_retries)
+    if not args.no_cache:
+        # No --sync as respostas são sempre revalidadas (304 continua barato)
+        organizze.cache = ResponseCache(
+            args.cache_dir, ttl=args.cache_ttl, refresh=args.refresh or args.sync
+        )
+
+    if args.attachment_workers < 1:
+        print("❌ --attachment-workers deve ser pelo menos 1")
+        sys.exit(1)
+
+    global image_optimizer
+    image_optimizer = make_image_optimizer(args, metrics)
+    if args.no_r2_inventory:
+        object_index.inventory_prefix = None
+
+    if args.sync:
+        metrics.run = "sync"
+    elif args.snapshot:
+        metrics.run = "snapshot"
+    elif args.plan or args.apply:
+        metrics.run = "plan" if args.plan else "apply"
+    metrics.info.update(vars(args))
+    start_tracing(metrics, args)
+    try:
+        if args.apply:
+            apply_plan(
+                args.apply,
+                batch_size=args.batch_size,
+                attachment_workers=args.attachment_workers,
+                max_inflight_bytes=args.max_inflight_mb * 1024 * 1024,
+                max_attachment_size=int(args.max_attachment_mb * 1024 * 1024),
+                write_workers=max(1, args.write_workers),
+                resume=args.resume,
+                journal_path=args.journal,
+                queue_size=max(1, args.queue_size),
+                progress_interval=args.progress_interval,
+            )
+            return
+
+        if args.sync:
+            sync(
+                args.end_date,
+                start_date=args.start_date,
+                lookback_days=max(0, args.lookback_days),
+                dry_run=args.dry_run,
+                batch_size=args.batch_size,
+                attachment_workers=args.attachment_workers,
+                max_inflight_bytes=args.max_inflight_mb * 1024 * 1024,
+                max_attachment_size=int(args.max_attachment_mb * 1024 * 1024),
+                window=args.window,
+                fetch_workers=max(1, args.fetch_workers),
+                journal_path=args.journal,
+                queue_size=max(1, args.queue_size),
+                progress_interval=args.progress_interval,
+            )
+            return
+
+        if args.snapshot:
+            take_snapshot(
+                args.snapshot,
+                args.start_date,
+                args.end_date,
+                window=args.window,
+                fetch_workers=max(1, args.fetch_workers),
+            )
+            return
+
+        migrate(
+            args.start_date,
+            args.end_date,
+            args.dry_run,
+            batch_size=args.batch_size,
+            attachment_workers=args.attachment_workers,
+            max_inflight_bytes=args.max_inflight_mb * 1024 * 1024,
+            max_attachment_size=int(args.max_attachment_mb * 1024 * 1024),
+            window=args.window,
+            fetch_workers=max(1, args.fetch_workers),
+            resume=args.resume,
+            journal_path=args.journal,
+            queue_size=max(1, args.queue_size),
+            progress_interval=args.progress_interval,
+            plan_path=args.plan,
+            snapshot=snapshot,
+            shard=args.shard,
+            shard_by=args.shard_by,
+        )
+    finally:
+        if image_optimizer:
+            image_optimizer.shutdown()
+        metrics.incr("organizze_retries", organizze.retries)
+        for limiter in limiters.values():
+            metrics.incr(f"{limiter.name}_throttled", limiter.throttled)
+        finish_tracing(metrics, args)
+        write_reports(metrics, args)
 
 
 if __name__ == "__main__":
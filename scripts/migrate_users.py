@@ -0,0 +1,320 @@
+#!/usr/bin/env python3
+"""
+Migração de vários usuários do Organizze para o myPay em paralelo
+
+Lê um manifesto com um usuário por linha e roda `migrate_organizze.py` para
+cada um em um processo próprio: credenciais, cliente do Firebase, journal,
+log e relatório de métricas ficam isolados por usuário. No máximo
+`--processes` usuários rodam ao mesmo tempo.
+
+Os tetos globais de conexões (Organizze, R2) e de requisições por segundo
+(Organizze, downloads de anexos, R2, Firestore) são divididos entre os
+processos simultâneos, de modo que a soma nunca passa do limite configurado.
+
+Manifesto (JSON Lines ou CSV com as mesmas colunas):
+    {"uid": "abc123", "organizze_email": "a@b.com", "organizze_api_key": "...",
+     "start_date": "2022-01-01", "end_date": "2026-01-30"}
+
+    Campos opcionais: "sync" (true para --sync; datas viram opcionais).
+
+Uso:
+    python migrate_users.py usuarios.jsonl
+    python migrate_users.py usuarios.csv --processes 4 --max-organizze-connections 16
+    python migrate_users.py usuarios.jsonl --resume -- --window week
+"""
+
+import argparse
+import csv
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime
+from pathlib import Path
+
+from rate_limiter import (
+    DEFAULT_ATTACHMENTS_RPS,
+    DEFAULT_FIRESTORE_RPS,
+    DEFAULT_ORGANIZZE_RPS,
+    DEFAULT_R2_RPS,
+)
+
+SCRIPT = Path(__file__).parent / "migrate_organizze.py"
+DEFAULT_RUNS_DIR = Path(__file__).parent / ".multi_user_runs"
+DEFAULT_JOURNAL_DIR = Path(__file__).parent / ".journals"
+
+DEFAULT_PROCESSES = 2
+DEFAULT_ORGANIZZE_CONNECTIONS = 8
+DEFAULT_R2_CONNECTIONS = 16
+
+REQUIRED_FIELDS = ("uid", "organizze_email", "organizze_api_key")
+
+
+def load_manifest(path: str | Path) -> list[dict]:
+    """Lê o manifesto (JSON Lines ou CSV) e valida os campos obrigatórios"""
+    path = Path(path)
+    if path.suffix.lower() == ".csv":
+        with open(path, newline="") as f:
+            users = [dict(row) for row in csv.DictReader(f)]
+    else:
+        users = [
+            json.loads(line)
+            for line in path.read_text().splitlines()
+            if line.strip() and not line.lstrip().startswith("#")
+        ]
+
+    seen = set()
+    for number, user in enumerate(users, start=1):
+        missing = [field for field in REQUIRED_FIELDS if not user.get(field)]
+        if missing:
+            raise ValueError(f"Linha {number}: faltam {', '.join(missing)}")
+        if user["uid"] in seen:
+            raise ValueError(f"Linha {number}: uid repetido ({user['uid']})")
+        seen.add(user["uid"])
+
+        user["sync"] = str(user.get("sync", "")).lower() in ("1", "true", "yes", "sim")
+        if not user["sync"] and not (user.get("start_date") and user.get("end_date")):
+            raise ValueError(f"Linha {number}: start_date e end_date são obrigatórios")
+    return users
+
+
+def max_processes(args) -> int:
+    """Processos simultâneos que cabem nos tetos de conexões
+
+    Cada processo precisa de ao menos 2 conexões no Organizze (uma busca e
+    uma transferência de anexo) e 1 no R2.
+    """
+    return max(1, min(args.max_organizze_connections // 2, args.max_r2_connections))
+
+
+def split_limits(args, processes: int) -> dict:
+    """Parte de cada teto global que cabe a um processo
+
+    `processes` não pode passar de `max_processes(args)`: assim a soma das
+    partes nunca excede os tetos.
+    """
+    organizze_share = args.max_organizze_connections // processes
+    r2_share = args.max_r2_connections // processes
+    fetch_workers = max(1, organizze_share // 2)
+    # Cada transferência de anexo usa uma conexão no Organizze e ao menos uma
+    # no R2; uploads multipart dividem o que sobrar da parte do R2
+    attachment_workers = max(1, min(organizze_share - fetch_workers, r2_share))
+    return {
+        "fetch_workers": fetch_workers,
+        "attachment_workers": attachment_workers,
+        "multipart_concurrency": max(1, r2_share // attachment_workers),
+        "organizze_rps": args.organizze_rps / processes,
+        "attachments_rps": args.attachments_rps / processes,
+        "r2_rps": args.r2_rps / processes,
+        "firestore_rps": args.firestore_rps / processes,
+    }
+
+
+def user_command(user: dict, limits: dict, args, run_dir: Path) -> list[str]:
+    command = [sys.executable, str(SCRIPT)]
+    if user["sync"]:
+        command.append("--sync")
+    if user.get("start_date"):
+        command += ["--start-date", user["start_date"]]
+    if user.get("end_date"):
+        command += ["--end-date", user["end_date"]]
+    if args.dry_run:
+        command.append("--dry-run")
+    if args.resume and not user["sync"]:
+        command.append("--resume")
+
+    command += [
+        "--journal", str(Path(args.journal_dir) / f"{user['uid']}.sqlite"),
+        "--report", str(run_dir / f"{user['uid']}.json"),
+        "--fetch-workers", str(limits["fetch_workers"]),
+        "--attachment-workers", str(limits["attachment_workers"]),
+        "--multipart-concurrency", str(limits["multipart_concurrency"]),
+        "--organizze-rps", f"{limits['organizze_rps']:.2f}",
+        "--attachments-rps", f"{limits['attachments_rps']:.2f}",
+        "--r2-rps", f"{limits['r2_rps']:.2f}",
+        "--firestore-rps", f"{limits['firestore_rps']:.2f}",
+    ]
+    return command + args.extra
+
+
+def run_user(user: dict, limits: dict, args, run_dir: Path) -> dict:
+    """Executa a migração de um usuário em um processo separado"""
+    env = dict(os.environ)
+    env.update(
+        {
+            "FIREBASE_USER_ID": user["uid"],
+            "VITE_ORGANIZZE_EMAIL": user["organizze_email"],
+            "VITE_ORGANIZZE_API_KEY": user["organizze_api_key"],
+            "PYTHONUNBUFFERED": "1",
+        }
+    )
+    log_path = run_dir / f"{user['uid']}.log"
+    started = time.monotonic()
+    with open(log_path, "w") as log:
+        result = subprocess.run(
+            user_command(user, limits, args, run_dir),
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+            cwd=SCRIPT.parent,
+        )
+
+    report = {}
+    report_path = run_dir / f"{user['uid']}.json"
+    if report_path.exists():
+        report = json.loads(report_path.read_text())
+    return {
+        "uid": user["uid"],
+        "returncode": result.returncode,
+        "elapsed_s": round(time.monotonic() - started, 1),
+        "documents": report.get("counters", {}).get("firestore_documents", 0),
+        "log": str(log_path),
+        "report": str(report_path) if report else None,
+    }
+
+
+def parse_arguments(argv: list[str] | None = None):
+    """Opções do driver; o que vem depois do primeiro `--` vai para cada usuário
+
+    O corte é feito antes do argparse: assim as opções do driver podem vir
+    depois do manifesto sem serem repassadas aos processos filhos.
+    """
+    argv = sys.argv[1:] if argv is None else list(argv)
+    extra = []
+    if "--" in argv:
+        split = argv.index("--")
+        argv, extra = argv[:split], argv[split + 1 :]
+
+    parser = argparse.ArgumentParser(
+        description="Migrar vários usuários do Organizze para o myPay em paralelo",
+        epilog="Argumentos depois de `--` são repassados ao migrate_organizze.py",
+    )
+    parser.add_argument("manifest", help="Arquivo .jsonl ou .csv com os usuários")
+    parser.add_argument(
+        "--processes",
+        type=int,
+        default=DEFAULT_PROCESSES,
+        help="Usuários migrados ao mesmo tempo (um processo cada)",
+    )
+    parser.add_argument(
+        "--max-organizze-connections",
+        type=int,
+        default=DEFAULT_ORGANIZZE_CONNECTIONS,
+        help="Conexões simultâneas ao Organizze somando todos os processos",
+    )
+    parser.add_argument(
+        "--max-r2-connections",
+        type=int,
+        default=DEFAULT_R2_CONNECTIONS,
+        help="Uploads simultâneos ao R2 somando todos os processos",
+    )
+    parser.add_argument(
+        "--organizze-rps",
+        type=float,
+        default=DEFAULT_ORGANIZZE_RPS,
+        help="Requisições/s ao Organizze somando todos os processos",
+    )
+    parser.add_argument(
+        "--attachments-rps",
+        type=float,
+        default=DEFAULT_ATTACHMENTS_RPS,
+        help="Downloads/s de anexos (URLs assinadas) somando todos os processos",
+    )
+    parser.add_argument(
+        "--r2-rps",
+        type=float,
+        default=DEFAULT_R2_RPS,
+        help="Operações/s no R2 somando todos os processos",
+    )
+    parser.add_argument(
+        "--firestore-rps",
+        type=float,
+        default=DEFAULT_FIRESTORE_RPS,
+        help="Commits/s no Firestore somando todos os processos",
+    )
+    parser.add_argument("--dry-run", action="store_true", help="Repassa --dry-run a cada usuário")
+    parser.add_argument("--resume", action="store_true", help="Repassa --resume a cada usuário")
+    parser.add_argument(
+        "--journal-dir",
+        default=str(DEFAULT_JOURNAL_DIR),
+        help="Diretório dos journals (um arquivo por usuário, mantido entre execuções)",
+    )
+    parser.add_argument(
+        "--runs-dir",
+        default=str(DEFAULT_RUNS_DIR),
+        help="Onde ficam os logs e relatórios de cada execução",
+    )
+
+    args = parser.parse_args(argv)
+    args.extra = extra
+    if args.max_organizze_connections < 2 or args.max_r2_connections < 1:
+        parser.error(
+            "--max-organizze-connections precisa ser >= 2 e --max-r2-connections >= 1"
+        )
+    return args
+
+
+def main():
+    args = parse_arguments()
+
+    try:
+        users = load_manifest(args.manifest)
+    except (OSError, ValueError) as e:
+        print(f"❌ Manifesto inválido: {e}")
+        sys.exit(1)
+    if not users:
+        print("⚠️  Manifesto vazio")
+        return
+
+    processes = max(1, min(args.processes, len(users)))
+    if processes > max_processes(args):
+        processes = max_processes(args)
+        print(f"⚠️  Só {processes} processos cabem nos tetos de conexões; usando {processes}")
+    limits = split_limits(args, processes)
+    run_dir = Path(args.runs_dir) / datetime.now().strftime("%Y%m%d-%H%M%S")
+    run_dir.mkdir(parents=True, exist_ok=True)
+    Path(args.journal_dir).mkdir(parents=True, exist_ok=True)
+
+    print(f"👥 {len(users)} usuários, {processes} por vez")
+    print(
+        f"   Por processo: {limits['fetch_workers']} buscas + "
+        f"{limits['attachment_workers']} anexos simultâneos "
+        f"({limits['multipart_concurrency']} conexões por upload multipart), "
+        f"{limits['organizze_rps']:.1f} req/s Organizze, {limits['r2_rps']:.1f} op/s R2, "
+        f"{limits['firestore_rps']:.1f} commits/s Firestore"
+    )
+    print(f"   Logs e relatórios: {run_dir}")
+
+    results = []
+    with ThreadPoolExecutor(max_workers=processes) as executor:
+        futures = {
+            executor.submit(run_user, user, limits, args, run_dir): user for user in users
+        }
+        for future in as_completed(futures):
+            uid = futures[future]["uid"]
+            try:
+                result = future.result()
+            except Exception as e:
+                result = {"uid": uid, "returncode": None, "error": str(e)}
+            results.append(result)
+            status = "✅" if result["returncode"] == 0 else "❌"
+            print(
+                f"   {status} {uid} ({result.get('elapsed_s', 0)}s, "
+                f"{result.get('documents', 0)} documentos)"
+            )
+
+    (run_dir / "summary.json").write_text(json.dumps(results, indent=2))
+
+    failed = [r for r in results if r["returncode"] != 0]
+    print(f"\n📊 {len(results) - len(failed)} de {len(results)} usuários migrados")
+    if failed:
+        print("❌ Falharam (veja os logs):")
+        for result in failed:
+            print(f"   {result['uid']}: {result.get('log') or result.get('error')}")
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,158 @@
+"""
+Journal local (SQLite) para retomar migrações interrompidas
+
+Registra o `_organizzeId` de cada documento assim que o lote dele é gravado no
+Firestore, além dos anexos já enviados ao R2 (id/URL de origem -> metadados).
+Com `--resume`, o que já consta no journal é pulado sem consultar o Firestore.
+As escritas acontecem em bloco, uma transação SQLite por lote do Firestore.
+
+Também guarda o ponto de sincronização (high-watermark) de cada usuário usado
+pelo modo `--sync`.
+"""
+
+import json
+import sqlite3
+import threading
+from pathlib import Path
+
+DEFAULT_JOURNAL_PATH = Path(__file__).parent / ".migration_journal.sqlite"
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (
+    user_id TEXT NOT NULL,
+    collection TEXT NOT NULL,
+    organizze_id TEXT NOT NULL,
+    doc_path TEXT NOT NULL,
+    PRIMARY KEY (user_id, collection, organizze_id)
+);
+CREATE TABLE IF NOT EXISTS attachments (
+    user_id TEXT NOT NULL,
+    source TEXT NOT NULL,
+    metadata TEXT NOT NULL,
+    PRIMARY KEY (user_id, source)
+);
+CREATE TABLE IF NOT EXISTS sync_state (
+    user_id TEXT PRIMARY KEY,
+    watermark TEXT NOT NULL,
+    synced_at TEXT NOT NULL
+);
+"""
+
+
+class MigrationJournal:
+    """Checkpoint dos documentos e anexos migrados de um usuário"""
+
+    def __init__(self, path: str | Path, user_id: str):
+        self.path = Path(path)
+        self.user_id = user_id
+        self._lock = threading.Lock()
+        self._pending_attachments = []
+        self._conn = sqlite3.connect(self.path, check_same_thread=False)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.executescript(SCHEMA)
+
+    def reset(self):
+        """Esquece o progresso anterior deste usuário"""
+        with self._lock, self._conn:
+            self._conn.execute("DELETE FROM documents WHERE user_id = ?", (self.user_id,))
+            self._conn.execute("DELETE FROM attachments WHERE user_id = ?", (self.user_id,))
+
+    def completed(self) -> dict:
+        """Retorna {coleção: set(organizze_id)} já gravados"""
+        done = {}
+        rows = self._conn.execute(
+            "SELECT collection, organizze_id FROM documents WHERE user_id = ?",
+            (self.user_id,),
+        )
+        for collection, organizze_id in rows:
+            done.setdefault(collection, set()).add(organizze_id)
+        return done
+
+    def is_done(self, collection: str, organizze_id) -> bool:
+        """Consulta pontual (índice da chave primária): não carrega o journal"""
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT 1 FROM documents "
+                "WHERE user_id = ? AND collection = ? AND organizze_id = ?",
+                (self.user_id, collection, str(organizze_id)),
+            ).fetchone()
+        return row is not None
+
+    def completed_count(self) -> int:
+        with self._lock:
+            (count,) = self._conn.execute(
+                "SELECT COUNT(*) FROM documents WHERE user_id = ?", (self.user_id,)
+            ).fetchone()
+        return count
+
+    def attachments(self) -> dict:
+        """Retorna {origem do anexo: metadados} já enviados ao R2"""
+        rows = self._conn.execute(
+            "SELECT source, metadata FROM attachments WHERE user_id = ?",
+            (self.user_id,),
+        )
+        return {source: json.loads(metadata) for source, metadata in rows}
+
+    def watermark(self) -> str | None:
+        """Data (YYYY-MM-DD) até a qual a última sincronização foi concluída"""
+        row = self._conn.execute(
+            "SELECT watermark FROM sync_state WHERE user_id = ?", (self.user_id,)
+        ).fetchone()
+        return row[0] if row else None
+
+    def set_watermark(self, watermark: str):
+        with self._lock, self._conn:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO sync_state VALUES (?, ?, datetime('now'))",
+                (self.user_id, watermark),
+            )
+
+    def add_attachment(self, source: str, metadata: dict):
+        """Enfileira um anexo enviado; é gravado junto com o próximo lote"""
+        with self._lock:
+            self._pending_attachments.append(
+                (self.user_id, source, json.dumps(metadata))
+            )
+
+    def record_batch(self, ops: list):
+        """Callback do BatchWriter: registra os documentos de um lote gravado"""
+        rows = []
+        deleted = []
+        for op, ref, data in ops:
+            if data.get("_organizzeId") is None:
+                continue
+            key = (self.user_id, ref.parent.id, str(data["_organizzeId"]))
+            if op == "delete":
+                deleted.append(key)
+            else:
+                rows.append((*key, ref.path))
+        self._write(rows, deleted)
+
+    def flush(self):
+        self._write([])
+
+    def close(self):
+        self.flush()
+        self._conn.close()
+
+    def _write(self, document_rows: list, deleted_rows: list = ()):
+        with self._lock:
+            attachment_rows, self._pending_attachments = self._pending_attachments, []
+            with self._conn:
+                if deleted_rows:
+                    self._conn.executemany(
+                        "DELETE FROM documents "
+                        "WHERE user_id = ? AND collection = ? AND organizze_id = ?",
+                        deleted_rows,
+                    )
+                if document_rows:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO documents VALUES (?, ?, ?, ?)",
+                        document_rows,
+                    )
+                if attachment_rows:
+                    self._conn.executemany(
+                        "INSERT OR REPLACE INTO attachments VALUES (?, ?, ?)",
+                        attachment_rows,
+                    )
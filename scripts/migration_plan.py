@@ -0,0 +1,123 @@
+"""
+Plano de migração serializado (JSON Lines) para o modo `--plan`/`--apply`
+
+`--plan` grava cada escrita que a migração faria, já convertida para o
+formato do myPay (tipos de conta, bandeiras, datas, categorias), junto com os
+anexos a transferir. `--apply` executa o plano sem consultar a API do
+Organizze de novo: só baixa os anexos e grava no Firestore.
+
+Formato: a primeira linha é um cabeçalho (`"op": "plan"`) e cada linha
+seguinte é uma escrita independente:
+
+    {"op": "add", "collection": "transactions", "data": {...},
+     "attachments": [["<origem>", "<url>"], ...]}
+
+Como as linhas não dependem umas das outras, o plano pode ser dividido (ex.:
+`split -l`) e aplicado em partes, em máquinas diferentes. Datas viram
+`{"$date": "<ISO 8601>"}`; `createdAt` não é gravado no plano e passa a ser
+o horário do servidor no momento do apply. As URLs de anexos do Organizze
+podem expirar: aplique o plano logo depois de gerá-lo.
+"""
+
+import json
+from datetime import datetime
+from pathlib import Path
+
+PLAN_VERSION = 1
+
+
+def encode_value(value):
+    """Converte um valor do documento para JSON (datas como `$date`)"""
+    if isinstance(value, datetime):
+        return {"$date": value.isoformat()}
+    if isinstance(value, dict):
+        return {key: encode_value(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [encode_value(item) for item in value]
+    return value
+
+
+def decode_value(value):
+    if isinstance(value, dict):
+        if set(value) == {"$date"}:
+            return datetime.fromisoformat(value["$date"])
+        return {key: decode_value(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [decode_value(item) for item in value]
+    return value
+
+
+class PlanWriter:
+    """Grava o plano linha a linha (não guarda nada em memória)"""
+
+    def __init__(self, path: str | Path, user_id: str, **info):
+        self.path = Path(path)
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        self.counts = {}
+        self.attachments = 0
+        self._file = open(self.path, "w")
+        self._write(
+            {
+                "op": "plan",
+                "version": PLAN_VERSION,
+                "user": user_id,
+                "createdAt": datetime.now().isoformat(timespec="seconds"),
+                **info,
+            }
+        )
+
+    def add(self, collection: str, data: dict, attachments: list = ()):
+        data = {key: value for key, value in data.items() if key != "createdAt"}
+        record = {"op": "add", "collection": collection, "data": encode_value(data)}
+        if attachments:
+            record["attachments"] = [list(source) for source in attachments]
+            self.attachments += len(attachments)
+        self._write(record)
+        self.counts[collection] = self.counts.get(collection, 0) + 1
+
+    def close(self):
+        self._file.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        self.close()
+
+    def _write(self, record: dict):
+        self._file.write(json.dumps(record, ensure_ascii=False) + "\n")
+
+
+def read_plan(path: str | Path) -> tuple[dict | None, object]:
+    """Retorna `(cabeçalho, gerador das escritas)`
+
+    O cabeçalho é None quando o arquivo é um pedaço de um plano dividido.
+    """
+    path = Path(path)
+    with open(path) as f:
+        first = f.readline()
+    header = json.loads(first) if first.strip() else None
+    if header is not None and header.get("op") != "plan":
+        header = None
+    if header is not None and header.get("version") != PLAN_VERSION:
+        raise ValueError(
+            f"Plano na versão {header.get('version')}, esperado {PLAN_VERSION}: {path}"
+        )
+
+    def records():
+        with open(path) as f:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                record = json.loads(line)
+                if record.get("op") == "plan":
+                    continue
+                if record.get("op") != "add":
+                    raise ValueError(
+                        f"{path}:{number}: operação desconhecida {record.get('op')!r}"
+                    )
+                record["data"] = decode_value(record["data"])
+                record["attachments"] = [tuple(a) for a in record.get("attachments", ())]
+                yield record
+
+    return header, records()
@@ -0,0 +1,153 @@
+"""
+Chaves endereçadas por conteúdo e checagem de existência no R2
+
+A chave de um anexo é derivada do SHA-256 do conteúdo, então o mesmo
+comprovante (re-execuções, --force-all, transações que compartilham o recibo)
+resolve sempre para o mesmo objeto. Antes de enviar, `ObjectIndex` confere se
+a chave já existe — primeiro no cache em memória, depois com um HEAD — e o
+upload é pulado quando o objeto já está armazenado.
+
+Com um `inventory_prefix` (os comprovantes do usuário), a primeira consulta
+lista o prefixo inteiro com `list_objects_v2` (1 requisição a cada 1000
+objetos) e guarda chave -> tamanho/ETag. Daí em diante, as chaves do prefixo
+são respondidas pelo inventário, sem HEAD: o que não está nele não existe.
+Se a listagem falhar (ex.: token sem permissão de List), volta para o HEAD.
+"""
+
+import threading
+import time
+from pathlib import PurePosixPath
+
+LIST_PAGE_SIZE = 1000  # máximo do S3/R2 por página
+
+
+def attachments_prefix(path_prefix: str, user_id: str) -> str:
+    """Prefixo dos comprovantes de um usuário no bucket"""
+    base_path = f"{path_prefix}/comprovantes" if path_prefix else "comprovantes"
+    return f"{base_path}/{user_id}/"
+
+
+def content_key(path_prefix: str, user_id: str, sha256: str, filename: str) -> str:
+    """Chave do objeto a partir do hash do conteúdo (mantém a extensão)"""
+    ext = PurePosixPath(filename).suffix.lower()
+    safe_ext = "".join(c for c in ext if c.isalnum() or c == ".")
+    return f"{attachments_prefix(path_prefix, user_id)}{sha256}{safe_ext}"
+
+
+class ObjectIndex:
+    """Cache (thread-safe) das chaves que já existem no bucket
+
+    `s3_client` pode ser o cliente ou uma função que o devolve (criado só no
+    primeiro HEAD ou na listagem do inventário).
+    """
+
+    def __init__(
+        self,
+        s3_client,
+        bucket: str,
+        limiter=None,
+        metrics=None,
+        inventory_prefix: str | None = None,
+    ):
+        self.s3_client = s3_client
+        self.bucket = bucket
+        self.limiter = limiter
+        self.metrics = metrics
+        self.inventory_prefix = inventory_prefix
+        self.skipped_uploads = 0
+        self._known = {}  # chave -> {"size", "etag"}
+        self._inventory_loaded = False
+        self._lock = threading.Lock()
+        self._inventory_lock = threading.Lock()
+
+    def has_inventory(self, key: str) -> bool:
+        """True se a chave é respondida pelo inventário (sem HEAD)"""
+        return self.inventory_prefix is not None and key.startswith(self.inventory_prefix)
+
+    def exists(self, key: str, size: int | None = None) -> bool:
+        """Se a chave já está no bucket (com `size`, também confere o tamanho)"""
+        if self.has_inventory(key):
+            self.load_inventory()
+        with self._lock:
+            entry = self._known.get(key)
+        if entry is not None:
+            return size is None or entry["size"] is None or entry["size"] == size
+        if self.has_inventory(key):
+            return False
+
+        s3_client = self._client()
+        started = time.monotonic()
+        try:
+            if self.limiter:
+                head = self.limiter.call(s3_client.head_object, Bucket=self.bucket, Key=key)
+            else:
+                head = s3_client.head_object(Bucket=self.bucket, Key=key)
+        except Exception as e:
+            status = getattr(e, "response", {}).get("ResponseMetadata", {}).get(
+                "HTTPStatusCode"
+            )
+            if status == 404:
+                return False
+            raise
+        finally:
+            # 404 é a resposta esperada para objetos novos, não um erro
+            if self.metrics:
+                self.metrics.observe("r2_head", time.monotonic() - started, key=key)
+
+        self.add(key, head.get("ContentLength"), head.get("ETag"))
+        return size is None or head.get("ContentLength") in (None, size)
+
+    def add(self, key: str, size: int | None = None, etag: str | None = None):
+        with self._lock:
+            self._known[key] = {"size": size, "etag": etag}
+
+    def load_inventory(self) -> int | None:
+        """Lista o prefixo do inventário uma única vez; retorna quantos objetos"""
+        if self.inventory_prefix is None:
+            return None
+        with self._inventory_lock:
+            if self._inventory_loaded:
+                return None
+            try:
+                count, pages = self._list_prefix(self.inventory_prefix)
+            except Exception as e:
+                print(f"      ⚠️  Inventário do R2 indisponível ({e}), usando HEAD por objeto")
+                self.inventory_prefix = None
+                return None
+            self._inventory_loaded = True
+        if self.metrics:
+            self.metrics.incr("r2_inventory_objects", count)
+        print(f"   📦 Inventário do R2: {count} objetos já enviados ({pages} páginas)")
+        return count
+
+    def _list_prefix(self, prefix: str) -> tuple[int, int]:
+        s3_client = self._client()
+        kwargs = {"Bucket": self.bucket, "Prefix": prefix, "MaxKeys": LIST_PAGE_SIZE}
+        count = 0
+        pages = 0
+        while True:
+            started = time.monotonic()
+            try:
+                if self.limiter:
+                    page = self.limiter.call(s3_client.list_objects_v2, **kwargs)
+                else:
+                    page = s3_client.list_objects_v2(**kwargs)
+            finally:
+                if self.metrics:
+                    self.metrics.observe(
+                        "r2_list", time.monotonic() - started, prefix=prefix, page=pages
+                    )
+            pages += 1
+            for obj in page.get("Contents", ()):
+                self.add(obj["Key"], obj.get("Size"), obj.get("ETag"))
+                count += 1
+            if not page.get("IsTruncated"):
+                return count, pages
+            kwargs["ContinuationToken"] = page["NextContinuationToken"]
+
+    def _client(self):
+        return self.s3_client() if callable(self.s3_client) else self.s3_client
+
+    def mark_skipped(self):
+        with self._lock:
+            self.skipped_uploads += 1
@@ -0,0 +1,358 @@
+"""
+Cliente HTTP compartilhado para a API do Organizze
+
+Mantém uma única `requests.Session` com pool de conexões keep-alive (evita um
+handshake TCP+TLS por chamada), o header Basic já codificado, negociação de
+gzip e timeouts explícitos. Respostas 429/5xx e falhas de conexão são
+re-tentadas com backoff exponencial com jitter, respeitando o Retry-After.
+
+Períodos longos de /transactions são divididos em janelas (mês ou semana)
+buscadas em paralelo e consumidas uma a uma, sem duplicatas e sem manter o
+período inteiro em memória.
+
+Com um `ResponseCache`, as respostas JSON ficam em disco: dentro do TTL são
+reaproveitadas sem requisição; depois disso são revalidadas com
+If-None-Match/If-Modified-Since quando a API mandou ETag/Last-Modified.
+"""
+
+import hashlib
+import json
+import os
+import random
+import threading
+import time
+from base64 import b64encode
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from email.utils import parsedate_to_datetime
+from pathlib import Path
+
+import requests
+from requests.adapters import HTTPAdapter
+
+from metrics import timed
+
+ORGANIZZE_BASE_URL = "https://api.organizze.com.br/rest/v2"
+
+RETRY_STATUS = {429, 500, 502, 503, 504}
+DEFAULT_TIMEOUT = 30.0  # segundos (conexão e leitura)
+DEFAULT_MAX_RETRIES = 5
+MAX_BACKOFF = 60.0
+
+DEFAULT_CACHE_DIR = Path(__file__).parent / ".organizze_cache"
+DEFAULT_CACHE_TTL = 15 * 60  # segundos
+
+WINDOWS = ("month", "week")
+DEFAULT_WINDOW = "month"
+DEFAULT_FETCH_WORKERS = 4
+
+
+def is_s3_url(url: str) -> bool:
+    """URLs assinadas do S3 não aceitam Basic Auth"""
+    return "amazonaws.com" in url
+
+
+def parse_retry_after(value: str | None) -> float | None:
+    """Converte o header Retry-After (segundos ou data HTTP) em segundos"""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+        return max(0.0, retry_at.timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+def date_windows(start_date: str, end_date: str, window: str = DEFAULT_WINDOW) -> list:
+    """Divide [start_date, end_date] (YYYY-MM-DD, inclusivo) em janelas contíguas"""
+    start = date.fromisoformat(start_date[:10])
+    end = date.fromisoformat(end_date[:10])
+    windows = []
+
+    while start <= end:
+        if window == "week":
+            window_end = start + timedelta(days=6)
+        else:
+            next_month = (start.replace(day=1) + timedelta(days=32)).replace(day=1)
+            window_end = next_month - timedelta(days=1)
+        window_end = min(window_end, end)
+        windows.append((start.isoformat(), window_end.isoformat()))
+        start = window_end + timedelta(days=1)
+
+    return windows
+
+
+def window_endpoint(window_start: str, window_end: str) -> str:
+    """Endpoint de /transactions de uma janela"""
+    return f"/transactions?start_date={window_start}&end_date={window_end}"
+
+
+def transaction_endpoints(start_date: str, end_date: str, window: str = DEFAULT_WINDOW) -> list:
+    """Endpoints de /transactions, um por janela do período"""
+    return [window_endpoint(*w) for w in date_windows(start_date, end_date, window)]
+
+
+class TransactionDeduplicator:
+    """Descarta transações repetidas entre janelas sem guardar todos os ids
+
+    As janelas não se sobrepõem: cada transação pertence à janela que contém
+    a sua data. Uma transação que vem numa janela diferente da sua é
+    descartada se a data estiver no período (chega pela própria janela); só
+    as de fora do período todo têm o id lembrado, e são poucas.
+    """
+
+    def __init__(self, start_date: str, end_date: str):
+        self.start = start_date[:10]
+        self.end = end_date[:10]
+        self._outside = set()
+        self._lock = threading.Lock()
+
+    def keep(self, t: dict, window_start: str, window_end: str) -> bool:
+        day = str(t.get("date") or "")[:10]
+        if window_start <= day <= window_end:
+            return True
+        if day and self.start <= day <= self.end:
+            return False
+        tx_id = t.get("id")
+        if tx_id is None:
+            return True
+        with self._lock:
+            if tx_id in self._outside:
+                return False
+            self._outside.add(tx_id)
+            return True
+
+    def filter(self, transactions: list, window_start: str, window_end: str) -> list:
+        return [t for t in transactions if self.keep(t, window_start, window_end)]
+
+
+class ResponseCache:
+    """Cache em disco das respostas JSON, uma entrada por URL"""
+
+    def __init__(
+        self,
+        directory: str | Path = DEFAULT_CACHE_DIR,
+        ttl: float = DEFAULT_CACHE_TTL,
+        refresh: bool = False,
+    ):
+        self.directory = Path(directory)
+        self.ttl = ttl
+        self.refresh = refresh  # ignora o TTL (ainda revalida por ETag)
+        self.hits = 0
+        self.revalidated = 0
+        self.directory.mkdir(parents=True, exist_ok=True)
+
+    def _path(self, scope: str, url: str) -> Path:
+        digest = hashlib.sha256(f"{scope}\n{url}".encode()).hexdigest()
+        return self.directory / f"{digest}.json"
+
+    def load(self, scope: str, url: str) -> dict | None:
+        try:
+            return json.loads(self._path(scope, url).read_text())
+        except (OSError, ValueError):
+            return None
+
+    def is_fresh(self, entry: dict) -> bool:
+        return not self.refresh and time.time() - entry["fetched_at"] < self.ttl
+
+    def store(self, scope: str, url: str, body, etag: str | None, last_modified: str | None):
+        entry = {
+            "url": url,
+            "fetched_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+        }
+        path = self._path(scope, url)
+        tmp_path = path.with_suffix(f".{threading.get_ident()}.tmp")
+        tmp_path.write_text(json.dumps(entry))
+        os.replace(tmp_path, path)
+
+
+class OrganizzeClient:
+    """Sessão HTTP reutilizável com retry para a API e os anexos do Organizze"""
+
+    def __init__(
+        self,
+        email: str,
+        api_key: str,
+        user_agent: str,
+        base_url: str = ORGANIZZE_BASE_URL,
+        timeout: float = DEFAULT_TIMEOUT,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        pool_size: int = 16,
+    ):
+        self.base_url = base_url
+        self.timeout = timeout
+        self.max_retries = max_retries
+        self._auth_header = "Basic " + b64encode(f"{email}:{api_key}".encode()).decode()
+        self._lock = threading.Lock()
+        self._cache_scope = email or ""  # uma conta não vê o cache de outra
+        self.cache = None  # ResponseCache opcional
+        self.limiter = None  # AdaptiveRateLimiter opcional (chamadas à API)
+        # Anexos fora da API (URLs assinadas do S3): limitador próprio, para
+        # downloads grandes não gastarem a cota nem frearem a API
+        self.download_limiter = None
+        self.metrics = None  # Metrics opcional (latência de cada busca)
+
+        self.session = requests.Session()
+        adapter = HTTPAdapter(pool_connections=pool_size, pool_maxsize=pool_size)
+        self.session.mount("https://", adapter)
+        self.session.mount("http://", adapter)
+        self.session.headers.update(
+            {
+                "User-Agent": user_agent,
+                "Accept-Encoding": "gzip, deflate",
+            }
+        )
+        self.retries = 0  # total de novas tentativas (para o resumo)
+
+    def get_json(self, endpoint: str):
+        """GET autenticado em um endpoint da API (ex.: "/accounts")"""
+        with timed(self.metrics, "organizze_fetch", endpoint=endpoint):
+            return self._get_json(endpoint)
+
+    def _get_json(self, endpoint: str):
+        url = f"{self.base_url}{endpoint}"
+        headers = {"Content-Type": "application/json"}
+        if not self.cache:
+            return self.get(url, headers=headers).json()
+
+        entry = self.cache.load(self._cache_scope, url)
+        if entry:
+            if self.cache.is_fresh(entry):
+                self.cache.hits += 1
+                return entry["body"]
+            if entry.get("etag"):
+                headers["If-None-Match"] = entry["etag"]
+            if entry.get("last_modified"):
+                headers["If-Modified-Since"] = entry["last_modified"]
+
+        response = self.get(url, headers=headers)
+        etag = response.headers.get("ETag")
+        last_modified = response.headers.get("Last-Modified")
+        if response.status_code == 304 and entry:
+            self.cache.revalidated += 1
+            body = entry["body"]
+            etag = etag or entry.get("etag")
+            last_modified = last_modified or entry.get("last_modified")
+        else:
+            body = response.json()
+
+        self.cache.store(self._cache_scope, url, body, etag, last_modified)
+        return body
+
+    def fetch_parallel(self, endpoints: list, workers: int = DEFAULT_FETCH_WORKERS) -> list:
+        """Busca vários endpoints em paralelo, devolvendo na mesma ordem"""
+        if len(endpoints) <= 1 or workers <= 1:
+            return [self.get_json(endpoint) for endpoint in endpoints]
+        with ThreadPoolExecutor(
+            max_workers=min(workers, len(endpoints)), thread_name_prefix="organizze"
+        ) as executor:
+            return list(executor.map(self.get_json, endpoints))
+
+    def iter_transactions(
+        self,
+        start_date: str,
+        end_date: str,
+        window: str = DEFAULT_WINDOW,
+        workers: int = DEFAULT_FETCH_WORKERS,
+    ):
+        """Gera as transações do período janela a janela, em ordem
+
+        Até `workers` janelas são buscadas em paralelo à frente do consumo;
+        as demais só são pedidas quando uma delas é consumida, então a
+        memória não cresce com o tamanho do período.
+        """
+        dedup = TransactionDeduplicator(start_date, end_date)
+        windows = iter(date_windows(start_date, end_date, window))
+        workers = max(1, workers)
+        with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="organizze") as executor:
+            pending = deque()
+
+            def submit_next():
+                w = next(windows, None)
+                if w is not None:
+                    pending.append((w, executor.submit(self.get_json, window_endpoint(*w))))
+
+            for _ in range(workers):
+                submit_next()
+            while pending:
+                (window_start, window_end), future = pending.popleft()
+                page = future.result()
+                submit_next()
+                yield from dedup.filter(page, window_start, window_end)
+
+    def fetch_transactions(
+        self,
+        start_date: str,
+        end_date: str,
+        window: str = DEFAULT_WINDOW,
+        workers: int = DEFAULT_FETCH_WORKERS,
+    ) -> list:
+        """Busca /transactions do período em janelas paralelas"""
+        return list(self.iter_transactions(start_date, end_date, window, workers))
+
+    def download(self, url: str, stream: bool = False) -> requests.Response:
+        """GET de um anexo; URLs do S3 vão sem autenticação"""
+        return self.get(url, auth=not is_s3_url(url), stream=stream)
+
+    def get(
+        self,
+        url: str,
+        auth: bool = True,
+        headers: dict | None = None,
+        stream: bool = False,
+    ) -> requests.Response:
+        """GET com retry; levanta HTTPError se a resposta final não for 2xx"""
+        request_headers = dict(headers or {})
+        if auth:
+            request_headers["Authorization"] = self._auth_header
+
+        limiter = self.limiter if url.startswith(self.base_url) else self.download_limiter
+        attempt = 0
+        while True:
+            if limiter:
+                limiter.acquire()
+            started = time.monotonic()
+            try:
+                response = self.session.get(
+                    url, headers=request_headers, timeout=self.timeout, stream=stream
+                )
+            except (requests.ConnectionError, requests.Timeout):
+                if attempt >= self.max_retries:
+                    raise
+                self._sleep_before_retry(attempt, None)
+                attempt += 1
+                continue
+
+            if limiter:
+                if response.status_code in (429, 503):
+                    limiter.on_throttle()
+                else:
+                    limiter.on_success(time.monotonic() - started)
+
+            if response.status_code in RETRY_STATUS and attempt < self.max_retries:
+                retry_after = parse_retry_after(response.headers.get("Retry-After"))
+                response.close()
+                self._sleep_before_retry(attempt, retry_after)
+                attempt += 1
+                continue
+
+            response.raise_for_status()
+            return response
+
+    def _sleep_before_retry(self, attempt: int, retry_after: float | None):
+        with self._lock:
+            self.retries += 1
+        if retry_after is not None:
+            delay = min(retry_after, MAX_BACKOFF)
+        else:
+            # Backoff exponencial com "full jitter"
+            delay = random.uniform(0, min(MAX_BACKOFF, 2**attempt))
+        time.sleep(delay)
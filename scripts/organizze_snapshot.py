@@ -0,0 +1,336 @@
+"""
+Snapshot colunar (Parquet) dos dados do Organizze
+
+`write_snapshot` baixa contas, categorias, cartões e as transações de um
+período e grava tudo em Parquet comprimido (zstd), com colunas tipadas
+(`amount_cents` int64, `date` date32, ids int64) e as transações particionadas
+por mês (`transactions/month=YYYY-MM/`). Cada linha guarda também o JSON
+original (`raw`), de onde a migração reconstrói a transação exatamente como
+a API devolveu.
+
+`OrganizzeSnapshot` lê o snapshot com a mesma interface de leitura do
+`OrganizzeClient` (`get_json`, `fetch_parallel`, `iter_transactions`), então
+`migrate()` e `resync()` podem usá-lo no lugar da API. Filtros por período
+pulam as partições fora da janela, e `summary()` calcula os totais e as
+contagens por data com operações vetorizadas nas colunas, sem montar os
+dicionários das transações.
+
+Os anexos não fazem parte do snapshot: continuam sendo baixados das URLs do
+Organizze, que podem expirar.
+
+Requer `pyarrow` (importado só quando um snapshot é usado).
+"""
+
+import json
+import shutil
+import sys
+from datetime import date, datetime
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from organizze_client import DEFAULT_FETCH_WORKERS, DEFAULT_WINDOW
+
+SNAPSHOT_VERSION = 1
+MANIFEST_NAME = "manifest.json"
+TRANSACTIONS_DIR = "transactions"
+
+# Transações por arquivo Parquet (limita a memória usada na gravação)
+DEFAULT_ROWS_PER_FILE = 100_000
+
+# Colunas tipadas de cada tabela (além de `raw`, o JSON original)
+ACCOUNT_COLUMNS = (("id", "int64"), ("name", "string"), ("type", "string"), ("archived", "bool_"))
+CATEGORY_COLUMNS = (("id", "int64"), ("name", "string"), ("parent_id", "int64"))
+CARD_COLUMNS = (
+    ("id", "int64"),
+    ("name", "string"),
+    ("card_network", "string"),
+    ("limit_cents", "int64"),
+    ("archived", "bool_"),
+)
+TRANSACTION_COLUMNS = (
+    ("id", "int64"),
+    ("description", "string"),
+    ("amount_cents", "int64"),
+    ("paid", "bool_"),
+    ("account_id", "int64"),
+    ("category_id", "int64"),
+    ("credit_card_id", "int64"),
+)
+
+TABLES = {
+    "/accounts": ("accounts.parquet", ACCOUNT_COLUMNS),
+    "/categories": ("categories.parquet", CATEGORY_COLUMNS),
+    "/credit_cards": ("credit_cards.parquet", CARD_COLUMNS),
+}
+
+
+def _pyarrow():
+    try:
+        import pyarrow as pa
+        import pyarrow.compute as pc
+        import pyarrow.dataset as ds
+        import pyarrow.parquet as pq
+    except ImportError:
+        print("❌ Snapshots precisam do pyarrow: pip install pyarrow")
+        sys.exit(1)
+    return pa, pc, ds, pq
+
+
+def _parse_day(value) -> date | None:
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except (TypeError, ValueError):
+        return None
+
+
+def _schema(columns: tuple, extra: tuple = ()):
+    pa = _pyarrow()[0]
+    fields = [(name, getattr(pa, type_name)()) for name, type_name in columns]
+    return pa.schema(fields + [(name, getattr(pa, type_name)()) for name, type_name in extra])
+
+
+def transaction_schema(with_month: bool = True):
+    """Esquema das transações (`month` é a coluna de partição)"""
+    extra = (("date", "date32"), ("attachments", "int32"), ("raw", "string"))
+    if with_month:
+        extra += (("month", "string"),)
+    return _schema(TRANSACTION_COLUMNS, extra)
+
+
+def _table(rows: list, columns: tuple):
+    pa = _pyarrow()[0]
+    schema = _schema(columns, (("raw", "string"),))
+    data = {name: [row.get(name) for row in rows] for name, _ in columns}
+    data["raw"] = [json.dumps(row, ensure_ascii=False) for row in rows]
+    return pa.Table.from_pydict(data, schema=schema)
+
+
+def _transaction_table(rows: list):
+    pa = _pyarrow()[0]
+    data = {name: [t.get(name) for t in rows] for name, _ in TRANSACTION_COLUMNS}
+    data["date"] = [_parse_day(t.get("date")) for t in rows]
+    data["attachments"] = [len(t.get("attachments") or ()) for t in rows]
+    data["raw"] = [json.dumps(t, ensure_ascii=False) for t in rows]
+    data["month"] = [day.strftime("%Y-%m") if day else None for day in data["date"]]
+    return pa.Table.from_pydict(data, schema=transaction_schema())
+
+
+def _month_partitioning():
+    pa, _, ds, _ = _pyarrow()
+    return ds.partitioning(pa.schema([("month", pa.string())]), flavor="hive")
+
+
+def write_snapshot(
+    organizze,
+    directory: str | Path,
+    start_date: str,
+    end_date: str,
+    window: str = DEFAULT_WINDOW,
+    workers: int = DEFAULT_FETCH_WORKERS,
+    rows_per_file: int = DEFAULT_ROWS_PER_FILE,
+) -> "OrganizzeSnapshot":
+    """Baixa os dados do período e grava o snapshot em `directory`
+
+    O snapshot é montado num diretório temporário e só substitui o anterior
+    quando está completo.
+    """
+    _, _, ds, pq = _pyarrow()
+    directory = Path(directory)
+    tmp_dir = directory.with_name(directory.name + ".tmp")
+    shutil.rmtree(tmp_dir, ignore_errors=True)
+    (tmp_dir / TRANSACTIONS_DIR).mkdir(parents=True)
+
+    counts = {}
+    endpoints = list(TABLES)
+    for endpoint, rows in zip(endpoints, organizze.fetch_parallel(endpoints, workers=workers)):
+        file_name, columns = TABLES[endpoint]
+        pq.write_table(_table(rows, columns), tmp_dir / file_name, compression="zstd")
+        counts[endpoint.strip("/")] = len(rows)
+
+    write_options = ds.ParquetFileFormat().make_write_options(compression="zstd")
+    buffer = []
+    files = 0
+    total = 0
+
+    def flush():
+        nonlocal buffer, files
+        if not buffer:
+            return
+        ds.write_dataset(
+            _transaction_table(buffer),
+            tmp_dir / TRANSACTIONS_DIR,
+            format="parquet",
+            partitioning=_month_partitioning(),
+            basename_template=f"part-{files:05d}-{{i}}.parquet",
+            existing_data_behavior="overwrite_or_ignore",
+            file_options=write_options,
+        )
+        files += 1
+        buffer = []
+
+    for t in organizze.iter_transactions(start_date, end_date, window=window, workers=workers):
+        buffer.append(t)
+        total += 1
+        if len(buffer) >= rows_per_file:
+            flush()
+    flush()
+    counts["transactions"] = total
+
+    manifest = {
+        "version": SNAPSHOT_VERSION,
+        "start_date": start_date,
+        "end_date": end_date,
+        "createdAt": datetime.now().isoformat(timespec="seconds"),
+        "counts": counts,
+    }
+    (tmp_dir / MANIFEST_NAME).write_text(json.dumps(manifest, indent=2))
+
+    shutil.rmtree(directory, ignore_errors=True)
+    tmp_dir.rename(directory)
+    return OrganizzeSnapshot(directory)
+
+
+class OrganizzeSnapshot:
+    """Leitura de um snapshot com a interface de leitura do OrganizzeClient"""
+
+    def __init__(self, directory: str | Path):
+        self.directory = Path(directory)
+        manifest_path = self.directory / MANIFEST_NAME
+        if not manifest_path.exists():
+            raise FileNotFoundError(f"Snapshot não encontrado: {self.directory}")
+        self.manifest = json.loads(manifest_path.read_text())
+        if self.manifest.get("version") != SNAPSHOT_VERSION:
+            raise ValueError(
+                f"Snapshot na versão {self.manifest.get('version')}, "
+                f"esperado {SNAPSHOT_VERSION}: {self.directory}"
+            )
+        self.start_date = self.manifest["start_date"]
+        self.end_date = self.manifest["end_date"]
+        # Atributos do OrganizzeClient consultados pelos scripts
+        self.cache = None
+        self.retries = 0
+
+    def covers(self, start_date: str, end_date: str) -> bool:
+        return self.start_date <= start_date[:10] and end_date[:10] <= self.end_date
+
+    def get_json(self, endpoint: str):
+        """Resposta equivalente à da API para os endpoints do snapshot"""
+        if endpoint in TABLES:
+            return self._rows(self._read_table(endpoint)["raw"])
+        parts = urlsplit(endpoint)
+        query = parse_qs(parts.query)
+        if parts.path == "/transactions" and "start_date" in query and "end_date" in query:
+            table = self.transactions(query["start_date"][0], query["end_date"][0], ["raw"])
+            return self._rows(table["raw"])
+        raise ValueError(f"{endpoint} não faz parte do snapshot {self.directory}")
+
+    def fetch_parallel(self, endpoints: list, workers: int = DEFAULT_FETCH_WORKERS) -> list:
+        return [self.get_json(endpoint) for endpoint in endpoints]
+
+    def iter_transactions(
+        self,
+        start_date: str,
+        end_date: str,
+        window: str = DEFAULT_WINDOW,
+        workers: int = DEFAULT_FETCH_WORKERS,
+    ):
+        """Gera as transações do período, um lote de linhas por vez"""
+        dataset = self._dataset()
+        for batch in dataset.to_batches(
+            columns=["raw"], filter=self._period_filter(start_date, end_date)
+        ):
+            yield from self._rows(batch.column("raw"))
+
+    def fetch_transactions(
+        self,
+        start_date: str,
+        end_date: str,
+        window: str = DEFAULT_WINDOW,
+        workers: int = DEFAULT_FETCH_WORKERS,
+    ) -> list:
+        return list(self.iter_transactions(start_date, end_date, window, workers))
+
+    def transactions(self, start_date: str | None = None, end_date: str | None = None, columns=None):
+        """Tabela Arrow das transações do período (todas se sem datas)"""
+        return self._dataset().to_table(
+            columns=columns, filter=self._period_filter(start_date, end_date)
+        )
+
+    def summary(self, start_date: str | None = None, end_date: str | None = None) -> dict:
+        """Totais do período calculados direto nas colunas"""
+        _, pc, _, _ = _pyarrow()
+        accounts = self._read_table("/accounts")
+        cards = self._read_table("/credit_cards")
+        table = self.transactions(
+            start_date,
+            end_date,
+            ["date", "month", "amount_cents", "credit_card_id", "attachments"],
+        )
+
+        is_card = pc.is_valid(table["credit_card_id"])
+        amount = pc.fill_null(table["amount_cents"], 0)
+        # Como no transaction_doc: cartão é sempre despesa
+        income = pc.if_else(pc.and_(pc.invert(is_card), pc.greater(amount, 0)), amount, 0)
+        expense = pc.if_else(pc.or_(is_card, pc.less(amount, 0)), pc.abs(amount), 0)
+        dates = pc.min_max(table["date"])
+        card_transactions = pc.sum(is_card).as_py() or 0
+
+        def per(column: str) -> dict:
+            counts = table.group_by(column).aggregate([([], "count_all")]).sort_by(column)
+            return {
+                str(key): count
+                for key, count in zip(
+                    counts[column].to_pylist(), counts["count_all"].to_pylist()
+                )
+            }
+
+        return {
+            "accounts": self._active(accounts),
+            "cards": self._active(cards),
+            "transactions": table.num_rows - card_transactions,
+            "card_transactions": card_transactions,
+            "attachments": pc.sum(table["attachments"]).as_py() or 0,
+            "income_cents": pc.sum(income).as_py() or 0,
+            "expense_cents": pc.sum(expense).as_py() or 0,
+            "first_date": dates["min"].as_py(),
+            "last_date": dates["max"].as_py(),
+            "per_month": per("month"),
+            "per_date": per("date"),
+        }
+
+    def _read_table(self, endpoint: str):
+        pq = _pyarrow()[3]
+        return pq.read_table(self.directory / TABLES[endpoint][0])
+
+    def _dataset(self):
+        ds = _pyarrow()[2]
+        return ds.dataset(
+            self.directory / TRANSACTIONS_DIR,
+            format="parquet",
+            schema=transaction_schema(),
+            partitioning=_month_partitioning(),
+        )
+
+    def _period_filter(self, start_date: str | None, end_date: str | None):
+        pa, _, ds, _ = _pyarrow()
+        conditions = []
+        if start_date:
+            # `month` poda as partições; `date` filtra dentro delas
+            conditions.append(ds.field("month") >= start_date[:7])
+            conditions.append(ds.field("date") >= pa.scalar(_parse_day(start_date), pa.date32()))
+        if end_date:
+            conditions.append(ds.field("month") <= end_date[:7])
+            conditions.append(ds.field("date") <= pa.scalar(_parse_day(end_date), pa.date32()))
+        expression = None
+        for condition in conditions:
+            expression = condition if expression is None else expression & condition
+        return expression
+
+    @staticmethod
+    def _active(table) -> int:
+        pc = _pyarrow()[1]
+        return pc.sum(pc.invert(pc.fill_null(table["archived"], False))).as_py() or 0
+
+    @staticmethod
+    def _rows(column) -> list:
+        return [json.loads(raw) for raw in column.to_pylist()]
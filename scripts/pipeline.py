@@ -0,0 +1,163 @@
+"""
+Pipeline em estágios com filas limitadas (backpressure)
+
+Cada `Stage` tem sua própria fila de entrada (com tamanho máximo) e seu número
+de workers. Um estágio consome itens da fila, aplica `fn(item)` e repassa os
+itens que ela gerar (zero, um ou vários) para a fila do estágio seguinte.
+Quando uma fila enche, quem a alimenta bloqueia: o estágio mais lento dita o
+ritmo e a memória fica limitada ao tamanho das filas.
+
+Durante a execução, a profundidade de cada fila é mostrada periodicamente
+(junto com throughput/ETA, se houver um `Progress`); a fila cheia logo antes
+do estágio mais lento aponta o gargalo.
+"""
+
+import queue
+import threading
+import time
+
+DEFAULT_QUEUE_SIZE = 200
+DEFAULT_REPORT_INTERVAL = 10.0
+
+_DONE = object()
+
+
+class Counters:
+    """Contadores compartilhados entre threads"""
+
+    def __init__(self):
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def incr(self, key: str, n: int = 1):
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + n
+
+    def __getitem__(self, key: str) -> int:
+        with self._lock:
+            return self._values.get(key, 0)
+
+
+class Stage:
+    """Um estágio do pipeline: `fn(item)` devolve um iterável de saídas"""
+
+    def __init__(self, name: str, fn, workers: int = 1, queue_size: int = DEFAULT_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.workers = max(1, workers)
+        self.input = queue.Queue(maxsize=max(1, queue_size))
+        self.processed = 0
+        self.errors = 0
+        self.busy = 0.0  # segundos em `fn`, somados entre os workers
+        self._active = self.workers
+        self._lock = threading.Lock()
+
+    def depth(self) -> str:
+        return f"{self.input.qsize()}/{self.input.maxsize}"
+
+    @property
+    def finished(self) -> bool:
+        return self._active == 0
+
+
+class Pipeline:
+    """Liga os estágios em sequência e executa até esgotar a fonte"""
+
+    def __init__(
+        self, stages: list, report_interval: float = DEFAULT_REPORT_INTERVAL, progress=None
+    ):
+        self.stages = stages
+        self.report_interval = report_interval
+        self.progress = progress  # metrics.Progress opcional
+        self.elapsed = 0.0
+
+    def run(self, source):
+        """Alimenta o primeiro estágio com `source` e espera todos terminarem"""
+        threads = [
+            threading.Thread(target=self._feed, args=(source,), name="pipeline-source", daemon=True)
+        ]
+        for index, stage in enumerate(self.stages):
+            next_stage = self.stages[index + 1] if index + 1 < len(self.stages) else None
+            for n in range(stage.workers):
+                threads.append(
+                    threading.Thread(
+                        target=self._work,
+                        args=(stage, next_stage),
+                        name=f"pipeline-{stage.name}-{n}",
+                        daemon=True,
+                    )
+                )
+
+        started = time.monotonic()
+        for thread in threads:
+            thread.start()
+
+        last_report = started
+        for thread in threads:
+            while thread.is_alive():
+                thread.join(timeout=0.5)
+                if time.monotonic() - last_report >= self.report_interval:
+                    self.print_depths()
+                    last_report = time.monotonic()
+
+        self.elapsed = time.monotonic() - started
+
+    def print_depths(self):
+        depths = " | ".join(
+            f"{stage.name} {stage.depth()} ({stage.processed} ok)" for stage in self.stages
+        )
+        if self.progress:
+            print(f"      {self.progress.line()}")
+        print(f"      ⏳ filas: {depths}")
+
+    def print_stats(self):
+        print("   ⚙️  Estágios (itens | erros | ocupação média dos workers):")
+        for stage in self.stages:
+            utilization = stage.busy / (stage.workers * self.elapsed) if self.elapsed else 0
+            print(
+                f"      {stage.name:<14} {stage.processed:>7} | {stage.errors:>4} | "
+                f"{utilization:>5.0%} de {stage.workers} worker(s)"
+            )
+
+    def _feed(self, source):
+        first = self.stages[0]
+        try:
+            for item in source:
+                first.input.put(item)
+        finally:
+            for _ in range(first.workers):
+                first.input.put(_DONE)
+
+    def _work(self, stage: Stage, next_stage: Stage | None):
+        while True:
+            item = stage.input.get()
+            if item is _DONE:
+                break
+
+            started = time.monotonic()
+            blocked = 0.0  # tempo esperando vaga na fila seguinte
+            try:
+                outputs = stage.fn(item)
+                if outputs is not None:
+                    for output in outputs:
+                        if next_stage is not None:
+                            put_started = time.monotonic()
+                            next_stage.input.put(output)
+                            blocked += time.monotonic() - put_started
+                with stage._lock:
+                    stage.processed += 1
+            except Exception as e:
+                with stage._lock:
+                    stage.errors += 1
+                print(f"      ⚠️  Erro no estágio {stage.name}: {e}")
+            finally:
+                with stage._lock:
+                    stage.busy += time.monotonic() - started - blocked
+
+        # O último worker a sair encerra o estágio seguinte
+        with stage._lock:
+            stage._active -= 1
+            last = stage._active == 0
+        if last and next_stage is not None:
+            for _ in range(next_stage.workers):
+                next_stage.input.put(_DONE)
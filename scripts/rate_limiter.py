@@ -0,0 +1,204 @@
+"""
+Limitador de taxa adaptativo (token bucket + AIMD) por serviço externo
+
+Cada serviço (API do Organizze, downloads de anexos, R2, Firestore) tem o
+seu limitador. A taxa começa no teto configurado e só cai quando o serviço
+reclama: a cada 429/503 (ou equivalente) ela é multiplicada por `decrease`;
+latências acima do alvo do serviço (`--organizze-latency-target` etc.) reduzem
+um pouco menos, antes que o serviço comece a recusar. Sem reclamações, a taxa
+volta a subir aos poucos (aumento aditivo de cerca de `increase` req/s a cada
+segundo) até o teto.
+"""
+
+import threading
+import time
+
+THROTTLE_STATUS = {429, 503}
+THROTTLE_NAMES = {
+    "ResourceExhausted",
+    "ServiceUnavailable",
+    "TooManyRequests",
+    "SlowDown",
+    "Throttling",
+    "RequestLimitExceeded",
+}
+
+DEFAULT_ORGANIZZE_RPS = 10.0
+DEFAULT_R2_RPS = 50.0
+DEFAULT_FIRESTORE_RPS = 20.0
+DEFAULT_ATTACHMENTS_RPS = 50.0  # downloads das URLs assinadas do S3
+
+# Latência (s) acima da qual a chamada conta como sinal de congestionamento.
+# No R2 inclui o upload inteiro: folgado para anexos de vários MB.
+DEFAULT_ORGANIZZE_LATENCY_TARGET = 5.0
+DEFAULT_R2_LATENCY_TARGET = 15.0
+DEFAULT_FIRESTORE_LATENCY_TARGET = 2.0
+
+
+def is_throttle_error(exc: Exception) -> bool:
+    """Identifica erros de "vá mais devagar" dos clientes HTTP/boto3/Firestore"""
+    if type(exc).__name__ in THROTTLE_NAMES:
+        return True
+    if getattr(exc, "code", None) in THROTTLE_STATUS:
+        return True
+
+    response = getattr(exc, "response", None)
+    if isinstance(response, dict):  # botocore ClientError
+        error_code = response.get("Error", {}).get("Code", "")
+        status = response.get("ResponseMetadata", {}).get("HTTPStatusCode")
+        return error_code in THROTTLE_NAMES or status in THROTTLE_STATUS
+    return getattr(response, "status_code", None) in THROTTLE_STATUS
+
+
+class AdaptiveRateLimiter:
+    """Token bucket cuja taxa se ajusta por AIMD"""
+
+    def __init__(
+        self,
+        name: str,
+        max_rate: float,
+        min_rate: float = 0.5,
+        increase: float = 1.0,
+        decrease: float = 0.5,
+        latency_target: float | None = None,
+    ):
+        self.name = name
+        self.max_rate = max_rate
+        self.min_rate = min(min_rate, max_rate)
+        self.rate = max_rate
+        self.increase = increase
+        self.decrease = decrease
+        self.latency_target = latency_target
+        self.throttled = 0
+        self._tokens = 1.0
+        self._updated = time.monotonic()
+        self._last_decrease = 0.0
+        self._lock = threading.Lock()
+
+    def set_max_rate(self, max_rate: float):
+        with self._lock:
+            self.max_rate = max_rate
+            self.min_rate = min(self.min_rate, max_rate)
+            self.rate = max_rate
+
+    def acquire(self):
+        """Bloqueia até haver um token disponível"""
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                burst = max(1.0, self.rate)
+                self._tokens = min(burst, self._tokens + (now - self._updated) * self.rate)
+                self._updated = now
+                if self._tokens >= 1:
+                    self._tokens -= 1
+                    return
+                wait = (1 - self._tokens) / self.rate
+            time.sleep(wait)
+
+    def on_success(self, latency: float | None = None):
+        with self._lock:
+            if (
+                self.latency_target is not None
+                and latency is not None
+                and latency > self.latency_target
+            ):
+                self._decrease(0.9)
+                return
+            # Aumento aditivo: ~`increase` req/s por segundo de sucesso
+            self.rate = min(self.max_rate, self.rate + self.increase / self.rate)
+
+    def on_throttle(self):
+        with self._lock:
+            self.throttled += 1
+            self._decrease(self.decrease)
+
+    def call(self, fn, *args, **kwargs):
+        """Executa `fn` respeitando a taxa e ajustando-a pelo resultado"""
+        self.acquire()
+        started = time.monotonic()
+        try:
+            result = fn(*args, **kwargs)
+        except Exception as e:
+            if is_throttle_error(e):
+                self.on_throttle()
+            raise
+        self.on_success(time.monotonic() - started)
+        return result
+
+    def _decrease(self, factor: float):
+        # Uma redução por "rodada": várias respostas 429 da mesma rajada
+        # contam como um único sinal de congestionamento
+        now = time.monotonic()
+        if now - self._last_decrease < 1 / self.rate:
+            return
+        self._last_decrease = now
+        self.rate = max(self.min_rate, self.rate * factor)
+
+
+def make_limiters(
+    organizze_rps: float = DEFAULT_ORGANIZZE_RPS,
+    r2_rps: float = DEFAULT_R2_RPS,
+    firestore_rps: float = DEFAULT_FIRESTORE_RPS,
+    attachments_rps: float = DEFAULT_ATTACHMENTS_RPS,
+) -> dict:
+    """Um limitador por serviço externo"""
+    return {
+        "organizze": AdaptiveRateLimiter(
+            "organizze", organizze_rps, latency_target=DEFAULT_ORGANIZZE_LATENCY_TARGET
+        ),
+        # Sem alvo de latência: o tempo de um download depende do tamanho
+        "attachments": AdaptiveRateLimiter("attachments", attachments_rps),
+        "r2": AdaptiveRateLimiter("r2", r2_rps, latency_target=DEFAULT_R2_LATENCY_TARGET),
+        "firestore": AdaptiveRateLimiter(
+            "firestore", firestore_rps, latency_target=DEFAULT_FIRESTORE_LATENCY_TARGET
+        ),
+    }
+
+
+def add_rate_limit_arguments(parser):
+    """Opções de linha de comando para os tetos de cada limitador"""
+    parser.add_argument(
+        "--organizze-rps",
+        type=float,
+        default=DEFAULT_ORGANIZZE_RPS,
+        help="Máximo de requisições/s ao Organizze (reduz sozinho em 429/503)",
+    )
+    parser.add_argument(
+        "--attachments-rps",
+        type=float,
+        default=DEFAULT_ATTACHMENTS_RPS,
+        help="Máximo de downloads/s de anexos fora da API (URLs assinadas do S3)",
+    )
+    parser.add_argument(
+        "--r2-rps",
+        type=float,
+        default=DEFAULT_R2_RPS,
+        help="Máximo de operações/s no R2 (reduz sozinho em SlowDown/503)",
+    )
+    parser.add_argument(
+        "--firestore-rps",
+        type=float,
+        default=DEFAULT_FIRESTORE_RPS,
+        help="Máximo de commits/updates por segundo no Firestore",
+    )
+    for service, label, default in (
+        ("organizze", "Organizze", DEFAULT_ORGANIZZE_LATENCY_TARGET),
+        ("r2", "R2", DEFAULT_R2_LATENCY_TARGET),
+        ("firestore", "Firestore", DEFAULT_FIRESTORE_LATENCY_TARGET),
+    ):
+        parser.add_argument(
+            f"--{service}-latency-target",
+            type=float,
+            default=default,
+            help=f"Segundos por chamada ao {label} acima dos quais a taxa cai (0 = desligado)",
+        )
+
+
+def configure_limiters(limiters: dict, args):
+    limiters["organizze"].set_max_rate(max(0.1, args.organizze_rps))
+    limiters["attachments"].set_max_rate(max(0.1, args.attachments_rps))
+    limiters["r2"].set_max_rate(max(0.1, args.r2_rps))
+    limiters["firestore"].set_max_rate(max(0.1, args.firestore_rps))
+    limiters["organizze"].latency_target = args.organizze_latency_target or None
+    limiters["r2"].latency_target = args.r2_latency_target or None
+    limiters["firestore"].latency_target = args.firestore_latency_target or None
@@ -10,93 +10,114 @@ Este script:
 
 Requisitos:
     pip install firebase-admin requests boto3 python-dotenv
+    pip install Pillow  # opcional, para --optimize-images
 
 Uso:
     python resync_attachments.py
     python resync_attachments.py --dry-run
     python resync_attachments.py --add-new  # também adiciona anexos que faltam
+    python resync_attachments.py --attachment-workers 8  # transferências em paralelo
+    python resync_attachments.py --optimize-images  # comprovantes em WebP + miniaturas
+    python resync_attachments.py --from-snapshot snap/  # transações de um snapshot Parquet
+    python resync_attachments.py --profile --trace resync.json  # cProfile + spans das chamadas
 """
 
 import argparse
-import json
+import io
 import os
 import sys
-import time
-from base64 import b64encode
-from datetime import datetime
+from concurrent.futures import as_completed
+from datetime import date, datetime, timedelta
 from pathlib import Path
+from tempfile import SpooledTemporaryFile
 
-import requests
 from dotenv import load_dotenv
 
 project_root = Path(__file__).parent.parent
 load_dotenv(project_root / ".env")
 
-import boto3
-import firebase_admin
-from firebase_admin import credentials, firestore
+from attachment_pool import (
+    DEFAULT_MAX_INFLIGHT_BYTES,
+    DEFAULT_SPOOL_THRESHOLD,
+    DEFAULT_WORKERS,
+    AttachmentPool,
+    body_sha256,
+    body_size,
+    read_limited,
+)
+import clients
+from image_optimizer import add_image_arguments, make_image_optimizer, thumbnail_key
+from firestore_batch import MAX_BATCH_SIZE, BatchWriter
+from firestore_reads import DEFAULT_PAGE_SIZE, stream_paged
+from metrics import (
+    DEFAULT_PROGRESS_INTERVAL,
+    Metrics,
+    Progress,
+    add_metrics_arguments,
+    write_reports,
+)
+from object_store import ObjectIndex, attachments_prefix, content_key
+from organizze_snapshot import OrganizzeSnapshot
+from rate_limiter import add_rate_limit_arguments, configure_limiters, make_limiters
+from tracing import add_tracing_arguments, finish_tracing, span_url, start_tracing
+from organizze_client import (
+    DEFAULT_CACHE_DIR,
+    DEFAULT_CACHE_TTL,
+    DEFAULT_MAX_RETRIES,
+    DEFAULT_FETCH_WORKERS,
+    DEFAULT_TIMEOUT,
+    DEFAULT_WINDOW,
+    ORGANIZZE_BASE_URL,
+    WINDOWS,
+    OrganizzeClient,
+    ResponseCache,
+)
 
 # Configurações
-ORGANIZZE_BASE_URL = "https://api.organizze.com.br/rest/v2"
 ORGANIZZE_EMAIL = os.getenv("VITE_ORGANIZZE_EMAIL")
 ORGANIZZE_API_KEY = os.getenv("VITE_ORGANIZZE_API_KEY")
 FIREBASE_USER_ID = os.getenv("FIREBASE_USER_ID")
-S3_ENDPOINT_URL = os.getenv("VITE_S3_ENDPOINT_URL")
-S3_ACCESS_KEY_ID = os.getenv("VITE_S3_ACCESS_KEY_ID")
-S3_SECRET_ACCESS_KEY = os.getenv("VITE_S3_SECRET_ACCESS_KEY")
 S3_BUCKET_NAME = os.getenv("VITE_S3_BUCKET_NAME")
-S3_REGION = os.getenv("VITE_S3_REGION", "auto")
 S3_PUBLIC_URL = os.getenv("VITE_S3_PUBLIC_URL")
 S3_PATH_PREFIX = os.getenv("VITE_S3_PATH_PREFIX", "")
 
-# Inicializar Firebase
-firebase_creds = os.getenv("FIREBASE_CREDENTIALS")
+# Limitadores adaptativos por serviço (tetos ajustáveis pela linha de comando)
+limiters = make_limiters()
 
-if firebase_creds:
-    if firebase_creds.startswith("/") or firebase_creds.startswith("."):
-        cred_path = Path(firebase_creds)
-        if not cred_path.exists():
-            print(f"❌ Arquivo de credenciais não encontrado: {cred_path}")
-            sys.exit(1)
-        cred = credentials.Certificate(str(cred_path))
-    else:
-        try:
-            cred_dict = json.loads(firebase_creds)
-            cred = credentials.Certificate(cred_dict)
-        except json.JSONDecodeError as e:
-            print(f"❌ Erro ao parsear FIREBASE_CREDENTIALS: {e}")
-            sys.exit(1)
-else:
-    print("❌ FIREBASE_CREDENTIALS não configurado no .env")
-    sys.exit(1)
-
-firebase_admin.initialize_app(cred)
-db = firestore.client()
-
-# Inicializar S3/R2
-s3_client = None
-if S3_ENDPOINT_URL and S3_ACCESS_KEY_ID and S3_SECRET_ACCESS_KEY:
-    s3_client = boto3.client(
-        "s3",
-        endpoint_url=S3_ENDPOINT_URL,
-        aws_access_key_id=S3_ACCESS_KEY_ID,
-        aws_secret_access_key=S3_SECRET_ACCESS_KEY,
-        region_name=S3_REGION,
-    )
+# Contadores e latências das chamadas externas (relatório ao final)
+metrics = Metrics("resync")
+
+# Chaves já existentes no bucket (evita re-upload do mesmo conteúdo)
+# (com o inventário do prefixo do usuário: um LIST no lugar de um HEAD por anexo)
+object_index = ObjectIndex(
+    clients.s3_client,
+    S3_BUCKET_NAME,
+    limiter=limiters["r2"],
+    metrics=metrics,
+    inventory_prefix=attachments_prefix(S3_PATH_PREFIX, FIREBASE_USER_ID)
+    if FIREBASE_USER_ID
+    else None,
+)
+
+# Recodificação dos comprovantes em WebP (configurada com --optimize-images)
+image_optimizer = None
+
+
+# Sessão HTTP compartilhada (keep-alive + retry) para API e anexos
+organizze = OrganizzeClient(
+    ORGANIZZE_EMAIL,
+    ORGANIZZE_API_KEY,
+    user_agent=f"myPay Resync ({ORGANIZZE_EMAIL})",
+    base_url=ORGANIZZE_BASE_URL,
+)
+organizze.limiter = limiters["organizze"]
+organizze.download_limiter = limiters["attachments"]
+organizze.metrics = metrics
 
 
 def organizze_request(endpoint: str) -> dict:
     """Faz requisição à API do Organizze"""
-    auth_string = b64encode(f"{ORGANIZZE_EMAIL}:{ORGANIZZE_API_KEY}".encode()).decode()
-    headers = {
-        "Authorization": f"Basic {auth_string}",
-        "Content-Type": "application/json",
-        "User-Agent": f"myPay Resync ({ORGANIZZE_EMAIL})",
-    }
-
-    response = requests.get(f"{ORGANIZZE_BASE_URL}{endpoint}", headers=headers)
-    response.raise_for_status()
-    return response.json()
+    return organizze.get_json(endpoint)
 
 
 def get_content_type_from_filename(filename: str) -> str:
@@ -118,8 +139,12 @@ def get_content_type_from_filename(filename: str) -> str:
     return mime_types.get(ext, "application/octet-stream")
 
 
-def download_attachment(url: str) -> tuple[bytes, str, str] | None:
-    """Baixa um attachment do Organizze"""
+def download_attachment(
+    url: str,
+    max_size: int | None = None,
+    spool_threshold: int = DEFAULT_SPOOL_THRESHOLD,
+) -> tuple[SpooledTemporaryFile, str, str] | None:
+    """Baixa um attachment do Organizze em stream (arquivo temporário)"""
     from urllib.parse import unquote, urlparse
 
     parsed_url = urlparse(url)
@@ -127,96 +152,194 @@ def download_attachment(url: str) -> tuple[bytes, str, str] | None:
         unquote(parsed_url.path.split("/")[-1]) if parsed_url.path else "attachment"
     )
 
-    is_s3_url = "s3.amazonaws.com" in url or "amazonaws.com" in url
-
     try:
-        if is_s3_url:
-            response = requests.get(url, timeout=30)
-        else:
-            auth_string = b64encode(
-                f"{ORGANIZZE_EMAIL}:{ORGANIZZE_API_KEY}".encode()
-            ).decode()
-            headers = {
-                "Authorization": f"Basic {auth_string}",
-                "User-Agent": f"myPay Resync ({ORGANIZZE_EMAIL})",
-            }
-            response = requests.get(url, headers=headers, timeout=30)
-
-        response.raise_for_status()
-        content_type = response.headers.get("content-type", "")
-
-        # Se não veio content-type válido, detectar pela extensão
-        if not content_type or content_type == "application/octet-stream" or content_type == "binary/octet-stream":
-            content_type = get_content_type_from_filename(url_filename)
-
-        return response.content, content_type, url_filename
+        with metrics.time("attachment_download", url=span_url(url)):
+            response = organizze.download(url, stream=True)
+            content_type = response.headers.get("content-type", "")
+
+            # Se não veio content-type válido, detectar pela extensão
+            if not content_type or content_type == "application/octet-stream" or content_type == "binary/octet-stream":
+                content_type = get_content_type_from_filename(url_filename)
+
+            body = read_limited(response, url_filename, max_size, spool_threshold)
+        metrics.incr("attachment_download_bytes", body_size(body))
+        return body, content_type, url_filename
     except Exception as e:
         print(f"      ⚠️  Erro ao baixar: {e}")
         return None
 
 
-def upload_to_r2(data: bytes, content_type: str, filename: str, user_id: str) -> dict:
-    """Faz upload para Cloudflare R2"""
+def upload_to_r2(
+    body,
+    content_type: str,
+    filename: str,
+    user_id: str,
+    size: int | None = None,
+    force: bool = False,
+    key: str | None = None,
+) -> dict:
+    """Faz upload para Cloudflare R2 (force=True re-envia mesmo se já existir)"""
+    s3_client = clients.s3_client()
     if not s3_client or not S3_PUBLIC_URL:
         return None
 
-    timestamp = int(datetime.now().timestamp() * 1000)
-    safe_filename = "".join(c if c.isalnum() or c in ".-" else "_" for c in filename)
-    base_path = f"{S3_PATH_PREFIX}/comprovantes" if S3_PATH_PREFIX else "comprovantes"
-    key = f"{base_path}/{user_id}/{timestamp}_{safe_filename}"
+    # Chave derivada do conteúdo: o mesmo arquivo nunca é enviado duas vezes
+    sha256 = body_sha256(body)
+    key = key or content_key(S3_PATH_PREFIX, user_id, sha256, filename)
 
-    s3_client.put_object(
-        Bucket=S3_BUCKET_NAME, Key=key, Body=data, ContentType=content_type
-    )
+    size = size if size is not None else body_size(body)
+    if not force and object_index.exists(key, size):
+        object_index.mark_skipped()
+    else:
+        if isinstance(body, (bytes, bytearray)):
+            body = io.BytesIO(body)
+        with metrics.time("r2_put", key=key, bytes=size):
+            limiters["r2"].call(
+                s3_client.upload_fileobj,
+                body,
+                S3_BUCKET_NAME,
+                key,
+                ExtraArgs={"ContentType": content_type},
+                Config=clients.s3_transfer_config(),
+            )
+        metrics.incr("r2_put_bytes", size)
+        object_index.add(key, size)
 
     return {
         "url": f"{S3_PUBLIC_URL}/{key}",
         "key": key,
         "fileName": filename,
-        "size": len(data),
+        "size": size,
         "type": content_type,
+        "sha256": sha256,
     }
 
 
+def upload_attachment(
+    body, content_type: str, filename: str, size: int, force: bool = False
+) -> dict | None:
+    """Envia um anexo para o R2 (em WebP e com miniatura, com --optimize-images)"""
+    optimized = image_optimizer.optimize(body, content_type, filename) if image_optimizer else None
+    if optimized is None:
+        return upload_to_r2(body, content_type, filename, FIREBASE_USER_ID, size, force=force)
+
+    try:
+        uploaded = upload_to_r2(
+            optimized.body,
+            optimized.content_type,
+            optimized.filename,
+            FIREBASE_USER_ID,
+            optimized.size,
+            force=force,
+        )
+        if uploaded:
+            thumbnail = upload_to_r2(
+                optimized.thumbnail,
+                optimized.content_type,
+                optimized.filename,
+                FIREBASE_USER_ID,
+                force=force,
+                key=thumbnail_key(uploaded["key"]),
+            )
+            uploaded["originalSize"] = optimized.original_size
+            uploaded["thumbnailUrl"] = thumbnail["url"]
+        return uploaded
+    finally:
+        optimized.close()
+
+
 def normalize_string(s: str) -> str:
     """Normaliza string para comparação"""
     return (s or "").lower().strip().replace("  ", " ")
 
 
-def find_organizze_match(fs_tx: dict, org_txs: list) -> dict | None:
-    """Encontra transação correspondente no Organizze"""
-    fs_desc = normalize_string(fs_tx.get("description", ""))
-    fs_date = fs_tx.get("date")
-    if hasattr(fs_date, "strftime"):
-        fs_date = fs_date.strftime("%Y-%m-%d")
-    fs_amount = abs(fs_tx.get("amount", 0))
-
-    # Match exato
-    for org_tx in org_txs:
-        org_desc = normalize_string(org_tx.get("description", ""))
-        org_date = org_tx.get("date")
-        org_amount = abs(org_tx.get("amount_cents", 0)) / 100
-
-        if (
-            org_desc == fs_desc
-            and org_date == fs_date
-            and abs(org_amount - fs_amount) < 0.02
-        ):
-            return org_tx
-
-    # Match parcial
-    for org_tx in org_txs:
-        org_desc = normalize_string(org_tx.get("description", ""))
-        org_date = org_tx.get("date")
-        org_amount = abs(org_tx.get("amount_cents", 0)) / 100
-
-        if (
-            (org_desc in fs_desc or fs_desc in org_desc)
-            and org_date == fs_date
-            and abs(org_amount - fs_amount) < 0.02
-        ):
-            return org_tx
+def tokenize(s: str) -> set:
+    """Palavras da descrição normalizada (ignora tokens de 1 caractere)"""
+    return {token for token in s.split() if len(token) > 1}
+
+
+def to_date(value) -> date | None:
+    """Converte datetime/date/"YYYY-MM-DD..." em date"""
+    if isinstance(value, datetime):
+        return value.date()
+    if isinstance(value, date):
+        return value
+    try:
+        return date.fromisoformat(str(value)[:10])
+    except ValueError:
+        return None
+
+
+class OrganizzeMatcher:
+    """Índice das transações do Organizze para achar correspondências
+
+    As transações são indexadas por (data, valor em centavos) e as descrições
+    são normalizadas uma única vez. A busca olha apenas os buckets dentro da
+    tolerância de dias/centavos (em geral 1 ou 2 candidatos), e só neles
+    compara os tokens para o match parcial.
+    Entre os candidatos vence o de maior pontuação: descrição exata, depois
+    parcial, depois mais próximo em data/valor e maior sobreposição de tokens.
+    """
+
+    def __init__(self, org_txs: list, day_tolerance: int = 0, cents_tolerance: int = 1):
+        self.day_tolerance = max(0, day_tolerance)
+        self.cents_tolerance = max(0, cents_tolerance)
+        self._entries = []  # [(org_tx, descrição normalizada, tokens)]
+        self._by_key = {}  # (date, centavos) -> [posições]
 
+        for org_tx in org_txs:
+            org_date = to_date(org_tx.get("date"))
+            if org_date is None:
+                continue
+            desc = normalize_string(org_tx.get("description", ""))
+            tokens = tokenize(desc)
+            cents = abs(org_tx.get("amount_cents", 0) or 0)
+
+            position = len(self._entries)
+            self._entries.append((org_tx, desc, tokens))
+            self._by_key.setdefault((org_date, cents), []).append(position)
+
+    def find(self, fs_tx: dict) -> dict | None:
+        """Encontra a transação do Organizze que melhor corresponde"""
+        fs_date = to_date(fs_tx.get("date"))
+        if fs_date is None:
+            return None
+        fs_desc = normalize_string(fs_tx.get("description", ""))
+        fs_tokens = tokenize(fs_desc)
+        fs_cents = round(abs(fs_tx.get("amount", 0) or 0) * 100)
+
+        best = None
+        best_score = None
+        for day_offset in range(-self.day_tolerance, self.day_tolerance + 1):
+            day = fs_date + timedelta(days=day_offset)
+            for cents_offset in range(-self.cents_tolerance, self.cents_tolerance + 1):
+                for position in self._by_key.get((day, fs_cents + cents_offset), ()):
+                    org_tx, org_desc, org_tokens = self._entries[position]
+
+                    exact = org_desc == fs_desc
+                    substring = org_desc in fs_desc or fs_desc in org_desc
+                    shared = fs_tokens & org_tokens
+                    overlap = len(shared) / len(fs_tokens | org_tokens) if shared else 0.0
+                    if not (exact or substring or overlap >= 0.5):
+                        continue
+
+                    score = (
+                        exact,
+                        substring,
+                        -abs(day_offset),
+                        -abs(cents_offset),
+                        overlap,
+                    )
+                    if best_score is None or score > best_score:
+                        best, best_score = org_tx, score
+
+        return best
+
+
+def r2_key(url: str) -> str | None:
+    """Chave no bucket de uma URL pública do R2 (None se for de outro lugar)"""
+    if S3_PUBLIC_URL and url.startswith(f"{S3_PUBLIC_URL}/"):
+        return url[len(S3_PUBLIC_URL) + 1 :]
     return None
 
 
@@ -226,6 +349,12 @@ def is_broken_url(url: str, force_all: bool = False) -> bool:
         return False
     if force_all:
         return True  # Forçar re-upload de todos
+    # Com o inventário do R2, a URL do bucket está quebrada se o objeto sumiu
+    key = r2_key(url)
+    if key and object_index.has_inventory(key):
+        object_index.load_inventory()
+        if object_index.has_inventory(key):
+            return not object_index.exists(key)
     return (
         "minio" in url.lower()
         or ":9000" in url
@@ -233,8 +362,27 @@ def is_broken_url(url: str, force_all: bool = False) -> bool:
     )
 
 
-def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False, verbose: bool = False):
-    """Executa a re-sincronização de anexos"""
+def resync(
+    dry_run: bool = False,
+    add_new: bool = False,
+    force_all: bool = False,
+    verbose: bool = False,
+    attachment_workers: int = DEFAULT_WORKERS,
+    max_inflight_bytes: int = DEFAULT_MAX_INFLIGHT_BYTES,
+    max_attachment_size: int | None = None,
+    window: str = DEFAULT_WINDOW,
+    fetch_workers: int = DEFAULT_FETCH_WORKERS,
+    match_days: int = 0,
+    match_cents: int = 1,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+    snapshot: OrganizzeSnapshot | None = None,
+):
+    """Executa a re-sincronização de anexos
+
+    Com `snapshot`, as transações do Organizze vêm do snapshot em Parquet em
+    vez da API; os anexos continuam sendo baixados do Organizze.
+    """
     if not ORGANIZZE_EMAIL or not ORGANIZZE_API_KEY:
         print("❌ Configure VITE_ORGANIZZE_EMAIL e VITE_ORGANIZZE_API_KEY no .env")
         sys.exit(1)
@@ -247,34 +395,57 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
         print("❌ Configure VITE_S3_PUBLIC_URL no .env")
         sys.exit(1)
 
-    user_ref = db.collection("users").document(FIREBASE_USER_ID)
+    user_ref = clients.firestore_client().collection("users").document(FIREBASE_USER_ID)
 
     print("📄 Buscando transações no Firestore...")
-    transactions = list(user_ref.collection("transactions").stream())
-    print(f"   Encontradas: {len(transactions)}")
+    transactions_ref = user_ref.collection("transactions")
+    fields = ["description", "date", "amount", "comprovante", "attachments"]
+    if add_new:
+        # Precisa também das sem anexo: lê todas, mas só os campos usados
+        queries = [(transactions_ref.select(fields), ())]
+    else:
+        # Só as que têm comprovante ou anexos (filtro no servidor)
+        queries = [
+            (
+                transactions_ref.where("comprovante.url", ">", "").select(fields),
+                ("comprovante.url",),
+            ),
+            (
+                transactions_ref.where("attachments", "!=", []).select(fields),
+                ("attachments",),
+            ),
+        ]
 
     # Separar transações
     broken_attachments = []
     without_attachment = []
-    with_attachment = []
+    with_attachment = 0
+    seen = set()
 
-    for doc in transactions:
-        data = doc.to_dict()
-        data["_id"] = doc.id
+    for query, order_by in queries:
+        for doc in stream_paged(query, page_size=page_size, order_by=order_by):
+            if doc.id in seen:
+                continue
+            seen.add(doc.id)
 
-        comprovante = data.get("comprovante") or (data.get("attachments", [{}])[0] if data.get("attachments") else None)
+            data = doc.to_dict()
+            data["_id"] = doc.id
 
-        if comprovante:
-            if force_all or is_broken_url(comprovante.get("url", "")):
-                broken_attachments.append(data)
-            else:
-                with_attachment.append(data)
-        elif not data.get("attachments"):
-            without_attachment.append(data)
+            comprovante = data.get("comprovante") or (data.get("attachments", [{}])[0] if data.get("attachments") else None)
+
+            if comprovante:
+                if force_all or is_broken_url(comprovante.get("url", "")):
+                    broken_attachments.append(data)
+                else:
+                    with_attachment += 1
+            elif not data.get("attachments"):
+                without_attachment.append(data)
 
-    print(f"   Com anexos (ok): {len(with_attachment)}")
+    print(f"   Encontradas: {len(seen)}")
+    print(f"   Com anexos (ok): {with_attachment}")
     print(f"   Com anexos quebrados: {len(broken_attachments)}")
-    print(f"   Sem anexo: {len(without_attachment)}")
+    if add_new:
+        print(f"   Sem anexo: {len(without_attachment)}")
 
     if not broken_attachments and not add_new:
         print("\n✅ Nenhum anexo para processar!")
@@ -299,17 +470,43 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
     start_date = dates[0] if dates else "2022-01-01"
     end_date = dates[-1] if dates else datetime.now().strftime("%Y-%m-%d")
 
-    print(f"\n📥 Buscando transações no Organizze ({start_date} a {end_date})...")
-    org_txs = organizze_request(f"/transactions?start_date={start_date}&end_date={end_date}")
-    print(f"   Encontradas: {len(org_txs)}")
+    source = snapshot or organizze
+    if snapshot:
+        print(f"\n📥 Lendo transações do snapshot ({start_date} a {end_date})...")
+        if not snapshot.covers(start_date, end_date):
+            print(
+                f"   ⚠️  O snapshot cobre só {snapshot.start_date} a {snapshot.end_date}: "
+                "transações fora desse período não terão correspondente"
+            )
+    else:
+        print(f"\n📥 Buscando transações no Organizze ({start_date} a {end_date})...")
+    # Só as transações com anexo ficam em memória
+    found = 0
+    org_with_attachments = []
+    transactions = source.iter_transactions(
+        start_date, end_date, window=window, workers=fetch_workers
+    )
+    for t in transactions:
+        found += 1
+        if t.get("attachments"):
+            org_with_attachments.append(t)
+    print(f"   Encontradas: {found}")
+    if source.cache and (organizze.cache.hits or organizze.cache.revalidated):
+        print(
+            f"   Cache: {organizze.cache.hits} janelas reaproveitadas, "
+            f"{organizze.cache.revalidated} revalidadas"
+        )
 
-    org_with_attachments = [t for t in org_txs if t.get("attachments")]
     print(f"   Com anexos: {len(org_with_attachments)}")
 
     if not org_with_attachments:
         print("\n⚠️  Nenhuma transação com anexo encontrada no Organizze")
         return
 
+    matcher = OrganizzeMatcher(
+        org_with_attachments, day_tolerance=match_days, cents_tolerance=match_cents
+    )
+
     print("\n" + "=" * 50)
     print("🔄 PROCESSANDO ANEXOS")
     print("=" * 50)
@@ -319,15 +516,26 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
     failed = 0
     minio_lost = 0  # URLs MinIO sem match no Organizze
 
+    pool = AttachmentPool(
+        download=lambda url: download_attachment(url, max_attachment_size),
+        upload=lambda body, content_type, filename, size: upload_attachment(
+            body, content_type, filename, size, force=force_all
+        ),
+        workers=attachment_workers,
+        max_inflight_bytes=max_inflight_bytes,
+        max_size=max_attachment_size,
+    )
+    jobs = {}  # future -> (fs_tx, mensagem de sucesso)
+
     # Processar anexos quebrados
     for fs_tx in broken_attachments:
-        match = find_organizze_match(fs_tx, org_with_attachments)
+        match = matcher.find(fs_tx)
 
         if match and match.get("attachments"):
             desc = fs_tx.get("description", "")[:40]
-            print(f"\n📎 {desc}...")
 
             if dry_run:
+                print(f"\n📎 {desc}...")
                 print("   [DRY-RUN] Seria atualizado")
                 updated += 1
                 continue
@@ -336,31 +544,12 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
             att_url = att.get("url") or att.get("file_url") or att.get("document_url")
 
             if not att_url:
+                print(f"\n📎 {desc}...")
                 print("   ⚠️  Sem URL de anexo")
                 skipped += 1
                 continue
 
-            downloaded = download_attachment(att_url)
-            if downloaded:
-                data, content_type, filename = downloaded
-                try:
-                    uploaded = upload_to_r2(data, content_type, filename, FIREBASE_USER_ID)
-                    if uploaded:
-                        user_ref.collection("transactions").document(fs_tx["_id"]).update({
-                            "comprovante": uploaded
-                        })
-                        print("   ✅ Migrado para R2")
-                        updated += 1
-                        time.sleep(0.5)  # Rate limit do R2
-                    else:
-                        print("   ❌ Falha no upload")
-                        failed += 1
-                except Exception as e:
-                    print(f"   ❌ Erro: {e}")
-                    failed += 1
-                    time.sleep(1)  # Esperar mais em caso de erro
-            else:
-                failed += 1
+            jobs[pool.submit(att_url)] = (fs_tx, "   ✅ Migrado para R2")
         else:
             # Sem match no Organizze
             comprovante = fs_tx.get("comprovante") or {}
@@ -392,13 +581,12 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
     if add_new:
         print("\n📎 Adicionando anexos novos...")
         for fs_tx in without_attachment:
-            match = find_organizze_match(fs_tx, org_with_attachments)
+            match = matcher.find(fs_tx)
 
             if match and match.get("attachments"):
-                desc = fs_tx.get("description", "")[:40]
-                print(f"\n📎 {desc}...")
-
                 if dry_run:
+                    desc = fs_tx.get("description", "")[:40]
+                    print(f"\n📎 {desc}...")
                     print("   [DRY-RUN] Seria adicionado")
                     updated += 1
                     continue
@@ -409,22 +597,47 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
                 if not att_url:
                     continue
 
-                downloaded = download_attachment(att_url)
-                if downloaded:
-                    data, content_type, filename = downloaded
-                    try:
-                        uploaded = upload_to_r2(data, content_type, filename, FIREBASE_USER_ID)
-                        if uploaded:
-                            user_ref.collection("transactions").document(fs_tx["_id"]).update({
-                                "comprovante": uploaded
-                            })
-                            print("   ✅ Anexo adicionado")
-                            updated += 1
-                            time.sleep(0.5)  # Rate limit do R2
-                    except Exception as e:
-                        print(f"   ❌ Erro: {e}")
-                        failed += 1
-                        time.sleep(1)
+                jobs[pool.submit(att_url)] = (fs_tx, "   ✅ Anexo adicionado")
+
+    # Gravar no Firestore conforme as transferências terminam
+    if jobs:
+        print(f"\n⏳ Transferindo {len(jobs)} anexos ({pool.workers} em paralelo)...")
+
+    progress = Progress(
+        "anexos processados",
+        done=lambda: updated + failed,
+        total=lambda: len(jobs),
+        interval=progress_interval,
+    )
+    with progress:
+        for future in as_completed(jobs):
+            fs_tx, success_message = jobs[future]
+            desc = fs_tx.get("description", "")[:40]
+            print(f"\n📎 {desc}...")
+
+            try:
+                uploaded = future.result()
+                if uploaded:
+                    with metrics.time(
+                        "firestore_write", document=f"transactions/{fs_tx['_id']}"
+                    ):
+                        limiters["firestore"].call(
+                            user_ref.collection("transactions").document(fs_tx["_id"]).update,
+                            {"comprovante": uploaded},
+                        )
+                    print(success_message)
+                    updated += 1
+                else:
+                    print("   ❌ Falha no download/upload")
+                    failed += 1
+            except Exception as e:
+                print(f"   ❌ Erro: {e}")
+                failed += 1
+
+    pool.shutdown()
+    metrics.incr("updated", updated)
+    metrics.incr("skipped", skipped)
+    metrics.incr("failed", failed)
 
     # Resumo
     print("\n" + "=" * 50)
@@ -433,24 +646,85 @@ def resync(dry_run: bool = False, add_new: bool = False, force_all: bool = False
     print(f"   ✅ Atualizados:    {updated}")
     print(f"   ⏭️  Ignorados:      {skipped}")
     print(f"   ❌ Falhas:         {failed}")
+    if object_index.skipped_uploads:
+        print(f"   ♻️  Já no R2:        {object_index.skipped_uploads} (upload pulado)")
+    if image_optimizer and image_optimizer.optimized:
+        print(
+            f"   🖼️  WebP:           {image_optimizer.optimized} imagens "
+            f"({image_optimizer.saved_bytes / 1024 / 1024:.1f} MB a menos)"
+        )
+    if organizze.retries:
+        print(f"   🔁 Re-tentativas HTTP: {organizze.retries}")
+    for limiter in limiters.values():
+        if limiter.throttled:
+            print(f"   🐢 {limiter.name}: {limiter.throttled} limites, taxa final {limiter.rate:.1f}/s")
     if minio_lost > 0:
         print(f"   🔴 MinIO perdidos: {minio_lost} (sem match no Organizze)")
     print("=" * 50)
 
 
-def clean_minio_lost(dry_run: bool = False):
+def bulk_update_transactions(
+    user_ref,
+    updates,
+    batch_size: int = MAX_BATCH_SIZE,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+) -> BatchWriter:
+    """Atualização em massa na coleção de transações do usuário
+
+    `updates` gera `(id do documento, campos)`, com a semântica de `update()`
+    (caminhos pontilhados, `clients.delete_field()` remove o campo). Os
+    documentos vão em lotes pelo limitador do Firestore, que reduz a taxa
+    quando o servidor sinaliza limite; se um lote falhar, os documentos são
+    re-tentados um a um e só os que falharem de fato ficam no relatório.
+    """
+    transactions_ref = user_ref.collection("transactions")
+    writer = BatchWriter(
+        clients.firestore_client(),
+        batch_size=batch_size,
+        limiter=limiters["firestore"],
+        metrics=metrics,
+        split_failed=True,
+    )
+    progress = Progress(
+        "documentos atualizados", done=lambda: writer.committed, interval=progress_interval
+    )
+    with progress:
+        for doc_id, fields in updates:
+            writer.update(transactions_ref.document(doc_id), fields)
+        writer.close()
+
+    print(f"   💾 {writer.committed} documentos atualizados em {writer.batches} lotes")
+    if writer.failed:
+        print(f"\n❌ {len(writer.failed)} documentos não foram atualizados:")
+        for f in writer.failed:
+            print(f"   {f['path']} | {f['error']}")
+        metrics.info["failed_documents"] = writer.failed
+    return writer
+
+
+def clean_minio_lost(
+    dry_run: bool = False,
+    page_size: int = DEFAULT_PAGE_SIZE,
+    batch_size: int = MAX_BATCH_SIZE,
+    progress_interval: float = DEFAULT_PROGRESS_INTERVAL,
+):
     """Remove campo comprovante de transações com URL do MinIO sem match no Organizze"""
     if not FIREBASE_USER_ID:
         print("❌ Configure FIREBASE_USER_ID no .env")
         sys.exit(1)
 
-    user_ref = db.collection("users").document(FIREBASE_USER_ID)
+    user_ref = clients.firestore_client().collection("users").document(FIREBASE_USER_ID)
 
     print("📄 Buscando transações com URLs do MinIO...")
-    transactions = list(user_ref.collection("transactions").stream())
+    # Só transações com comprovante, trazendo apenas os campos exibidos
+    query = (
+        user_ref.collection("transactions")
+        .where("comprovante.url", ">", "")
+        .select(["description", "date", "amount", "comprovante.url"])
+    )
 
     minio_txs = []
-    for doc in transactions:
+    for doc in stream_paged(query, page_size=page_size, order_by=("comprovante.url",)):
         data = doc.to_dict()
         comprovante = data.get("comprovante") or {}
         url = comprovante.get("url", "")
@@ -474,7 +748,6 @@ def clean_minio_lost(dry_run: bool = False):
     print("🧹 LIMPANDO CAMPO COMPROVANTE")
     print("=" * 50)
 
-    cleaned = 0
     for tx in minio_txs:
         desc = tx["description"][:50]
         fs_date = tx["date"]
@@ -483,23 +756,32 @@ def clean_minio_lost(dry_run: bool = False):
 
         print(f"\n🗑️  {desc}")
         print(f"      Data: {fs_date} | Valor: R$ {tx['amount']:.2f}")
-
         if dry_run:
             print("      [DRY-RUN] Seria limpo")
-        else:
-            user_ref.collection("transactions").document(tx["_id"]).update({
-                "comprovante": firestore.DELETE_FIELD
-            })
-            print("      ✅ Campo comprovante removido")
-            time.sleep(0.3)
 
-        cleaned += 1
+    failed = []
+    if not dry_run:
+        print(f"\n🧹 Removendo o campo comprovante de {len(minio_txs)} transações...")
+        writer = bulk_update_transactions(
+            user_ref,
+            ((tx["_id"], {"comprovante": clients.delete_field()}) for tx in minio_txs),
+            batch_size=batch_size,
+            progress_interval=progress_interval,
+        )
+        failed = writer.failed
+        metrics.incr("cleaned", writer.committed)
+        metrics.incr("failed", len(failed))
+    cleaned = len(minio_txs) - len(failed)
 
     print("\n" + "=" * 50)
     print("📊 RESUMO")
     print("=" * 50)
     print(f"   🗑️  Limpos: {cleaned}")
+    if failed:
+        print(f"   ❌ Falhas: {len(failed)}")
     print("=" * 50)
+    if failed:
+        sys.exit(1)
 
 
 def main():
@@ -509,13 +791,96 @@ def main():
     parser.add_argument("--force-all", action="store_true", help="Re-upload de TODOS anexos (corrigir content-type)")
     parser.add_argument("--verbose", "-v", action="store_true", help="Mostrar detalhes dos ignorados")
     parser.add_argument("--clean-minio-lost", action="store_true", help="Limpar campo comprovante de URLs MinIO")
+    parser.add_argument("--page-size", type=int, default=DEFAULT_PAGE_SIZE, help="Documentos por página nas leituras do Firestore")
+    parser.add_argument("--batch-size", type=int, default=MAX_BATCH_SIZE, help=f"Documentos por lote nas atualizações em massa (máx. {MAX_BATCH_SIZE})")
+    parser.add_argument("--refresh", action="store_true", help="Ignorar o TTL do cache e revalidar as respostas do Organizze")
+    parser.add_argument("--no-cache", action="store_true", help="Não usar o cache em disco das respostas do Organizze")
+    parser.add_argument("--cache-ttl", type=float, default=DEFAULT_CACHE_TTL, help="Segundos em que uma resposta em cache é usada sem revalidar")
+    parser.add_argument("--cache-dir", default=str(DEFAULT_CACHE_DIR), help="Diretório do cache de respostas do Organizze")
+    parser.add_argument("--http-timeout", type=float, default=DEFAULT_TIMEOUT, help="Timeout em segundos das requisições ao Organizze")
+    parser.add_argument("--http-retries", type=int, default=DEFAULT_MAX_RETRIES, help="Novas tentativas em respostas 429/5xx")
+    parser.add_argument("--max-attachment-mb", type=float, default=0, help="Tamanho máximo de um anexo (0 = sem limite)")
+    parser.add_argument("--window", choices=WINDOWS, default=DEFAULT_WINDOW, help="Tamanho das janelas de busca no Organizze")
+    parser.add_argument("--fetch-workers", type=int, default=DEFAULT_FETCH_WORKERS, help="Janelas buscadas em paralelo no Organizze")
+    parser.add_argument("--match-days", type=int, default=0, help="Tolerância em dias ao casar transações (±N)")
+    parser.add_argument("--match-cents", type=int, default=1, help="Tolerância em centavos ao casar transações (±N)")
+    parser.add_argument("--attachment-workers", type=int, default=DEFAULT_WORKERS, help="Transferências de anexos simultâneas")
+    parser.add_argument(
+        "--max-inflight-mb",
+        type=int,
+        default=DEFAULT_MAX_INFLIGHT_BYTES // (1024 * 1024),
+        help="Limite de MB de anexos em memória ao mesmo tempo",
+    )
+    parser.add_argument("--progress-interval", type=float, default=DEFAULT_PROGRESS_INTERVAL, help="Segundos entre os relatórios de progresso (ETA)")
+    parser.add_argument("--multipart-concurrency", type=int, default=clients.DEFAULT_MULTIPART_CONCURRENCY, help="Conexões ao R2 por upload multipart (anexos acima de 8 MB)")
+    parser.add_argument("--no-r2-inventory", action="store_true", help="Checar cada anexo com HEAD em vez de listar os comprovantes do usuário no R2")
+    parser.add_argument("--from-snapshot", metavar="DIRETÓRIO", help="Ler as transações do Organizze de um snapshot (migrate_organizze.py --snapshot)")
+
+    add_rate_limit_arguments(parser)
+    add_image_arguments(parser)
+    add_metrics_arguments(parser)
+    add_tracing_arguments(parser)
 
     args = parser.parse_args()
 
-    if args.clean_minio_lost:
-        clean_minio_lost(dry_run=args.dry_run)
-    else:
-        resync(dry_run=args.dry_run, add_new=args.add_new, force_all=args.force_all, verbose=args.verbose)
+    configure_limiters(limiters, args)
+    clients.set_multipart_concurrency(args.multipart_concurrency)
+    organizze.timeout = args.http_timeout
+    organizze.max_retries = max(0, args.http_retries)
+    if not args.no_cache:
+        organizze.cache = ResponseCache(
+            args.cache_dir, ttl=args.cache_ttl, refresh=args.refresh
+        )
+
+    global image_optimizer
+    image_optimizer = make_image_optimizer(args, metrics)
+    if args.no_r2_inventory:
+        object_index.inventory_prefix = None
+
+    snapshot = None
+    if args.from_snapshot:
+        try:
+            snapshot = OrganizzeSnapshot(args.from_snapshot)
+        except (OSError, ValueError) as e:
+            print(f"❌ {e}")
+            sys.exit(1)
+
+    metrics.info.update(vars(args))
+    start_tracing(metrics, args)
+    try:
+        if args.clean_minio_lost:
+            metrics.run = "clean_minio_lost"
+            clean_minio_lost(
+                dry_run=args.dry_run,
+                page_size=max(1, args.page_size),
+                batch_size=args.batch_size,
+                progress_interval=args.progress_interval,
+            )
+        else:
+            resync(
+                dry_run=args.dry_run,
+                add_new=args.add_new,
+                force_all=args.force_all,
+                verbose=args.verbose,
+                attachment_workers=max(1, args.attachment_workers),
+                max_inflight_bytes=args.max_inflight_mb * 1024 * 1024,
+                max_attachment_size=int(args.max_attachment_mb * 1024 * 1024) or None,
+                window=args.window,
+                fetch_workers=max(1, args.fetch_workers),
+                match_days=args.match_days,
+                match_cents=args.match_cents,
+                page_size=max(1, args.page_size),
+                progress_interval=args.progress_interval,
+                snapshot=snapshot,
+            )
+    finally:
+        if image_optimizer:
+            image_optimizer.shutdown()
+        metrics.incr("organizze_retries", organizze.retries)
+        for limiter in limiters.values():
+            metrics.incr(f"{limiter.name}_throttled", limiter.throttled)
+        finish_tracing(metrics, args)
+        write_reports(metrics, args)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,253 @@
+"""
+Profiling e tracing das execuções de migração
+
+`--profile` liga o cProfile em todas as threads (pipeline, anexos, buscas no
+Organizze) e, ao final, grava o `.prof` (abre no snakeviz ou com `pstats`) e
+mostra as funções com maior tempo acumulado: parsing de JSON, `parse_date`,
+conversão das tags, handshakes TLS...
+
+`--trace` grava um span por chamada externa registrada em `Metrics` (busca no
+Organizze, download de anexo, PUT/HEAD/LIST no R2, commit no Firestore), com
+o endpoint, a URL, a chave ou o documento envolvido, e a thread que fez a
+chamada. O formato padrão é o Chrome trace (`chrome://tracing`, Perfetto);
+`--trace-format otlp` gera OTLP-JSON (Jaeger, Tempo). Dá para ver ali a
+sobreposição entre os estágios e o tempo ocioso de cada thread.
+"""
+
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import threading
+import time
+from pathlib import Path
+
+from metrics import DEFAULT_REPORT_DIR
+
+TRACE_FORMATS = ("chrome", "otlp")
+MAX_SPANS = 1_000_000  # acima disso os spans são descartados (memória)
+PROFILE_TOP = 25
+
+
+class Tracer:
+    """Coleta spans (thread-safe) e grava em Chrome trace ou OTLP-JSON"""
+
+    def __init__(self, service: str, max_spans: int = MAX_SPANS):
+        self.service = service
+        self.max_spans = max_spans
+        self.dropped = 0
+        self._spans = []  # (nome, início, duração, thread, atributos, erro)
+        self._threads = {}  # id -> nome
+        self._started = time.monotonic()
+        self._started_unix = time.time()
+        self._lock = threading.Lock()
+
+    def add(self, name: str, seconds: float, attrs: dict | None = None, error: bool = False):
+        """Registra um span que acabou agora e durou `seconds`"""
+        start = time.monotonic() - seconds - self._started
+        thread = threading.current_thread()
+        with self._lock:
+            if len(self._spans) >= self.max_spans:
+                self.dropped += 1
+                return
+            self._threads.setdefault(thread.ident, thread.name)
+            self._spans.append((name, start, seconds, thread.ident, attrs or {}, error))
+
+    def write(self, path: str | Path, trace_format: str = "chrome") -> Path:
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with self._lock:
+            spans = list(self._spans)
+            threads = dict(self._threads)
+        if trace_format == "otlp":
+            content = self._otlp(spans)
+        else:
+            content = self._chrome(spans, threads)
+        tmp_path = path.with_suffix(path.suffix + ".tmp")
+        tmp_path.write_text(json.dumps(content, default=str))
+        os.replace(tmp_path, path)
+        return path
+
+    def _chrome(self, spans: list, threads: dict) -> dict:
+        pid = os.getpid()
+        events = [
+            {"name": "process_name", "ph": "M", "pid": pid, "args": {"name": self.service}}
+        ]
+        for ident, name in threads.items():
+            events.append(
+                {"name": "thread_name", "ph": "M", "pid": pid, "tid": ident, "args": {"name": name}}
+            )
+        for name, start, seconds, ident, attrs, error in spans:
+            args = dict(attrs)
+            if error:
+                args["error"] = True
+            events.append(
+                {
+                    "name": name,
+                    "cat": name.split("_", 1)[0],
+                    "ph": "X",
+                    "ts": round(start * 1e6, 3),
+                    "dur": round(seconds * 1e6, 3),
+                    "pid": pid,
+                    "tid": ident,
+                    "args": args,
+                }
+            )
+        return {"traceEvents": events, "displayTimeUnit": "ms"}
+
+    def _otlp(self, spans: list) -> dict:
+        trace_id = os.urandom(16).hex()
+        root_id = os.urandom(8).hex()
+        base = self._started_unix
+
+        def nanos(seconds: float) -> str:
+            return str(int((base + seconds) * 1e9))
+
+        def attributes(attrs: dict) -> list:
+            result = []
+            for key, value in attrs.items():
+                if isinstance(value, bool):
+                    typed = {"boolValue": value}
+                elif isinstance(value, int):
+                    typed = {"intValue": str(value)}
+                elif isinstance(value, float):
+                    typed = {"doubleValue": value}
+                else:
+                    typed = {"stringValue": str(value)}
+                result.append({"key": key, "value": typed})
+            return result
+
+        otlp_spans = [
+            {
+                "traceId": trace_id,
+                "spanId": root_id,
+                "name": self.service,
+                "kind": 1,  # INTERNAL
+                "startTimeUnixNano": nanos(0),
+                "endTimeUnixNano": nanos(time.monotonic() - self._started),
+            }
+        ]
+        for name, start, seconds, ident, attrs, error in spans:
+            span = {
+                "traceId": trace_id,
+                "spanId": os.urandom(8).hex(),
+                "parentSpanId": root_id,
+                "name": name,
+                "kind": 3,  # CLIENT
+                "startTimeUnixNano": nanos(start),
+                "endTimeUnixNano": nanos(start + seconds),
+                "attributes": attributes({**attrs, "thread.id": ident}),
+            }
+            if error:
+                span["status"] = {"code": 2}
+            otlp_spans.append(span)
+        return {
+            "resourceSpans": [
+                {
+                    "resource": {"attributes": attributes({"service.name": self.service})},
+                    "scopeSpans": [{"scope": {"name": "mypay.migration"}, "spans": otlp_spans}],
+                }
+            ]
+        }
+
+
+class Profiler:
+    """cProfile em todas as threads criadas depois de `start()`"""
+
+    def __init__(self):
+        self._profiles = []
+        self._lock = threading.Lock()
+
+    def start(self):
+        self._profiles.append(self._enable())
+        if sys.version_info < (3, 12):
+            # Até o 3.11 o cProfile só vê a thread que o ligou: cada thread nova
+            # liga o seu na primeira chamada. No 3.12+ (sys.monitoring), um
+            # único perfil já vê todas.
+            threading.setprofile(self._start_thread)
+        return self
+
+    def stop(self) -> pstats.Stats:
+        threading.setprofile(None)
+        with self._lock:
+            profiles = list(self._profiles)
+        profiles[0].disable()
+        stats = pstats.Stats(profiles[0])
+        for profile in profiles[1:]:
+            # Threads ainda vivas (daemon) seguem coletando; o que já foi
+            # coletado entra no relatório
+            stats.add(profile)
+        return stats
+
+    def _enable(self) -> cProfile.Profile:
+        profile = cProfile.Profile()
+        profile.enable()
+        return profile
+
+    def _start_thread(self, frame, event, arg):
+        sys.setprofile(None)
+        profile = self._enable()
+        with self._lock:
+            self._profiles.append(profile)
+
+
+def span_url(url: str) -> str:
+    """URL sem query string (os links de anexo vêm assinados)"""
+    return url.split("?", 1)[0]
+
+
+def add_tracing_arguments(parser):
+    """Opções de linha de comando de profiling e tracing"""
+    parser.add_argument(
+        "--profile",
+        nargs="?",
+        const="",
+        metavar="ARQUIVO",
+        help="Perfil cProfile de todas as threads (.prof; padrão: junto dos relatórios)",
+    )
+    parser.add_argument(
+        "--trace",
+        metavar="ARQUIVO",
+        help="Grava um span por chamada externa (Organizze, anexos, R2, Firestore)",
+    )
+    parser.add_argument(
+        "--trace-format",
+        choices=TRACE_FORMATS,
+        default="chrome",
+        help="Formato do --trace: Chrome trace (Perfetto) ou OTLP-JSON",
+    )
+
+
+def start_tracing(metrics, args):
+    """Liga o profiler e o tracer pedidos na linha de comando"""
+    if args.trace:
+        metrics.tracer = Tracer(f"mypay-{metrics.run}")
+    if args.profile is not None:
+        metrics.profiler = Profiler().start()
+
+
+def finish_tracing(metrics, args):
+    """Grava o perfil e o trace da execução"""
+    if metrics.profiler:
+        stats = metrics.profiler.stop()
+        metrics.profiler = None
+        path = Path(
+            args.profile
+            or DEFAULT_REPORT_DIR / f"{metrics.run}-{metrics.started_at:%Y%m%d-%H%M%S}.prof"
+        )
+        path.parent.mkdir(parents=True, exist_ok=True)
+        stats.dump_stats(path)
+        output = io.StringIO()
+        stats.stream = output
+        stats.sort_stats("cumulative").print_stats(PROFILE_TOP)
+        print(f"\n🔬 Perfil (top {PROFILE_TOP} por tempo acumulado):")
+        print(output.getvalue().rstrip())
+        print(f"   Perfil completo: {path} (python -m pstats {path})")
+
+    if metrics.tracer:
+        path = metrics.tracer.write(args.trace, args.trace_format)
+        print(f"🧵 Trace ({args.trace_format}): {path}")
+        if metrics.tracer.dropped:
+            print(f"   ⚠️  {metrics.tracer.dropped} spans descartados (limite de {MAX_SPANS})")